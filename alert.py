@@ -31,6 +31,30 @@ def send_beautiful_notification(message: str, subtitle: Optional[str] = None):
         print(f"❌ 通知失败: {e}")
 
 
+def notify_breakout(symbol: str, pend: dict, trap: float):
+    """BREAKOUT_CONFIRMED 事件的统一报警格式"""
+    send_beautiful_notification(
+        f"🚀 真启动\n{symbol}\nScore:{pend['score']:.0f}\nTrap:{trap:.0f}",
+        subtitle="BREAKOUT"
+    )
+
+
+def notify_early(symbol: str, info: dict):
+    """BREAKOUT_EARLY（盘中逐笔提前突破）的报警格式"""
+    send_beautiful_notification(
+        f"⚡ 盘中突破\n{symbol}\n买占比:{info['buy_ratio']:.2f}\n量能加速:{info['vol_accel']:.1f}x",
+        subtitle="EARLY"
+    )
+
+
+def notify_event(symbol: str, evt: str, pend: dict, trap: Optional[float]):
+    """按事件类型分发报警"""
+    if evt == "BREAKOUT_EARLY":
+        notify_early(symbol, pend)
+    else:
+        notify_breakout(symbol, pend, trap)
+
+
 # 用法示例
 if __name__ == "__main__":
     send_beautiful_notification(
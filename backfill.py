@@ -0,0 +1,236 @@
+# backfill.py
+"""
+历史 K线回填 → 本地 K线库（bar_store）
+
+1) fetch：按 limit=1500 + startTime/endTime 把时间段切成页，所有 symbol 的所有页一起丢进线程池并发拉取，
+   全部走同一个 BNMonitor 的限流器。
+   futures_klines limit>1000 的权重是 10，IP 限额 2400/分钟 → 默认 BACKFILL_QPS=3（1800/分钟）
+   页乱序完成，同一个 symbol 的页先攒着，全部回来后一次 merge（逐页 merge 乱序会反复整文件重写）
+   上市前的区间（请求成功但没有数据）记成空洞，下次不再请求
+   --start / --end 按 UTC 日期解析
+2) import：导入币安公开数据（data.binance.vision）的月度 / 日度 K线 ZIP 或 CSV，
+   文件名形如 BTCUSDT-5m-2025-11.zip / BTCUSDT-5m-2025-11-03.zip
+
+用法：
+    python backfill.py fetch --start 2025-09-01 --end 2025-12-01 [--symbols BTCUSDT,ETHUSDT] [--interval 5m]
+    python backfill.py import ~/Downloads/futures/um/monthly/klines/
+"""
+import argparse
+import csv
+import io
+import os
+import re
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+from typing import Iterable, List, Optional, Tuple
+
+from bar_store import BarStore
+from bn_tool import KlineData, parse_kline
+from gaps import Gap, coalesce_gaps, exclude_holes, find_gaps
+from interal_enum import KlineInterval, interval_ms
+
+PAGE_LIMIT = 1500
+BACKFILL_QPS = 3
+BACKFILL_WORKERS = 8
+
+_ARCHIVE_NAME = re.compile(r"^(?P<symbol>[A-Z0-9]+)-(?P<interval>\d+[mhdwM])-\d{4}-\d{2}(-\d{2})?\.(zip|csv)$")
+
+
+def page_ranges(start_ms: int, end_ms: int, interval: KlineInterval,
+                limit: int = PAGE_LIMIT) -> List[Tuple[int, int]]:
+    """[start_ms, end_ms] 切成每页最多 limit 根 bar 的闭区间"""
+    step = interval_ms(interval)
+    start_ms -= start_ms % step
+    pages = []
+    s = start_ms
+    while s <= end_ms:
+        e = min(end_ms, s + step * limit - 1)
+        pages.append((s, e))
+        s = e + 1
+    return pages
+
+
+def missing_ranges(open_times: List[int], start_ms: int, end_ms: int, step_ms: int) -> List[Gap]:
+    """[start_ms, end_ms] 里库中还没有的区间：已有数据之前 + 中间的缺口 + 最后一根之后"""
+    start_ms -= start_ms % step_ms
+    if not open_times:
+        return [(start_ms, end_ms)] if start_ms <= end_ms else []
+    out = []
+    if start_ms < open_times[0]:
+        out.append((start_ms, min(end_ms, open_times[0] - step_ms)))
+    for a, b in find_gaps(open_times, step_ms):
+        a, b = max(a, start_ms), min(b, end_ms)
+        if a <= b:
+            out.append((a, b))
+    if open_times[-1] + step_ms <= end_ms:
+        out.append((max(start_ms, open_times[-1] + step_ms), end_ms))
+    return [(a, b) for a, b in out if a <= b]
+
+
+def _mark_listing_bound(store: BarStore, symbol: str, interval: KlineInterval,
+                        start_ms: int, failed_starts: List[int]) -> bool:
+    """
+    库里最早一根之前的区间：这些页都请求成功了还是没数据，说明还没上市 → 记成空洞
+    有页失败（限流 / 超时）时不记，下次照常请求
+    """
+    step = interval_ms(interval)
+    start_ms -= start_ms % step
+    first = store.first_open_ms(symbol, interval.value)
+    if first is None or first <= start_ms or any(a < first for a in failed_starts):
+        return False
+    store.mark_unfillable(symbol, interval.value, [(start_ms, first - step)])
+    return True
+
+
+def backfill(store: BarStore, bn, symbols: Iterable[str], interval: KlineInterval,
+             start_ms: int, end_ms: int, workers: int = BACKFILL_WORKERS) -> dict:
+    """
+    并发回填；每个 symbol 只拉库里还没覆盖的区间（断点续传，前面缺的、中间断的也会补上），
+    相邻的小区间合并成一页；一个 symbol 的页全部回来后按时间顺序一次 merge
+    返回统计：ranges / pages / bars / empty_pages / short_pages / failed_pages / listing_bounds / sec
+    """
+    t0 = time.time()
+    step = interval_ms(interval)
+    tasks = []
+    n_ranges = 0
+    for s in symbols:
+        ranges = missing_ranges(store.open_times(s, interval.value), start_ms, end_ms, step)
+        ranges = exclude_holes(ranges, store.unfillable(s, interval.value))
+        n_ranges += len(ranges)
+        for a, b in coalesce_gaps(ranges, step, PAGE_LIMIT):
+            tasks.append((s, a, b))
+
+    stats = {"ranges": n_ranges, "pages": len(tasks), "bars": 0,
+             "empty_pages": 0, "short_pages": 0, "failed_pages": 0, "listing_bounds": 0}
+
+    def fetch(task):
+        symbol, a, b = task
+        try:
+            return task, bn.getSymbolKlines(symbol, interval.value, a, b, limit=PAGE_LIMIT, raise_errors=True)
+        except Exception:
+            return task, None   # 接口已经打印过
+
+    left = {}
+    for symbol, _, _ in tasks:
+        left[symbol] = left.get(symbol, 0) + 1
+    buffered = {s: [] for s in left}
+    failed = {s: [] for s in left}   # 失败页的起点
+
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        futures = [ex.submit(fetch, t) for t in tasks]
+        for fut in as_completed(futures):
+            (symbol, a, b), kl = fut.result()
+            if kl is None:
+                stats["failed_pages"] += 1
+                failed[symbol].append(a)
+            elif not kl:
+                stats["empty_pages"] += 1
+            else:
+                if len(kl) < min(PAGE_LIMIT, (b - a) // step + 1):
+                    stats["short_pages"] += 1
+                buffered[symbol].extend(kl)
+
+            left[symbol] -= 1
+            if left[symbol] == 0:
+                bars = buffered.pop(symbol)
+                stats["bars"] += store.merge(symbol, interval.value, bars) if bars else 0
+                if _mark_listing_bound(store, symbol, interval, start_ms, failed.pop(symbol)):
+                    stats["listing_bounds"] += 1
+
+    stats["sec"] = time.time() - t0
+    return stats
+
+
+# -----------------------------
+# 币安公开数据归档导入
+# -----------------------------
+def _iter_csv_rows(f) -> Iterable[List[str]]:
+    for row in csv.reader(io.TextIOWrapper(f, encoding="utf-8")):
+        if not row or not row[0].strip().isdigit():
+            continue  # 新版归档第一行是表头
+        yield row
+
+
+def _row_to_kline(row: List[str]) -> KlineData:
+    k = parse_kline(row)
+    # 部分归档的时间戳是微秒
+    if k.open_time > 10 ** 14:
+        k.open_time //= 1000
+        k.close_time //= 1000
+    return k
+
+
+def read_archive(path: str) -> List[KlineData]:
+    if path.endswith(".zip"):
+        out = []
+        with zipfile.ZipFile(path) as z:
+            for name in z.namelist():
+                if name.endswith(".csv"):
+                    with z.open(name) as f:
+                        out.extend(_row_to_kline(r) for r in _iter_csv_rows(f))
+        return out
+    with open(path, "rb") as f:
+        return [_row_to_kline(r) for r in _iter_csv_rows(f)]
+
+
+def import_archives(store: BarStore, root: str,
+                    symbol: Optional[str] = None, interval: Optional[str] = None) -> dict:
+    """root 可以是单个文件或目录（递归）；symbol / interval 默认从文件名解析"""
+    t0 = time.time()
+    if os.path.isdir(root):
+        paths = [os.path.join(d, n) for d, _, names in os.walk(root) for n in names]
+    else:
+        paths = [root]
+
+    stats = {"files": 0, "bars": 0, "skipped": 0}
+    for path in sorted(paths):
+        m = _ARCHIVE_NAME.match(os.path.basename(path))
+        sym = symbol or (m and m.group("symbol"))
+        iv = interval or (m and m.group("interval"))
+        if not sym or not iv or not path.endswith((".zip", ".csv")):
+            stats["skipped"] += 1
+            continue
+        stats["bars"] += store.merge(sym, iv, read_archive(path))
+        stats["files"] += 1
+
+    stats["sec"] = time.time() - t0
+    return stats
+
+
+def _parse_day(s: str) -> int:
+    """YYYY-MM-DD → 当天 00:00 UTC 的毫秒时间戳（币安的日线 / 归档都按 UTC 切）"""
+    return int(datetime.strptime(s, "%Y-%m-%d").replace(tzinfo=timezone.utc).timestamp() * 1000)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="kline backfill / archive import into the local bar store")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p_fetch = sub.add_parser("fetch")
+    p_fetch.add_argument("--start", required=True, help="YYYY-MM-DD")
+    p_fetch.add_argument("--end", default=None, help="YYYY-MM-DD，默认现在")
+    p_fetch.add_argument("--symbols", default=None, help="逗号分隔，默认 symbols.py 全部")
+    p_fetch.add_argument("--interval", default=KlineInterval.MINUTE_5.value)
+    p_fetch.add_argument("--qps", type=float, default=BACKFILL_QPS)
+    p_fetch.add_argument("--workers", type=int, default=BACKFILL_WORKERS)
+
+    p_import = sub.add_parser("import")
+    p_import.add_argument("path")
+    p_import.add_argument("--symbol", default=None)
+    p_import.add_argument("--interval", default=None)
+
+    args = parser.parse_args()
+    store = BarStore()
+
+    if args.cmd == "fetch":
+        from bn_tool import BNMonitor
+        from symbols import symbols
+
+        targets = args.symbols.split(",") if args.symbols else symbols
+        end_ms = _parse_day(args.end) - 1 if args.end else int(time.time() * 1000)
+        print(backfill(store, BNMonitor(max_qps=args.qps), targets, KlineInterval(args.interval),
+                       _parse_day(args.start), end_ms, workers=args.workers))
+    else:
+        print(import_archives(store, args.path, symbol=args.symbol, interval=args.interval))
@@ -0,0 +1,230 @@
+# bar_store.py
+"""
+本地 K线库：每个 (interval, symbol) 一个定长记录的二进制文件
+
+    <root>/<interval>/<SYMBOL>.bin
+
+- 每条记录 88 字节（KlineData 去掉 ignore），按 open_time 升序、无重复
+- 定长 → 可以直接按 open_time 二分定位，不需要额外索引
+- merge 时新数据全部在尾部则直接 append，否则读出合并后原子替换
+- 只存已收盘的 bar（close_time < 当前时间），未收盘的直接丢掉
+- 每次 merge 后对受影响的区间跑缺口检测（gaps.find_gaps），结果在 known_gaps()，计数在 GAP_STATS
+- 修补后仍然拉不回来的缺口（交易所真实空洞）记在 <root>/<interval>/<SYMBOL>.holes.json，
+  repair / backfill 不再请求
+"""
+import json
+import os
+import struct
+import threading
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from bn_tool import KlineData
+from env import BAR_STORE_DIR
+from gaps import GAP_STATS, Gap, find_gaps, gap_bars
+from interal_enum import KlineInterval, interval_ms
+
+_REC = struct.Struct("<qdddddqdqdd")
+REC_SIZE = _REC.size
+# 同一记录布局的 numpy dtype：批量统计 / 回测直接 frombuffer，不逐条建 KlineData
+BAR_DTYPE = np.dtype([
+    ("open_time", "<i8"), ("open_price", "<f8"), ("high_price", "<f8"), ("low_price", "<f8"),
+    ("close_price", "<f8"), ("volume", "<f8"), ("close_time", "<i8"), ("quote_volume", "<f8"),
+    ("trade_count", "<i8"), ("buy_volume", "<f8"), ("buy_quote_volume", "<f8"),
+])
+
+
+def _pack(k: KlineData) -> bytes:
+    return _REC.pack(
+        k.open_time, k.open_price, k.high_price, k.low_price, k.close_price,
+        k.volume, k.close_time, k.quote_volume, k.trade_count,
+        k.buy_volume, k.buy_quote_volume,
+    )
+
+
+def _unpack(rec) -> KlineData:
+    return KlineData(*rec, ignore="0")
+
+
+def array_to_klines(arr: np.ndarray) -> List[KlineData]:
+    """BAR_DTYPE 数组 → KlineData 列表（需要逐根对象的检测器用）"""
+    return [_unpack(r) for r in arr.tolist()]
+
+
+class BarStore:
+    def __init__(self, root: str = BAR_STORE_DIR):
+        self.root = root
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+        self._gaps: Dict[tuple, List[Gap]] = {}   # (symbol, interval) -> 已知缺口
+
+    def path(self, symbol: str, interval: str) -> str:
+        return os.path.join(self.root, interval, f"{symbol}.bin")
+
+    def holes_path(self, symbol: str, interval: str) -> str:
+        return os.path.join(self.root, interval, f"{symbol}.holes.json")
+
+    def _lock(self, path: str) -> threading.Lock:
+        with self._locks_guard:
+            lk = self._locks.get(path)
+            if lk is None:
+                lk = self._locks[path] = threading.Lock()
+            return lk
+
+    def symbols(self, interval: str) -> List[str]:
+        d = os.path.join(self.root, interval)
+        if not os.path.isdir(d):
+            return []
+        return sorted(n[:-len(".bin")] for n in os.listdir(d) if n.endswith(".bin"))
+
+    # ---------- 读 ----------
+    @staticmethod
+    def _read(path: str) -> bytes:
+        try:
+            with open(path, "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return b""
+
+    @staticmethod
+    def _bisect(buf: bytes, ts: int) -> int:
+        """第一条 open_time >= ts 的记录下标"""
+        lo, hi = 0, len(buf) // REC_SIZE
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if struct.unpack_from("<q", buf, mid * REC_SIZE)[0] < ts:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def load(self, symbol: str, interval: str,
+             start_ms: Optional[int] = None, end_ms: Optional[int] = None) -> List[KlineData]:
+        """[start_ms, end_ms] 闭区间（按 open_time）"""
+        buf = self._read(self.path(symbol, interval))
+        n = len(buf) // REC_SIZE
+        i = self._bisect(buf, start_ms) if start_ms is not None else 0
+        j = self._bisect(buf, end_ms + 1) if end_ms is not None else n
+        if i >= j:
+            return []
+        return [_unpack(r) for r in _REC.iter_unpack(buf[i * REC_SIZE: j * REC_SIZE])]
+
+    def load_array(self, symbol: str, interval: str,
+                   start_ms: Optional[int] = None, end_ms: Optional[int] = None) -> np.ndarray:
+        """同 load，返回 BAR_DTYPE 结构化数组"""
+        buf = self._read(self.path(symbol, interval))
+        n = len(buf) // REC_SIZE
+        i = self._bisect(buf, start_ms) if start_ms is not None else 0
+        j = self._bisect(buf, end_ms + 1) if end_ms is not None else n
+        if i >= j:
+            return np.empty(0, dtype=BAR_DTYPE)
+        return np.frombuffer(buf, dtype=BAR_DTYPE, count=j - i, offset=i * REC_SIZE)
+
+    def open_times(self, symbol: str, interval: str) -> List[int]:
+        buf = self._read(self.path(symbol, interval))
+        return [r[0] for r in _REC.iter_unpack(buf[: len(buf) - len(buf) % REC_SIZE])]
+
+    def first_open_ms(self, symbol: str, interval: str) -> Optional[int]:
+        try:
+            with open(self.path(symbol, interval), "rb") as f:
+                head = f.read(8)
+        except FileNotFoundError:
+            return None
+        return struct.unpack("<q", head)[0] if len(head) == 8 else None
+
+    def last_open_ms(self, symbol: str, interval: str) -> Optional[int]:
+        path = self.path(symbol, interval)
+        try:
+            size = os.path.getsize(path)
+        except FileNotFoundError:
+            return None
+        if size < REC_SIZE:
+            return None
+        with open(path, "rb") as f:
+            f.seek((size // REC_SIZE - 1) * REC_SIZE)
+            return struct.unpack("<q", f.read(8))[0]
+
+    def known_gaps(self, symbol: str, interval: str) -> List[Gap]:
+        """本进程 merge 过程中发现、尚未补上的缺口（全量扫描用 gaps.find_gaps(open_times(...))）"""
+        return list(self._gaps.get((symbol, interval), []))
+
+    def _record_gaps(self, key: tuple, found: List[Gap], step: int, replace: bool):
+        old = set(self._gaps.get(key, []))
+        new = [g for g in found if g not in old]
+        self._gaps[key] = sorted(found) if replace else sorted(old.union(found))
+        GAP_STATS.add("merges_checked")
+        if new:
+            GAP_STATS.add("gaps_found", len(new))
+            GAP_STATS.add("bars_missing", gap_bars(new, step))
+
+    def unfillable(self, symbol: str, interval: str) -> List[Gap]:
+        """修补过、交易所那边也没有数据的区间"""
+        try:
+            with open(self.holes_path(symbol, interval), "r", encoding="utf-8") as f:
+                return [tuple(g) for g in json.load(f)]
+        except FileNotFoundError:
+            return []
+
+    # ---------- 写 ----------
+    def mark_unfillable(self, symbol: str, interval: str, holes: List[Gap]):
+        if not holes:
+            return
+        path = self.holes_path(symbol, interval)
+        with self._lock(path):
+            merged = sorted(set(self.unfillable(symbol, interval)).union(holes))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump([list(g) for g in merged], f)
+            os.replace(tmp, path)
+
+    def merge(self, symbol: str, interval: str, klines: List[KlineData]) -> int:
+        """合并一批 bar，返回新增条数（覆盖已有 open_time 不计）"""
+        now_ms = int(time.time() * 1000)
+        fresh = {k.open_time: k for k in klines if k.close_time < now_ms}
+        if not fresh:
+            return 0
+
+        path = self.path(symbol, interval)
+        step = interval_ms(KlineInterval(interval))
+        key = (symbol, interval)
+        with self._lock(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            last = self.last_open_ms(symbol, interval)
+            bars = [fresh[t] for t in sorted(fresh)]
+
+            # 快路径：全部在尾部之后，只需检查新段（含与旧尾部的衔接）
+            if last is None or bars[0].open_time > last:
+                with open(path, "ab") as f:
+                    f.write(b"".join(_pack(k) for k in bars))
+                head = [last] if last is not None else []
+                self._record_gaps(key, find_gaps(head + [k.open_time for k in bars], step), step, replace=False)
+                return len(bars)
+
+            existing = {k.open_time: k for k in self.load(symbol, interval)}
+            added = sum(1 for t in fresh if t not in existing)
+            existing.update(fresh)
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(b"".join(_pack(existing[t]) for t in sorted(existing)))
+            os.replace(tmp, path)
+            self._record_gaps(key, find_gaps(sorted(existing), step), step, replace=True)
+            return added
+
+
+class StoreMonitor:
+    """
+    RunMode.OFFLINE 下替代 BNMonitor：getSymbolKlines 同签名，只从本地库读
+    和接口一样默认最多返回 500 根
+    """
+    DEFAULT_LIMIT = 500
+
+    def __init__(self, store: Optional[BarStore] = None):
+        self.store = store if store is not None else BarStore()
+
+    def getSymbolKlines(self, symbol, internal, startTimeUnix, endTimeUnix=None, limit=None,
+                        raise_errors=False) -> List[KlineData]:
+        kl = self.store.load(symbol, internal, startTimeUnix, endTimeUnix)
+        return kl[: limit or self.DEFAULT_LIMIT]
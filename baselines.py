@@ -0,0 +1,206 @@
+# baselines.py
+"""
+每个 symbol 的长周期基线（从本地 K线库算），让检测器用 symbol 自己的尺度而不是全市场一个常数
+
+- 每晚跑一次：python baselines.py build [--days 30]
+- 结果是一张按 symbol 排序的 numpy 结构化数组（BASELINE_PATH，.npy），启动时整表读一次，searchsorted 查找
+- 每行：bar 波动分位数、「安静窗口」的 p90 / max（静默箱体判定用的同一个量，取其历史低分位）、
+  成交量中位数、主动买占比分布、是否结构性排除
+- excluded：该 symbol 历史上最安静的窗口都达不到阈值上限（或根本没量），strict 永远不会过 → step_symbol 跳过 strict（吸筹 / 盘中提前突破照常）
+- 库里没有 / 历史太短的 symbol 查不到，检测器用原来的全局阈值
+
+用法：
+    python baselines.py build [--days 30] [--out data/baselines.npy]
+    python baselines.py show BTCUSDT
+"""
+import argparse
+import os
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+import env
+from interal_enum import KlineInterval
+
+BASELINE_DAYS = 30
+MIN_BARS = 12 * 24 * 3          # 至少 3 天 5m 数据才出基线
+QUIET_WINDOW = 108              # = strict 的静默段长度（window_len - confirm_len）
+QUIET_STRIDE = 12               # 滑窗步长（1 小时）
+QUIET_Q = 25                    # 取窗口 p90 / max 分布的 25 分位作为「这个币安静时的样子」
+
+# 归一化阈值 = 基线 × 宽松系数，再夹在 [下限, 上限] 里；上限之外判为结构性排除
+SILENT_SLACK = 1.25
+SILENT_P90_CLIP = (0.004, 0.03)     # 全局默认 0.015
+SILENT_MAX_CLIP = (0.01, 0.08)      # 全局默认 0.04
+ACCUM_P90_CLIP = (0.006, 0.036)     # 全局默认 0.018
+ACCUM_MAX_CLIP = (0.012, 0.07)      # 全局默认 0.035
+STRICT_BUY_EDGE = 0.08              # strict 买占比下限 = 平时中位数 + 0.08（全局 0.58）
+ACCUM_BUY_EDGE = 0.02               # 吸筹买占比下限 = 平时中位数 + 0.02（全局 0.52）
+BUY_CLIP = (0.5, 0.65)
+
+BASELINE_DTYPE = np.dtype([
+    ("symbol", "U24"),
+    ("n_bars", "<i4"),
+    ("built_ms", "<i8"),
+    ("range_p50", "<f4"),
+    ("range_p90", "<f4"),
+    ("range_p99", "<f4"),
+    ("quiet_p90", "<f4"),
+    ("quiet_max", "<f4"),
+    ("vol_median", "<f8"),
+    ("vol_p90", "<f8"),
+    ("buy_p10", "<f4"),
+    ("buy_p50", "<f4"),
+    ("buy_p90", "<f4"),
+    ("excluded", "?"),
+])
+
+
+def _clip(x: float, bounds) -> float:
+    return float(min(max(x, bounds[0]), bounds[1]))
+
+
+def compute_row(symbol: str, bars: np.ndarray, built_ms: int) -> Optional[np.void]:
+    """bars: bar_store.BAR_DTYPE 数组；历史太短返回 None"""
+    if len(bars) < MIN_BARS:
+        return None
+    close = np.where(bars["close_price"] > 0, bars["close_price"], np.inf)   # 同 _range_ratio：close<=0 记 0
+    ranges = (bars["high_price"] - bars["low_price"]) / close
+    vol = bars["volume"]
+    traded = vol > 0
+    buy = bars["buy_volume"][traded] / vol[traded]
+
+    # 和 strict 静默段同样长度的滑窗，每个窗口的 p90 / max
+    win = np.lib.stride_tricks.sliding_window_view(ranges, QUIET_WINDOW)[::QUIET_STRIDE]
+    quiet_p90 = float(np.percentile(np.percentile(win, 90, axis=1), QUIET_Q))
+    quiet_max = float(np.percentile(win.max(axis=1), QUIET_Q))
+
+    vol_median = float(np.median(vol))
+    row = np.zeros((), dtype=BASELINE_DTYPE)
+    row["symbol"] = symbol
+    row["n_bars"] = len(bars)
+    row["built_ms"] = built_ms
+    row["range_p50"], row["range_p90"], row["range_p99"] = np.percentile(ranges, [50, 90, 99])
+    row["quiet_p90"] = quiet_p90
+    row["quiet_max"] = quiet_max
+    row["vol_median"] = vol_median
+    row["vol_p90"] = float(np.percentile(vol, 90))
+    if len(buy):
+        row["buy_p10"], row["buy_p50"], row["buy_p90"] = np.percentile(buy, [10, 50, 90])
+    else:
+        row["buy_p50"] = 0.5
+    # 安静时都超过阈值上限，或者一半以上的 bar 没成交：strict 不可能通过
+    row["excluded"] = (quiet_p90 * SILENT_SLACK > SILENT_P90_CLIP[1]
+                       or quiet_max * SILENT_SLACK > SILENT_MAX_CLIP[1]
+                       or vol_median <= 0)
+    return row
+
+
+class Baseline:
+    """单个 symbol 的基线 + 由它推出来的检测器参数"""
+    __slots__ = ("row", "excluded", "strict_kwargs", "accum_kwargs")
+
+    def __init__(self, row: np.void):
+        self.row = row
+        self.excluded = bool(row["excluded"])
+        buy_p50 = float(row["buy_p50"])
+        self.strict_kwargs = {
+            "silent_p90_max": _clip(float(row["quiet_p90"]) * SILENT_SLACK, SILENT_P90_CLIP),
+            "silent_max": _clip(float(row["quiet_max"]) * SILENT_SLACK, SILENT_MAX_CLIP),
+            "buy_ratio_min": _clip(buy_p50 + STRICT_BUY_EDGE, BUY_CLIP),
+        }
+        self.accum_kwargs = {
+            "range_p90_max": _clip(float(row["quiet_p90"]) * SILENT_SLACK * 1.2, ACCUM_P90_CLIP),
+            "range_max": _clip(float(row["quiet_max"]) * SILENT_SLACK, ACCUM_MAX_CLIP),
+            "buy_ratio_min": _clip(buy_p50 + ACCUM_BUY_EDGE, BUY_CLIP),
+        }
+
+    def __repr__(self):
+        return f"Baseline({self.row['symbol']}, excluded={self.excluded}, strict={self.strict_kwargs}, accum={self.accum_kwargs})"
+
+
+class BaselineTable:
+    def __init__(self, table: Optional[np.ndarray] = None):
+        self.table = table if table is not None else np.empty(0, dtype=BASELINE_DTYPE)
+        self._cache: Dict[str, Optional[Baseline]] = {}
+
+    def __len__(self):
+        return len(self.table)
+
+    @classmethod
+    def load(cls, path: str) -> "BaselineTable":
+        try:
+            table = np.load(path, allow_pickle=False)
+        except FileNotFoundError:
+            return cls()
+        if table.dtype != BASELINE_DTYPE:
+            print(f"⚠️ {path} 的字段和当前版本不一致，忽略（重新跑 baselines.py build）")
+            return cls()
+        return cls(table)
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = path + ".tmp.npy"
+        np.save(tmp, self.table, allow_pickle=False)
+        os.replace(tmp, path)
+
+    def get(self, symbol: str) -> Optional[Baseline]:
+        if symbol in self._cache:
+            return self._cache[symbol]
+        i = int(np.searchsorted(self.table["symbol"], symbol))
+        b = Baseline(self.table[i]) if i < len(self.table) and self.table["symbol"][i] == symbol else None
+        self._cache[symbol] = b
+        return b
+
+
+def build(store=None, symbols: Optional[List[str]] = None, days: int = BASELINE_DAYS,
+          interval: str = KlineInterval.MINUTE_5.value) -> BaselineTable:
+    from bar_store import BarStore
+
+    store = store if store is not None else BarStore()
+    now_ms = int(time.time() * 1000)
+    start_ms = now_ms - days * 24 * 3600 * 1000
+    rows = []
+    for s in sorted(symbols if symbols is not None else store.symbols(interval)):
+        row = compute_row(s, store.load_array(s, interval, start_ms), now_ms)
+        if row is not None:
+            rows.append(row)
+    table = np.array(rows, dtype=BASELINE_DTYPE)
+    table.sort(order="symbol")
+    return BaselineTable(table)
+
+
+_TABLE: Optional[BaselineTable] = None
+
+
+def get_baselines() -> BaselineTable:
+    """进程内只读一次 BASELINE_PATH；文件不存在时是空表（全部用全局阈值）"""
+    global _TABLE
+    if _TABLE is None:
+        _TABLE = BaselineTable.load(env.BASELINE_PATH)
+    return _TABLE
+
+
+def get_baseline(symbol: str) -> Optional[Baseline]:
+    return get_baselines().get(symbol)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="per-symbol baseline statistics")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_build = sub.add_parser("build")
+    p_build.add_argument("--days", type=int, default=BASELINE_DAYS)
+    p_build.add_argument("--out", default=None)
+    p_show = sub.add_parser("show")
+    p_show.add_argument("symbol")
+    args = parser.parse_args()
+
+    if args.cmd == "build":
+        t0 = time.time()
+        t = build(days=args.days)
+        t.save(args.out or env.BASELINE_PATH)
+        n_ex = int(t.table["excluded"].sum()) if len(t) else 0
+        print(f"✅ {len(t)} symbols, {n_ex} excluded, {time.time() - t0:.1f}s → {args.out or env.BASELINE_PATH}")
+    else:
+        print(get_baseline(args.symbol))
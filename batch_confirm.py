@@ -0,0 +1,216 @@
+# batch_confirm.py
+"""
+回测用的批量二次确认：一次性算完所有 strict 候选的 trap / hold / TTL / 跌回箱体，不走逐根的状态机
+
+和 step_symbol 的 pending 分支等价：
+- 候选在 bar i 生成（pending.created_ms = t[i]），突破 bar 为 bo
+- 第一次能确认的 bar：e = max(i+1, bo+confirm_bars)（生成当根不检查 pending）
+- 过期：x = 第一个 t[j] - t[i] > ttl 的 j；TTL 在确认之前检查，所以只有 e < x 才会确认 / 取消
+- trap_score_after_breakout 只看 bo 后两根，hold_ok 也只看两根：
+  e 处没确认、也没跌回箱体，之后每根结论都一样，只能等到 x 过期
+- 候选互斥：pending 在 r（确认 / 取消 = e，否则 = x）清掉，同一根 bar 上 strict 还会再跑，
+  所以下一个候选要求 i >= r（贪心扫一遍，循环次数 = 候选数）
+
+不覆盖：live 的 PENDING_LOST（视图里找不到突破 bar，24h 视图 + 6 根 TTL 下不会发生）
+
+用法：
+    python batch_confirm.py BASUSDT [--days 30] [--check]
+"""
+import argparse
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from env import CONFIRM_BARS, PENDING_TTL_BARS, SCORE_MIN, TRAP_MAX
+from replay_engine import BAR_MS
+
+
+def _columns(bars) -> Dict[str, np.ndarray]:
+    """bar_store.BAR_DTYPE 数组或 KlineData 列表 → 各列 ndarray"""
+    names = ("open_time", "open_price", "high_price", "low_price", "close_price", "volume", "buy_volume")
+    if isinstance(bars, np.ndarray):
+        return {n: bars[n] for n in names}
+    return {n: np.array([getattr(k, n) for k in bars], dtype=np.int64 if n == "open_time" else float)
+            for n in names}
+
+
+def collect_strict_candidates(klines, *, score_min=SCORE_MIN, htf_require=(), baseline=None,
+                              window_len: int = 120) -> Dict[str, np.ndarray]:
+    """
+    klines: KlineData 列表或 bar_store.BAR_DTYPE 数组（数组先转成 KlineData，strict / 大周期聚合逐根要对象）
+    每根 bar 跑一次 strict（和 replay 一样只看最后 window_len 根），留下能生成候选的 bar
+    返回数组：idx / bo_idx / box_top / eps / score
+    """
+    from bar_store import array_to_klines
+    from replay_engine import _htf_agrees
+    from resample import MultiResampler
+    from strategy import is_real_volume_breakout_5m_strict
+
+    if isinstance(klines, np.ndarray):
+        klines = array_to_klines(klines)
+    out = {"idx": [], "bo_idx": [], "box_top": [], "eps": [], "score": []}
+    # 结构性排除的 symbol 没有候选
+    n = 0 if baseline is not None and baseline.excluded else len(klines)
+    strict_kwargs = baseline.strict_kwargs if baseline is not None else {}
+    pos = {k.open_time: i for i, k in enumerate(klines)}
+    htf = MultiResampler(htf_require)
+    for i in range(n):
+        htf.update(klines[i])
+        if i + 1 < window_len:
+            continue
+        ok, info = is_real_volume_breakout_5m_strict(klines[i + 1 - window_len: i + 1], **strict_kwargs)
+        if not ok or float(info["score"]) < score_min:
+            continue
+        if htf_require and not _htf_agrees(htf.views(), htf_require):
+            continue
+        out["idx"].append(i)
+        out["bo_idx"].append(pos[int(info["breakout_open_time"])])
+        out["box_top"].append(float(info["box_top"]))
+        out["eps"].append(float(info.get("break_eps", 0.003)))
+        out["score"].append(float(info["score"]))
+    return {
+        "idx": np.array(out["idx"], dtype=np.int64),
+        "bo_idx": np.array(out["bo_idx"], dtype=np.int64),
+        "box_top": np.array(out["box_top"], dtype=float),
+        "eps": np.array(out["eps"], dtype=float),
+        "score": np.array(out["score"], dtype=float),
+    }
+
+
+def _evaluate(c: Dict[str, np.ndarray], bo, n_after: int, box_top, eps):
+    """bo 后 n_after 根已经出来时的 (trap, hold_ok, back_into_box)，和 step_symbol 同口径"""
+    if n_after < 2:
+        # trap_score_after_breakout 不足两根直接给 0；hold 只看一根
+        hold = c["close_price"][bo + 1] > box_top * (1.0 + eps / 2)
+        zero = np.zeros(len(bo))
+        return zero, hold, zero.astype(bool)
+
+    b1, b2 = bo + 1, bo + 2
+    o1, o2 = c["open_price"][b1], c["open_price"][b2]
+    c1, c2 = c["close_price"][b1], c["close_price"][b2]
+    h1, h2 = c["high_price"][b1], c["high_price"][b2]
+    l1, l2 = c["low_price"][b1], c["low_price"][b2]
+    v1, v2 = c["volume"][b1], c["volume"][b2]
+    bv1, bv2 = c["buy_volume"][b1], c["buy_volume"][b2]
+
+    def wick(o, h, l, cl):
+        return (h - np.maximum(o, cl)) / np.maximum(1e-12, h - l)
+
+    def buy_ratio(bv, v):
+        return np.where(v > 0, bv / np.where(v > 0, v, 1.0), 0.0)
+
+    back = np.minimum(l1, l2) < box_top * (1.0 - eps)
+    trap = (
+        30.0 * (np.abs(c2 - o2) < np.abs(c1 - o1) * 0.5)
+        + 20.0 * (v2 < v1 * 0.7)
+        + 20.0 * ((np.maximum(c1, c2) - box_top) / np.maximum(1e-12, box_top) < 0.005)
+        + 40.0 * back
+        + 15.0 * ((wick(o1, h1, l1, c1) > 0.6) | (wick(o2, h2, l2, c2) > 0.6))
+        + 15.0 * (buy_ratio(bv2, v2) < buy_ratio(bv1, v1) * 0.85)
+    )
+    hold = (c1 > box_top * (1.0 + eps / 2)) & (c2 > box_top * (1.0 + eps / 2))
+    return trap, hold, back
+
+
+def batch_confirm(klines, candidates: Dict[str, np.ndarray], *, trap_max=TRAP_MAX,
+                  confirm_bars=CONFIRM_BARS, pending_ttl_bars=PENDING_TTL_BARS) -> List[tuple]:
+    """
+    klines: BAR_DTYPE 数组或 KlineData 列表；candidates: collect_strict_candidates 的结果（idx 升序）
+    返回 [(now_ms, "BREAKOUT_CONFIRMED", pend, trap), ...]，pend 和 step_symbol 里的同结构
+    """
+    c = _columns(klines)
+    t = c["open_time"]
+    n = len(t)
+    idx, bo = candidates["idx"], candidates["bo_idx"]
+    if len(idx) == 0:
+        return []
+    box_top, eps = candidates["box_top"], candidates["eps"]
+
+    e = np.maximum(idx + 1, bo + max(1, confirm_bars))
+    x = np.searchsorted(t, t[idx] + pending_ttl_bars * BAR_MS, side="right")
+
+    # 评估点在数据范围内、且没先过期的才看 trap / hold
+    live = (e < x) & (e < n)
+    confirmed = np.zeros(len(idx), dtype=bool)
+    cancelled = np.zeros(len(idx), dtype=bool)
+    trap = np.zeros(len(idx))
+    at = e.copy()
+
+    def apply(mask, n_after):
+        if mask.any():
+            tr, hold, back = _evaluate(c, bo[mask], n_after, box_top[mask], eps[mask])
+            ok = hold & (tr <= trap_max)
+            confirmed[mask] = ok
+            cancelled[mask] = ~ok & back
+            trap[mask] = tr
+
+    # e 处 bo 后已有的根数 = e - bo；只有 1 根时（confirm_bars=1 且当根就是突破 bar 的下一根）
+    # 结论可能和两根时不同，下一根再看一次，之后就稳定了
+    one = live & (e - bo == 1)
+    apply(live & ~one, 2)
+    apply(one, 1)
+    e2 = e + 1
+    second = one & ~confirmed & ~cancelled & (e2 < x) & (e2 < n)
+    apply(second, 2)
+    at[second] = e2[second]
+
+    resolved = confirmed | cancelled
+    r = np.where(resolved, at, np.minimum(x, n))
+
+    # 互斥：上一个 pending 清掉的那根 bar 起才可能生成下一个候选
+    events = []
+    free_from = 0
+    for k in range(len(idx)):
+        if idx[k] < free_from:
+            continue
+        free_from = int(r[k])
+        if confirmed[k]:
+            pend = {
+                "created_ms": int(t[idx[k]]),
+                "breakout_open_time": int(t[bo[k]]),
+                "box_top": float(box_top[k]),
+                "break_eps": float(eps[k]),
+                "score": float(candidates["score"][k]),
+            }
+            events.append((int(t[at[k]]), "BREAKOUT_CONFIRMED", pend, float(trap[k])))
+    return events
+
+
+if __name__ == "__main__":
+    from bar_store import BarStore
+    from interal_enum import KlineInterval
+
+    parser = argparse.ArgumentParser(description="vectorized pending confirmation over a bar-store history")
+    parser.add_argument("symbol")
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--check", action="store_true", help="和逐根 replay 的结果逐条对比")
+    args = parser.parse_args()
+
+    store = BarStore()
+    start_ms = int(time.time() * 1000) - args.days * 24 * 3600 * 1000
+    kl = store.load(args.symbol, KlineInterval.MINUTE_5.value, start_ms, None)
+
+    t0 = time.perf_counter()
+    cands = collect_strict_candidates(kl)
+    t1 = time.perf_counter()
+    events = batch_confirm(kl, cands)
+    t2 = time.perf_counter()
+    for ts, evt, pend, trap in events:
+        print(ts, evt, f"score={pend['score']:.0f}", f"trap={trap:.0f}")
+    print(f"{len(kl)} bars, {len(cands['idx'])} candidates, {len(events)} confirmed | "
+          f"collect {t1 - t0:.2f}s, confirm {(t2 - t1) * 1000:.1f}ms")
+
+    if args.check:
+        from replay_engine import step_symbol
+        from state import SymbolRuntimeState
+
+        rt = SymbolRuntimeState()
+        scalar = []
+        for i in range(len(kl)):
+            for evt, pend, trap in step_symbol(rt, kl[max(0, i - 287): i + 1], kl[i].open_time,
+                                               score_min=SCORE_MIN, trap_max=TRAP_MAX,
+                                               confirm_bars=CONFIRM_BARS, pending_ttl_bars=PENDING_TTL_BARS):
+                scalar.append((kl[i].open_time, evt, pend, trap))
+        same = [(a[0], a[2], a[3]) for a in scalar] == [(b[0], b[2], b[3]) for b in events]
+        print(f"scalar replay: {len(scalar)} confirmed, identical={same}")
@@ -0,0 +1,65 @@
+# bench_startup.py
+"""
+冷启动预算：在干净的子进程里 import 各入口模块，取多次中位数
+import 阶段不允许碰网络 / 建线程池，超预算直接非 0 退出
+
+用法：
+    python bench_startup.py [--runs 5] [--budget 0.5] [--top 10]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+COLD_START_BUDGET_SEC = 0.5
+MODULES = ("gainers_predict_main", "recall", "replay_engine", "warm_up", "shard_runner", "backfill")
+
+
+def _import_once(module: str) -> float:
+    env = dict(os.environ, BN_RUN_MODE="offline")
+    t0 = time.perf_counter()
+    subprocess.run([sys.executable, "-c", f"import {module}"], check=True, env=env,
+                   cwd=os.path.dirname(os.path.abspath(__file__)))
+    return time.perf_counter() - t0
+
+
+def _top_imports(module: str, top: int):
+    """python -X importtime 里累计耗时最大的几个模块"""
+    r = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                       capture_output=True, text=True,
+                       cwd=os.path.dirname(os.path.abspath(__file__)))
+    rows = []
+    for line in r.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _self_us, cum_us, name = line[len("import time:"):].split("|")
+        rows.append((int(cum_us), name.strip()))
+    rows.sort(reverse=True)
+    return rows[:top]
+
+
+def run(runs: int, budget: float, top: int) -> bool:
+    baseline = statistics.median(_import_once("sys") for _ in range(runs))
+    print(f"interpreter baseline: {baseline * 1000:.0f} ms")
+
+    ok = True
+    for m in MODULES:
+        t = statistics.median(_import_once(m) for _ in range(runs))
+        flag = "✅" if t <= budget else "❌"
+        ok &= t <= budget
+        print(f"{flag} {m:<22} {t * 1000:6.0f} ms  (import only: {(t - baseline) * 1000:.0f} ms)")
+        if top:
+            for cum_us, name in _top_imports(m, top):
+                print(f"      {cum_us / 1000:7.1f} ms  {name}")
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="cold-start import budget")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget", type=float, default=COLD_START_BUDGET_SEC, help="秒")
+    parser.add_argument("--top", type=int, default=0, help="每个入口打印最慢的 N 个 import")
+    args = parser.parse_args()
+    sys.exit(0 if run(args.runs, args.budget, args.top) else 1)
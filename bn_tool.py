@@ -4,11 +4,6 @@ from dataclasses import dataclass
 from datetime import datetime
 from typing import List
 
-import urllib3
-from binance import BinanceAPIException
-from binance.client import Client  # 现货客户端
-from requests import RequestException
-
 import time
 
 from interal_enum import KlineInterval
@@ -45,6 +40,24 @@ class KlineData:
         from datetime import datetime
         return datetime.fromtimestamp(self.close_time / 1000).strftime("%Y-%m-%d %H:%M:%S")
 
+def parse_kline(kline) -> KlineData:
+    """币安 K线原始数组（REST 返回 / 数据归档 CSV 一行）→ KlineData"""
+    return KlineData(
+        open_time=int(kline[0]),
+        open_price=float(kline[1]),
+        high_price=float(kline[2]),
+        low_price=float(kline[3]),
+        close_price=float(kline[4]),
+        volume=float(kline[5]),
+        close_time=int(kline[6]),
+        quote_volume=float(kline[7]),
+        trade_count=int(kline[8]),
+        buy_volume=float(kline[9]),
+        buy_quote_volume=float(kline[10]),
+        ignore=str(kline[11]),
+    )
+
+
 class QPSLimiter:
     def __init__(self, max_qps: int):
         self.max_qps = max_qps
@@ -64,34 +77,54 @@ class QPSLimiter:
             self.last_request_time = time.time()
 
 
-class BNMonitor:
-    def __init__(self):
-        self.client = Client(api_key=API_KEY, api_secret=SECRET_KEY, testnet=False)
-        self.qps_limiter = QPSLimiter(8)
+def make_client():
+    """真实的币安客户端（构造时会 ping 一次交易所）"""
+    from binance.client import Client  # 现货客户端
+    return Client(api_key=API_KEY, api_secret=SECRET_KEY, testnet=False)
 
 
-    def getSymbolKlines(self,symbol,internal,startTimeUnix) -> List[KlineData]:
+class BNMonitor:
+    """
+    client 延迟到第一次请求才创建（Client 构造会 ping 一次交易所，import binance 本身也很重）
+    client 参数可以直接注入假的 / 录制回放用的客户端
+    """
+    def __init__(self, max_qps: int = 8, client=None):
+        self._client = client
+        self._client_lock = threading.Lock()
+        self.qps_limiter = QPSLimiter(max_qps)
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = make_client()
+        return self._client
+
+    def getSymbolKlines(self,symbol,internal,startTimeUnix,endTimeUnix=None,limit=None,raise_errors=False) -> List[KlineData]:
+        return [parse_kline(k) for k in self.getRawKlines(symbol, internal, startTimeUnix, endTimeUnix, limit, raise_errors)]
+
+    def getRawKlines(self,symbol,internal,startTimeUnix,endTimeUnix=None,limit=None,raise_errors=False) -> list:
+        """
+        只拉取不解析，返回接口原始数组（流水线里解析放到单独的 decode stage）；失败返回 []
+        raise_errors=True 时打印后把异常抛给调用方（修补缺口要区分「交易所没有数据」和「请求失败」）
+        """
+        import urllib3
+        from binance.exceptions import BinanceAPIException
+        from requests import RequestException
+
         self.qps_limiter.acquire()
-        kline_list = []
+        resp = []
+        failed = None
         try:
-            resp = self.client.futures_klines(symbol=symbol, interval=internal, startTime=startTimeUnix)
-            for kline in resp:
-                data = KlineData(
-                    open_time=kline[0],
-                    open_price=float(kline[1]),
-                    high_price=float(kline[2]),
-                    low_price=float(kline[3]),
-                    close_price=float(kline[4]),
-                    volume=float(kline[5]),
-                    close_time=kline[6],
-                    quote_volume=float(kline[7]),
-                    trade_count=int(kline[8]),
-                    buy_volume=float(kline[9]),
-                    buy_quote_volume=float(kline[10]),
-                    ignore=kline[11]
-                )
-                kline_list.append(data)
+            params = {"symbol": symbol, "interval": internal, "startTime": startTimeUnix}
+            if endTimeUnix is not None:
+                params["endTime"] = endTimeUnix
+            if limit is not None:
+                params["limit"] = limit
+            resp = self.client.futures_klines(**params)
         except BinanceAPIException as e:
+            failed = e
             if e.status_code == 429:
                 error_msg = (
                     f"\n{'=' * 80}\n"
@@ -111,6 +144,7 @@ class BNMonitor:
                 )
                 print(error_msg)
         except (urllib3.exceptions.ReadTimeoutError, RequestException) as e:
+            failed = e
             # 新增：捕获网络相关异常（超时、连接失败等）
             error_msg = (
                 f"\n{'=' * 80}\n"
@@ -123,6 +157,7 @@ class BNMonitor:
             )
             print(error_msg)
         except Exception as e:
+            failed = e
             # 兜底：捕获其他未预料到的异常（可选，避免程序崩溃）
             error_msg = (
                 f"\n{'=' * 80}\n"
@@ -134,7 +169,9 @@ class BNMonitor:
             )
             print(error_msg)
 
-        return kline_list
+        if failed is not None and raise_errors:
+            raise failed
+        return resp
 
     def getTargetSymbols(self):
         resp = self.client.futures_exchange_info()
@@ -0,0 +1,331 @@
+# cluster.py
+"""
+多节点部署：每个节点独立 IP + 独立限流预算，按一致性哈希分 symbol
+
+- 成员关系靠协调后端的心跳（过期即视为离开）
+- 成员变化 → 重新计算 ownership：
+    失去的 symbol：写 SymbolFeed 快照到后端后丢弃
+    新得到的 symbol：优先从后端取快照恢复（等待 HANDOFF_WAIT_SEC），取不到再冷启动
+    快照超过 SNAPSHOT_TTL_SEC（写入时间或最后一根 bar）直接丢弃、冷启动，不对早已过去的 bar 补发报警
+- 后端可插拔：FileBackend（共享目录 / 单机多进程）、RedisBackend（任意 Redis 协议兼容服务，需要 pip install redis）
+
+用法：
+    python cluster.py --node-id tokyo-1 --backend file:///mnt/shared/bn_cluster --qps 8
+    python cluster.py --node-id tokyo-2 --backend redis://10.0.0.5:6379/0 --qps 8
+"""
+import abc
+import argparse
+import bisect
+import hashlib
+import json
+import os
+import time
+import zlib
+from typing import Dict, List, Optional
+
+from alert import notify_breakout
+from env import MAX_WORKERS, POLL_INTERVAL
+from symbols import symbols
+
+VNODES = 64                # 每个节点在哈希环上的虚拟节点数
+HEARTBEAT_SEC = 10
+NODE_TTL_SEC = 30          # 超过这个时间没心跳就认为节点离开
+HANDOFF_WAIT_SEC = 60      # 新得到的 symbol 等旧 owner 交快照的最长时间
+SNAPSHOT_TTL_SEC = 15 * 60 # 快照有效期，过期的不再恢复
+TICK_SEC = 5
+
+
+def _hash64(key: str) -> int:
+    return int.from_bytes(hashlib.md5(key.encode("utf-8")).digest()[:8], "big")
+
+
+class HashRing:
+    def __init__(self, nodes: List[str], vnodes: int = VNODES):
+        self.nodes = sorted(set(nodes))
+        points = []
+        for n in self.nodes:
+            for v in range(vnodes):
+                points.append((_hash64(f"{n}#{v}"), n))
+        points.sort()
+        self._keys = [p[0] for p in points]
+        self._owners = [p[1] for p in points]
+
+    def owner(self, key: str) -> Optional[str]:
+        if not self._keys:
+            return None
+        i = bisect.bisect(self._keys, _hash64(key)) % len(self._keys)
+        return self._owners[i]
+
+    def owned_by(self, node_id: str, keys: List[str]) -> List[str]:
+        return [k for k in keys if self.owner(k) == node_id]
+
+
+# -----------------------------
+# 协调后端
+# -----------------------------
+class CoordBackend(abc.ABC):
+    """节点心跳 + 快照交接。快照是不透明 bytes（encode_snapshot 的输出）"""
+
+    @abc.abstractmethod
+    def heartbeat(self, node_id: str, info: dict):
+        ...
+
+    @abc.abstractmethod
+    def leave(self, node_id: str):
+        ...
+
+    @abc.abstractmethod
+    def live_nodes(self) -> List[str]:
+        ...
+
+    @abc.abstractmethod
+    def put_snapshot(self, symbol: str, data: bytes):
+        ...
+
+    @abc.abstractmethod
+    def pop_snapshot(self, symbol: str) -> Optional[bytes]:
+        """取走快照；不存在或超过 SNAPSHOT_TTL_SEC 返回 None"""
+
+
+class FileBackend(CoordBackend):
+    """
+    root/nodes/<node_id>.json     心跳（mtime 即心跳时间）
+    root/snapshots/<symbol>.snap  待交接的快照（mtime 即写入时间）
+    """
+    def __init__(self, root: str, node_ttl: float = NODE_TTL_SEC, snapshot_ttl: float = SNAPSHOT_TTL_SEC):
+        self.node_dir = os.path.join(root, "nodes")
+        self.snap_dir = os.path.join(root, "snapshots")
+        os.makedirs(self.node_dir, exist_ok=True)
+        os.makedirs(self.snap_dir, exist_ok=True)
+        self.node_ttl = node_ttl
+        self.snapshot_ttl = snapshot_ttl
+
+    @staticmethod
+    def _atomic_write(path: str, data: bytes):
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def heartbeat(self, node_id, info):
+        payload = dict(info, ts=time.time())
+        self._atomic_write(os.path.join(self.node_dir, f"{node_id}.json"),
+                           json.dumps(payload).encode("utf-8"))
+
+    def leave(self, node_id):
+        try:
+            os.remove(os.path.join(self.node_dir, f"{node_id}.json"))
+        except FileNotFoundError:
+            pass
+
+    def live_nodes(self):
+        now = time.time()
+        nodes = []
+        for name in os.listdir(self.node_dir):
+            if not name.endswith(".json"):
+                continue
+            try:
+                if now - os.path.getmtime(os.path.join(self.node_dir, name)) <= self.node_ttl:
+                    nodes.append(name[:-len(".json")])
+            except FileNotFoundError:
+                continue
+        return sorted(nodes)
+
+    def put_snapshot(self, symbol, data):
+        self._atomic_write(os.path.join(self.snap_dir, f"{symbol}.snap"), data)
+
+    def pop_snapshot(self, symbol):
+        path = os.path.join(self.snap_dir, f"{symbol}.snap")
+        # 先 rename 再读，保证同一份快照只会被一个节点拿走
+        claimed = f"{path}.{os.getpid()}.claim"
+        try:
+            os.replace(path, claimed)
+        except FileNotFoundError:
+            return None
+        # rename 不改 mtime：过期的快照直接删掉
+        stale = time.time() - os.path.getmtime(claimed) > self.snapshot_ttl
+        with open(claimed, "rb") as f:
+            data = f.read()
+        os.remove(claimed)
+        return None if stale else data
+
+
+class RedisBackend(CoordBackend):
+    PREFIX = "bn_monitor"
+
+    def __init__(self, url: str, node_ttl: float = NODE_TTL_SEC, snapshot_ttl: float = SNAPSHOT_TTL_SEC):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("RedisBackend 需要 redis 包：pip install redis") from e
+        self.r = redis.Redis.from_url(url)
+        self.node_ttl = int(node_ttl)
+        self.snapshot_ttl = int(snapshot_ttl)
+
+    def heartbeat(self, node_id, info):
+        payload = json.dumps(dict(info, ts=time.time()))
+        self.r.set(f"{self.PREFIX}:node:{node_id}", payload, ex=self.node_ttl)
+
+    def leave(self, node_id):
+        self.r.delete(f"{self.PREFIX}:node:{node_id}")
+
+    def live_nodes(self):
+        prefix = f"{self.PREFIX}:node:"
+        keys = self.r.scan_iter(match=f"{prefix}*")
+        return sorted(k.decode("utf-8")[len(prefix):] for k in keys)
+
+    def put_snapshot(self, symbol, data):
+        self.r.set(f"{self.PREFIX}:snap:{symbol}", data, ex=self.snapshot_ttl)
+
+    def pop_snapshot(self, symbol):
+        # GET+DEL 放在一个 MULTI 里，兼容没有 GETDEL 的实现
+        key = f"{self.PREFIX}:snap:{symbol}"
+        pipe = self.r.pipeline(transaction=True)
+        pipe.get(key)
+        pipe.delete(key)
+        data, _ = pipe.execute()
+        return data
+
+
+def make_backend(url: str) -> CoordBackend:
+    if url.startswith("redis://") or url.startswith("rediss://"):
+        return RedisBackend(url)
+    if url.startswith("file://"):
+        return FileBackend(url[len("file://"):])
+    return FileBackend(url)
+
+
+def encode_snapshot(feed) -> bytes:
+    return zlib.compress(json.dumps(feed.to_snapshot()).encode("utf-8"))
+
+
+def decode_snapshot(data: bytes, max_age_sec: float = SNAPSHOT_TTL_SEC):
+    """最后一根 bar 已经超过 max_age_sec 的快照返回 None（让调用方冷启动）"""
+    from symbol_feed import SymbolFeed
+    feed = SymbolFeed.from_snapshot(json.loads(zlib.decompress(data).decode("utf-8")))
+    last = feed.last_open_ms
+    if last is not None and time.time() * 1000 - last > max_age_sec * 1000:
+        return None
+    return feed
+
+
+# -----------------------------
+# 节点
+# -----------------------------
+class ClusterNode:
+    def __init__(self, node_id: str, backend: CoordBackend, all_symbols: List[str] = symbols,
+                 max_qps: float = 8, threads: int = MAX_WORKERS,
+                 poll_sec: float = POLL_INTERVAL * 60, bn=None):
+        from shard_runner import ShardWorker
+
+        self.node_id = node_id
+        self.backend = backend
+        self.all_symbols = list(all_symbols)
+        self.max_qps = max_qps
+        self.poll_sec = poll_sec
+        self.worker = ShardWorker(0, [], max_qps, threads, bn=bn)
+
+        self.members: List[str] = []
+        self.awaiting: Dict[str, float] = {}   # symbol -> 交接截止时间
+        self.rebalances = 0
+
+    @property
+    def owned(self) -> List[str]:
+        return list(self.worker.feeds) + list(self.awaiting)
+
+    def _heartbeat(self):
+        self.backend.heartbeat(self.node_id, {"qps": self.max_qps, "symbols": len(self.owned)})
+
+    def rebalance(self, members: List[str]):
+        ring = HashRing(members)
+        target = set(ring.owned_by(self.node_id, self.all_symbols))
+        current = set(self.owned)
+
+        lost = current - target
+        gained = target - current
+        for s in lost:
+            self.awaiting.pop(s, None)
+            feed = self.worker.feeds.pop(s, None)
+            if feed is not None and feed.ring:
+                self.backend.put_snapshot(s, encode_snapshot(feed))
+
+        # 只有自己时没人会来交接：有残留快照就用，没有立刻冷启动
+        deadline = time.time() + (HANDOFF_WAIT_SEC if len(members) > 1 else 0)
+        for s in gained:
+            self.awaiting[s] = deadline
+
+        self.members = members
+        self.rebalances += 1
+        print(f"🔁 [{self.node_id}] members={members} owned={len(target)} "
+              f"+{len(gained)} -{len(lost)}")
+
+    def _claim_handoffs(self):
+        from symbol_feed import SymbolFeed
+
+        now = time.time()
+        for s, deadline in list(self.awaiting.items()):
+            data = self.backend.pop_snapshot(s)
+            feed = decode_snapshot(data) if data is not None else None
+            if feed is not None:
+                self.worker.feeds[s] = feed
+            elif data is not None or now >= deadline:
+                # 快照过期 / 等不到交接：冷启动（首轮不补发报警）
+                self.worker.feeds[s] = SymbolFeed(s)
+            else:
+                continue
+            del self.awaiting[s]
+
+    def run_forever(self):
+        next_sweep = 0.0
+        next_beat = 0.0
+        try:
+            while True:
+                now = time.time()
+                if now >= next_beat:
+                    self._heartbeat()
+                    next_beat = now + HEARTBEAT_SEC
+
+                members = self.backend.live_nodes()
+                if self.node_id not in members:
+                    members = sorted(members + [self.node_id])
+                if members != self.members:
+                    self.rebalance(members)
+                if self.awaiting:
+                    self._claim_handoffs()
+
+                if now >= next_sweep:
+                    events, stats = self.worker.sweep()
+                    for symbol, evt, pend, trap in events:
+                        notify_breakout(symbol, pend, trap)
+                    print(f"📊 [{self.node_id}] symbols={stats['symbols']} "
+                          f"awaiting={len(self.awaiting)} sweep={stats['sweep_sec']:.1f}s "
+                          f"events={stats['events']} fetch_errors={stats['fetch_errors']}")
+                    next_sweep = now + self.poll_sec
+
+                time.sleep(TICK_SEC)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.shutdown()
+
+    def shutdown(self):
+        """先把全部快照交出去再注销，让其他节点能无缝接手"""
+        for s, feed in list(self.worker.feeds.items()):
+            if feed.ring:
+                self.backend.put_snapshot(s, encode_snapshot(feed))
+        self.worker.feeds.clear()
+        self.backend.leave(self.node_id)
+        self.worker.close()
+        print(f"🛑 [{self.node_id}] left cluster")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="multi-node monitor with consistent-hash symbol ownership")
+    parser.add_argument("--node-id", required=True)
+    parser.add_argument("--backend", required=True, help="file:///shared/dir 或 redis://host:6379/0")
+    parser.add_argument("--qps", type=float, default=8, help="本节点（本 IP）的 QPS 预算")
+    parser.add_argument("--threads", type=int, default=MAX_WORKERS)
+    args = parser.parse_args()
+
+    ClusterNode(args.node_id, make_backend(args.backend),
+                max_qps=args.qps, threads=args.threads).run_forever()
@@ -0,0 +1,281 @@
+# decision_trace.py
+"""
+决策追踪：每个 (symbol, bar) 一行，记录 step_symbol 最终走到哪个分支、为什么，以及关键指标
+
+- 开启：RunMode.DEBUG，或环境变量 BN_TRACE=1；目录 BN_TRACE_DIR（默认 data/trace）
+- 列式缓冲（array），攒够 FLUSH_ROWS 行、或距上次写出超过 FLUSH_SEC 秒时批量写一个 .npz 段文件，进程退出时补刷
+  （live 550 个 symbol 一根 bar 才几百行，只按行数要几个小时才落盘，被 kill 就全丢了）
+- 查询：python decision_trace.py why BASUSDT "2025-12-15 14:05"
+- 开销：python decision_trace.py bench（同一段行情开 / 关 trace 各跑一遍，对比每根 bar 耗时）
+"""
+import argparse
+import atexit
+import glob
+import os
+import threading
+import time
+from array import array
+from datetime import datetime
+from enum import IntEnum
+from typing import Dict, Optional
+
+import numpy as np
+
+import env
+from env import RunMode
+
+FLUSH_ROWS = 50000
+FLUSH_SEC = 60
+METRICS = ("score", "trap", "vol_strength", "buy_ratio", "box_top", "p90", "close")
+
+
+class Reason(IntEnum):
+    # 状态机分支
+    NONE = 0
+    ACCUM = 1
+    PENDING_WAIT = 2
+    PENDING_EXPIRED = 3
+    PENDING_LOST = 4
+    CONFIRMED = 5
+    BACK_INTO_BOX = 6
+    CANDIDATE = 7
+    SCORE_LOW = 8
+    HTF_REJECT = 9
+    GAP_INVALID = 10
+    EARLY_BREAKOUT = 11
+    EXCLUDED = 12
+    # strict 的拒绝原因（info["reason"] 括号前的部分）
+    NOT_ENOUGH_KLINES = 20
+    SILENT_TOO_SHORT = 21
+    SILENT_NOT_QUIET = 22
+    DOWNTREND_CONTEXT = 23
+    BASE_VOL_ZERO = 24
+    VOL_NOT_STRONG = 25
+    VOL_NOT_PERSISTENT = 26
+    NO_STRUCTURE_BREAK = 27
+    NO_CLOSE_HOLD = 28
+    TOO_MUCH_UPPER_WICK = 29
+    BODY_TOO_SMALL = 30
+    VOL_SUM_ZERO = 31
+    BUY_RATIO_LOW = 32
+    UNKNOWN = 99
+
+
+_REASON_CACHE: Dict[str, Reason] = {}
+
+
+def reason_code(reason: str) -> Reason:
+    """strict 的 reason 字符串 → Reason，如 "vol_not_strong(med_ratio=1.20)" → VOL_NOT_STRONG"""
+    key = reason.split("(", 1)[0]
+    code = _REASON_CACHE.get(key)
+    if code is None:
+        code = _REASON_CACHE[key] = Reason.__members__.get(key.upper(), Reason.UNKNOWN)
+    return code
+
+
+class DecisionTrace:
+    def __init__(self, out_dir: str, flush_rows: int = FLUSH_ROWS, flush_sec: float = FLUSH_SEC):
+        self.out_dir = out_dir
+        self.flush_rows = flush_rows
+        self.flush_sec = flush_sec
+        self._lock = threading.Lock()
+        self._seg = 0
+        self._last_flush = time.monotonic()
+        self._reset()
+
+    def _reset(self):
+        self.symbol = []
+        self.open_time = array("q")
+        self.state = array("b")
+        self.reason = array("b")
+        self.metrics = {m: array("d") for m in METRICS}
+
+    def __len__(self):
+        return len(self.open_time)
+
+    def record(self, symbol: str, open_time: int, state: int, reason: Reason, metrics: dict):
+        with self._lock:
+            self.symbol.append(symbol)
+            self.open_time.append(open_time)
+            self.state.append(state)
+            self.reason.append(reason)
+            for m, col in self.metrics.items():
+                col.append(metrics.get(m, np.nan))
+            if (len(self.open_time) >= self.flush_rows
+                    or time.monotonic() - self._last_flush >= self.flush_sec):
+                self._flush()
+
+    def bind(self, symbol: str) -> "SymbolTrace":
+        return SymbolTrace(self, symbol)
+
+    def _flush(self):
+        self._last_flush = time.monotonic()
+        if not self.open_time:
+            return
+        os.makedirs(self.out_dir, exist_ok=True)
+        self._seg += 1
+        path = os.path.join(self.out_dir, f"seg-{int(time.time())}-{os.getpid()}-{self._seg:05d}.npz")
+        cols = {
+            "symbol": np.array(self.symbol),
+            "open_time": np.frombuffer(self.open_time, dtype=np.int64),
+            "state": np.frombuffer(self.state, dtype=np.int8),
+            "reason": np.frombuffer(self.reason, dtype=np.int8),
+        }
+        cols.update({m: np.frombuffer(col, dtype=np.float64) for m, col in self.metrics.items()})
+        np.savez(path, **cols)
+        self._reset()
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+
+class SymbolTrace:
+    """绑定了 symbol 的 trace，传给 step_symbol(trace=...)"""
+    __slots__ = ("trace", "symbol")
+
+    def __init__(self, trace: DecisionTrace, symbol: str):
+        self.trace = trace
+        self.symbol = symbol
+
+    def record(self, open_time: int, state: int, reason: Reason, metrics: dict):
+        self.trace.record(self.symbol, open_time, state, reason, metrics)
+
+
+_TRACE: Optional[DecisionTrace] = None
+_TRACE_LOCK = threading.Lock()
+
+
+def tracing_enabled() -> bool:
+    return env.RUN_MODE == RunMode.DEBUG or os.getenv("BN_TRACE") == "1"
+
+
+def get_trace() -> Optional[DecisionTrace]:
+    """进程级单例；没开追踪时返回 None（调用方据此完全跳过）"""
+    global _TRACE
+    if not tracing_enabled():
+        return None
+    if _TRACE is None:
+        with _TRACE_LOCK:
+            if _TRACE is None:
+                _TRACE = DecisionTrace(env.TRACE_DIR)
+                atexit.register(_TRACE.flush)
+    return _TRACE
+
+
+def symbol_trace(symbol: str) -> Optional[SymbolTrace]:
+    t = get_trace()
+    return t.bind(symbol) if t is not None else None
+
+
+# -----------------------------
+# 查询
+# -----------------------------
+def load(trace_dir: str = None, symbol: Optional[str] = None,
+         start_ms: Optional[int] = None, end_ms: Optional[int] = None) -> Dict[str, np.ndarray]:
+    trace_dir = trace_dir or env.TRACE_DIR
+    parts = []
+    for path in sorted(glob.glob(os.path.join(trace_dir, "seg-*.npz"))):
+        with np.load(path) as z:
+            mask = np.ones(len(z["open_time"]), dtype=bool)
+            if symbol is not None:
+                mask &= z["symbol"] == symbol
+            if start_ms is not None:
+                mask &= z["open_time"] >= start_ms
+            if end_ms is not None:
+                mask &= z["open_time"] <= end_ms
+            if mask.any():
+                parts.append({k: z[k][mask] for k in z.files})
+    if not parts:
+        return {}
+    out = {k: np.concatenate([p[k] for p in parts]) for k in parts[0]}
+    order = np.argsort(out["open_time"], kind="stable")
+    return {k: v[order] for k, v in out.items()}
+
+
+def _fmt_row(cols, i) -> str:
+    from state import SignalState
+
+    t = datetime.fromtimestamp(int(cols["open_time"][i]) / 1000).strftime("%Y-%m-%d %H:%M")
+    parts = [f"{cols['symbol'][i]} {t}",
+             f"state={SignalState(int(cols['state'][i])).name}",
+             f"reason={Reason(int(cols['reason'][i])).name}"]
+    for m in METRICS:
+        v = float(cols[m][i])
+        if not np.isnan(v):
+            parts.append(f"{m}={v:.4g}")
+    return " ".join(parts)
+
+
+def why(symbol: str, when: str, trace_dir: str = None, context: int = 3) -> str:
+    """某个 symbol 在某个时间点（本地时间，精确到分钟）为什么没/有报警，附前后 context 根"""
+    ts = int(datetime.strptime(when, "%Y-%m-%d %H:%M").timestamp() * 1000)
+    bar_ms = 5 * 60 * 1000
+    cols = load(trace_dir, symbol, ts - context * bar_ms, ts + context * bar_ms)
+    if not cols:
+        return f"no trace rows for {symbol} around {when}"
+    lines = []
+    for i in range(len(cols["open_time"])):
+        mark = "👉" if int(cols["open_time"][i]) <= ts < int(cols["open_time"][i]) + bar_ms else "  "
+        lines.append(f"{mark} {_fmt_row(cols, i)}")
+    return "\n".join(lines)
+
+
+# -----------------------------
+# 开销基准
+# -----------------------------
+def bench(n_bars: int = 1500, repeat: int = 5) -> dict:
+    import tempfile
+
+    from bn_tool import parse_kline
+    from exchange_sim import SyntheticMarket, sim_symbols
+    from replay_engine import step_symbol
+    from state import SymbolRuntimeState
+
+    market = SyntheticMarket(sim_symbols(1), pattern_pct=100)
+    s = market.symbols[0]
+    kl = [parse_kline(r) for r in market.klines(s, market.base_ms, None, n_bars)]
+
+    def run(trace):
+        rt = SymbolRuntimeState()
+        t0 = time.perf_counter()
+        for i in range(120, len(kl)):
+            step_symbol(rt, kl[max(0, i - 287): i + 1], kl[i].open_time,
+                        score_min=env.SCORE_MIN, trap_max=env.TRAP_MAX,
+                        confirm_bars=env.CONFIRM_BARS, pending_ttl_bars=env.PENDING_TTL_BARS,
+                        trace=trace)
+        return time.perf_counter() - t0
+
+    with tempfile.TemporaryDirectory() as d:
+        dt = DecisionTrace(d)
+        # 交替跑、各取最小值，抵消机器噪声
+        off = on = float("inf")
+        for _ in range(repeat):
+            off = min(off, run(None))
+            on = min(on, run(dt.bind(s)))
+        dt.flush()
+    ticks = len(kl) - 120
+    return {
+        "ticks": ticks,
+        "us_per_tick_off": off / ticks * 1e6,
+        "us_per_tick_on": on / ticks * 1e6,
+        "overhead_pct": (on - off) / off * 100,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="decision trace query / benchmark")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_why = sub.add_parser("why")
+    p_why.add_argument("symbol")
+    p_why.add_argument("when", help='"YYYY-MM-DD HH:MM"（本地时间）')
+    p_why.add_argument("--dir", default=None)
+    p_why.add_argument("--context", type=int, default=3)
+    p_bench = sub.add_parser("bench")
+    p_bench.add_argument("--bars", type=int, default=1500)
+    args = parser.parse_args()
+
+    if args.cmd == "why":
+        print(why(args.symbol, args.when, args.dir, args.context))
+    else:
+        print(bench(args.bars))
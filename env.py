@@ -1,8 +1,37 @@
+import os
 from enum import Enum
 
+from interal_enum import GapPolicy
+
 
 class RunMode(Enum):
     LIVE = "live"        # 线上运行（monitor / warmup）
     BACKTEST = "backtest"  # 回测
     DEBUG = "debug"      # 单币手动调试
+    OFFLINE = "offline"  # 只读本地 K线库，不连交易所（回测 / 测试）
+
+
+RUN_MODE = RunMode(os.getenv("BN_RUN_MODE", RunMode.LIVE.value))
+
+
+def set_run_mode(mode: RunMode):
+    global RUN_MODE
+    RUN_MODE = mode
+
 
+# ========= 策略参数（monitor / shard / 回测共用） =========
+LOOKBACK_HOURS = 24
+SCORE_MIN = 80
+TRAP_MAX = 150  # 正常应该是70
+CONFIRM_BARS = 2
+PENDING_TTL_BARS = 6
+MAX_WORKERS = 10
+POLL_INTERVAL = 3
+RING_BARS = LOOKBACK_HOURS * 12  # live 环形缓冲保留的 5m bar 数
+HTF_REQUIRE = ()  # 例如 (KlineInterval.MINUTE_15, KlineInterval.HOUR_1)：候选需要大周期共振
+GAP_POLICY = GapPolicy.SKIP  # K线有缺口时检测器的处理方式（见 gaps.apply_gap_policy）
+BAR_STORE_DIR = os.getenv("BN_BAR_STORE", "data/bars")  # 本地 K线库目录（bar_store）
+CAPTURE_PATH = os.getenv("BN_CAPTURE")  # 设置后 live 会把原始 K线响应录制到该文件（session_capture）
+TRACE_DIR = os.getenv("BN_TRACE_DIR", "data/trace")  # 决策追踪输出目录（decision_trace）
+FLOW_ENABLED = os.getenv("BN_FLOW") == "1"  # live 订阅 aggTrade，盘中提前报警（order_flow）
+BASELINE_PATH = os.getenv("BN_BASELINES", "data/baselines.npy")  # 每 symbol 基线表（baselines），不存在则用全局阈值
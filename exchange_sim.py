@@ -0,0 +1,365 @@
+# exchange_sim.py
+"""
+本地交易所模拟器：压测 monitor 用，不碰币安
+
+HTTP（与 fapi 路径一致，python-binance 改 FUTURES_URL 即可直连）：
+    GET /fapi/v1/ping | /fapi/v1/time | /fapi/v1/exchangeInfo | /fapi/v1/klines | /fapi/v1/ticker/24hr
+WebSocket（可选，需要 websockets）：
+    ws://host:ws_port/ws/<symbol>@kline_5m   或   /stream?streams=a@kline_5m/b@kline_5m
+
+- K线按 symbol 确定性生成（同 seed 同结果）：普通 symbol 随机游走；
+  约 pattern_pct% 的 symbol 周期性出现「静默箱体 → 放量突破」形态，用来验证报警链路
+- 权重：按币安规则计（klines 按 limit 1/2/5/10，ticker 全量 40），每分钟超过 weight_limit 返回 429
+- 延迟注入：每个请求 sleep latency_ms ± jitter_ms
+- 时间加速：time_scale=60 时每 5 秒出一根新的 5m bar
+
+用法：
+    python exchange_sim.py --symbols 2000 --port 18080 [--ws-port 18081] [--time-scale 60] [--latency-ms 30]
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+BAR_MS = 5 * 60 * 1000
+HISTORY_BARS = 2000       # 模拟开始前已有的历史 bar 数
+CYCLE = 160               # 形态周期：静默 120 → 突破 12 → 回落 28
+QUIET_BARS = 120
+BREAKOUT_BARS = 12
+
+
+def sim_symbols(n: int) -> List[str]:
+    return [f"SIM{i:04d}USDT" for i in range(n)]
+
+
+def klines_weight(limit: int) -> int:
+    if limit < 100:
+        return 1
+    if limit < 500:
+        return 2
+    if limit <= 1000:
+        return 5
+    return 10
+
+
+class SyntheticMarket:
+    def __init__(self, symbols: List[str], seed: int = 7, pattern_pct: int = 5,
+                 time_scale: float = 1.0, start_ms: Optional[int] = None):
+        self.symbols = list(symbols)
+        self.seed = seed
+        self.pattern_pct = pattern_pct
+        self.time_scale = time_scale
+        real_now = int(time.time() * 1000)
+        self.t0_wall = time.time()
+        self.t0_sim = start_ms if start_ms is not None else real_now
+        self.base_ms = (self.t0_sim // BAR_MS - HISTORY_BARS) * BAR_MS
+
+        self._bars: Dict[str, list] = {}     # symbol -> 已生成的收盘 bar（原始数组格式）
+        self._state: Dict[str, tuple] = {}   # symbol -> (rng, price, box_center)
+        self._lock = threading.Lock()
+
+    # ---------- 时间 ----------
+    def now_ms(self) -> int:
+        return int(self.t0_sim + (time.time() - self.t0_wall) * 1000 * self.time_scale)
+
+    def wall_of(self, sim_ms: int) -> float:
+        return self.t0_wall + (sim_ms - self.t0_sim) / 1000.0 / self.time_scale
+
+    def is_planted(self, symbol: str) -> bool:
+        return zlib.crc32(symbol.encode("utf-8")) % 100 < self.pattern_pct
+
+    # ---------- 生成 ----------
+    def _next_bar(self, symbol: str, i: int) -> list:
+        rng, price, center = self._state[symbol]
+        t = self.base_ms + i * BAR_MS
+        planted = self.is_planted(symbol)
+        p = i % CYCLE
+
+        o = price
+        if planted and p < QUIET_BARS:
+            if p == 0:
+                center = price
+            c = center * (1 + rng.gauss(0, 0.0008)) * 0.7 + o * 0.3
+            wick = abs(rng.gauss(0, 0.0012))
+            vol = 1000 * rng.uniform(0.8, 1.2)
+            buy = rng.uniform(0.47, 0.53)
+        elif planted and p < QUIET_BARS + BREAKOUT_BARS:
+            c = o * (1 + rng.uniform(0.003, 0.006))
+            wick = abs(rng.gauss(0, 0.0006))
+            vol = 1000 * rng.uniform(3.5, 5.0)
+            buy = rng.uniform(0.66, 0.74)
+        else:
+            c = o * (1 + rng.gauss(0, 0.004))
+            wick = abs(rng.gauss(0, 0.003))
+            vol = 1000 * math.exp(rng.gauss(0, 0.5))
+            buy = rng.uniform(0.4, 0.6)
+
+        h = max(o, c) * (1 + wick)
+        l = min(o, c) * (1 - wick * rng.uniform(0.3, 1.0))
+        vwap = (o + c + h + l) / 4
+        self._state[symbol] = (rng, c, center)
+        return [
+            t, f"{o:.6f}", f"{h:.6f}", f"{l:.6f}", f"{c:.6f}", f"{vol:.3f}",
+            t + BAR_MS - 1, f"{vol * vwap:.4f}", int(vol / 3) + 1,
+            f"{vol * buy:.3f}", f"{vol * buy * vwap:.4f}", "0",
+        ]
+
+    def _ensure(self, symbol: str, upto_i: int) -> list:
+        bars = self._bars.get(symbol)
+        if bars is None:
+            rng = random.Random(f"{self.seed}:{symbol}")
+            self._state[symbol] = (rng, rng.uniform(0.01, 100.0), 0.0)
+            bars = self._bars[symbol] = []
+        while len(bars) <= upto_i:
+            bars.append(self._next_bar(symbol, len(bars)))
+        return bars
+
+    def klines(self, symbol: str, start_ms: Optional[int], end_ms: Optional[int], limit: int) -> list:
+        now = self.now_ms()
+        cur_i = (now - self.base_ms) // BAR_MS          # 当前未收盘的 bar
+        with self._lock:
+            bars = self._ensure(symbol, cur_i)
+        last_i = cur_i if end_ms is None else min(cur_i, (end_ms - self.base_ms) // BAR_MS)
+        if start_ms is not None:
+            first_i = max(0, -(-(start_ms - self.base_ms) // BAR_MS))
+            out = bars[first_i: min(last_i + 1, first_i + limit)]
+        else:
+            out = bars[max(0, last_i + 1 - limit): last_i + 1]
+
+        if out and out[-1][0] == self.base_ms + cur_i * BAR_MS:
+            # 未收盘 bar：按已走过的比例截断量能，close_time 保持 bar 结束时间
+            frac = max(0.05, (now - out[-1][0]) / BAR_MS)
+            last = list(out[-1])
+            for j in (5, 7, 9, 10):
+                last[j] = f"{float(last[j]) * frac:.4f}"
+            out = out[:-1] + [last]
+        return out
+
+    def ticker_24h(self, symbol: str) -> dict:
+        kl = self.klines(symbol, None, None, 288)
+        o, c = float(kl[0][1]), float(kl[-1][4])
+        return {
+            "symbol": symbol,
+            "openPrice": kl[0][1],
+            "lastPrice": kl[-1][4],
+            "highPrice": f"{max(float(k[2]) for k in kl):.6f}",
+            "lowPrice": f"{min(float(k[3]) for k in kl):.6f}",
+            "volume": f"{sum(float(k[5]) for k in kl):.3f}",
+            "quoteVolume": f"{sum(float(k[7]) for k in kl):.4f}",
+            "priceChangePercent": f"{(c - o) / o * 100:.3f}",
+            "openTime": kl[0][0],
+            "closeTime": kl[-1][6],
+        }
+
+
+class WeightMeter:
+    """按自然分钟累计权重（与币安 X-MBX-USED-WEIGHT-1M 一致）"""
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._minute = 0
+        self._used = 0
+        self._lock = threading.Lock()
+        self.rejected = 0
+        self.served = 0
+
+    def charge(self, weight: int):
+        """返回 (ok, used)"""
+        with self._lock:
+            minute = int(time.time() // 60)
+            if minute != self._minute:
+                self._minute, self._used = minute, 0
+            if self._used + weight > self.limit:
+                self.rejected += 1
+                return False, self._used
+            self._used += weight
+            self.served += 1
+            return True, self._used
+
+
+def make_handler(market: SyntheticMarket, meter: WeightMeter, latency_ms: float, jitter_ms: float):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _send(self, code: int, body, used: int, extra: Optional[dict] = None):
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.send_header("X-MBX-USED-WEIGHT-1M", str(used))
+            for k, v in (extra or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if latency_ms or jitter_ms:
+                time.sleep(max(0.0, random.gauss(latency_ms, jitter_ms)) / 1000.0)
+
+            url = urlparse(self.path)
+            q = {k: v[0] for k, v in parse_qs(url.query).items()}
+            path = url.path
+
+            if path == "/fapi/v1/klines":
+                limit = min(1500, int(q.get("limit", 500)))
+                weight = klines_weight(limit)
+            elif path == "/fapi/v1/ticker/24hr":
+                weight = 1 if "symbol" in q else 40
+            else:
+                weight = 1
+
+            ok, used = meter.charge(weight)
+            if not ok:
+                self._send(429, {"code": -1003, "msg": "Too many requests; simulated weight limit."},
+                           used, {"Retry-After": str(60 - int(time.time()) % 60)})
+                return
+
+            if path == "/fapi/v1/ping":
+                self._send(200, {}, used)
+            elif path == "/fapi/v1/time":
+                self._send(200, {"serverTime": market.now_ms()}, used)
+            elif path == "/fapi/v1/exchangeInfo":
+                self._send(200, {
+                    "timezone": "UTC",
+                    "serverTime": market.now_ms(),
+                    "symbols": [{"symbol": s, "status": "TRADING", "contractType": "PERPETUAL",
+                                 "quoteAsset": "USDT"} for s in market.symbols],
+                }, used)
+            elif path == "/fapi/v1/klines":
+                symbol = q.get("symbol")
+                if symbol not in market.symbols or q.get("interval") != "5m":
+                    self._send(400, {"code": -1121, "msg": "Invalid symbol or interval (sim only serves 5m)."}, used)
+                    return
+                start = int(q["startTime"]) if "startTime" in q else None
+                end = int(q["endTime"]) if "endTime" in q else None
+                self._send(200, market.klines(symbol, start, end, limit), used)
+            elif path == "/fapi/v1/ticker/24hr":
+                if "symbol" in q:
+                    self._send(200, market.ticker_24h(q["symbol"]), used)
+                else:
+                    self._send(200, [market.ticker_24h(s) for s in market.symbols], used)
+            else:
+                self._send(404, {"code": -1, "msg": f"unknown path {path}"}, used)
+
+    return Handler
+
+
+# -----------------------------
+# WebSocket kline 推送
+# -----------------------------
+def _kline_msg(market: SyntheticMarket, symbol: str) -> dict:
+    k = market.klines(symbol, None, None, 1)[-1]
+    now = market.now_ms()
+    return {
+        "e": "kline", "E": now, "s": symbol,
+        "k": {
+            "t": k[0], "T": k[6], "s": symbol, "i": "5m",
+            "o": k[1], "c": k[4], "h": k[2], "l": k[3], "v": k[5], "n": k[8],
+            "x": now >= k[6], "q": k[7], "V": k[9], "Q": k[10],
+        },
+    }
+
+
+def serve_ws(market: SyntheticMarket, host: str, port: int, push_sec: float = 1.0) -> threading.Thread:
+    import websockets  # 只有开 ws 时才需要
+
+    async def handler(ws):
+        url = urlparse(ws.path)
+        if url.path.startswith("/ws/"):
+            streams = [url.path[len("/ws/"):]]
+            combined = False
+        else:
+            streams = parse_qs(url.query).get("streams", [""])[0].split("/")
+            combined = True
+        syms = [s.split("@")[0].upper() for s in streams if s.endswith("@kline_5m")]
+        syms = [s for s in syms if s in market.symbols]
+        while True:
+            for s in syms:
+                msg = _kline_msg(market, s)
+                if combined:
+                    msg = {"stream": f"{s.lower()}@kline_5m", "data": msg}
+                await ws.send(json.dumps(msg))
+            await asyncio.sleep(push_sec)
+
+    def run():
+        async def main():
+            async with websockets.serve(handler, host, port):
+                await asyncio.Future()
+        asyncio.run(main())
+
+    t = threading.Thread(target=run, name="sim-ws", daemon=True)
+    t.start()
+    return t
+
+
+class ExchangeSim:
+    def __init__(self, n_symbols: int = 500, host: str = "127.0.0.1", port: int = 0,
+                 ws_port: Optional[int] = None, weight_limit: int = 2400,
+                 latency_ms: float = 0.0, jitter_ms: float = 0.0,
+                 time_scale: float = 1.0, pattern_pct: int = 5, seed: int = 7):
+        self.market = SyntheticMarket(sim_symbols(n_symbols), seed=seed,
+                                      pattern_pct=pattern_pct, time_scale=time_scale)
+        self.meter = WeightMeter(weight_limit)
+        self.httpd = ThreadingHTTPServer((host, port),
+                                         make_handler(self.market, self.meter, latency_ms, jitter_ms))
+        self.httpd.daemon_threads = True
+        self.host = host
+        self.port = self.httpd.server_address[1]
+        self.ws_port = ws_port
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def start(self) -> "ExchangeSim":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="sim-http", daemon=True)
+        self._thread.start()
+        if self.ws_port is not None:
+            serve_ws(self.market, self.host, self.ws_port)
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def make_sim_client(base_url: str):
+    """指向模拟器的 python-binance Client（不 ping 真实交易所）"""
+    from binance.client import Client
+    client = Client(api_key=None, api_secret=None, ping=False)
+    client.FUTURES_URL = base_url.rstrip("/") + "/fapi"
+    return client
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="local futures exchange simulator")
+    parser.add_argument("--symbols", type=int, default=500)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=18080)
+    parser.add_argument("--ws-port", type=int, default=None)
+    parser.add_argument("--weight-limit", type=int, default=2400, help="每分钟权重上限，超过返回 429")
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--time-scale", type=float, default=1.0)
+    parser.add_argument("--pattern-pct", type=int, default=5, help="带突破形态的 symbol 百分比")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    sim = ExchangeSim(args.symbols, args.host, args.port, args.ws_port, args.weight_limit,
+                      args.latency_ms, args.jitter_ms, args.time_scale, args.pattern_pct, args.seed).start()
+    print(f"🧪 exchange sim on {sim.base_url} ({args.symbols} symbols, weight {args.weight_limit}/min)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        sim.stop()
@@ -1,45 +1,102 @@
 # monitor.py
+import atexit
 import time
 import threading
 from datetime import datetime, timedelta
 from typing import Optional
 
-import schedule
-from concurrent.futures import ThreadPoolExecutor
-
-from bn_tool import BNMonitor
+import env
 from interal_enum import KlineInterval
 from symbols import symbols
 
-from warm_up import replay_symbol
-from replay_engine import step_symbol
-from alert import send_beautiful_notification
+from alert import notify_event
 
 # ========= 参数 =========
-LOOKBACK_HOURS = 24
-SCORE_MIN = 80
-TRAP_MAX = 150  # 正常应该是70
-CONFIRM_BARS = 2
-PENDING_TTL_BARS = 6
-MAX_WORKERS = 10
-POLL_INTERVAL = 3
-
-bn = BNMonitor()
-executor = ThreadPoolExecutor(max_workers=MAX_WORKERS)
+from env import (
+    LOOKBACK_HOURS,
+    SCORE_MIN,
+    TRAP_MAX,
+    CONFIRM_BARS,
+    PENDING_TTL_BARS,
+    MAX_WORKERS,
+    POLL_INTERVAL,
+    RunMode,
+)
+
+# 交易所客户端 / 流水线都在第一次用到时才创建：import 本模块（recall / 回测 / 测试）不碰网络
+_bn = None
+_pipeline = None
+_init_lock = threading.Lock()
 
 RUNTIME = {}   # symbol -> SymbolRuntimeState
 LOCK = threading.Lock()
 
 
+def get_bn():
+    """LIVE / BACKTEST / DEBUG → BNMonitor；OFFLINE → 只读本地 K线库"""
+    global _bn
+    if _bn is None:
+        with _init_lock:
+            if _bn is None:
+                if env.RUN_MODE == RunMode.OFFLINE:
+                    from bar_store import StoreMonitor
+                    _bn = StoreMonitor()
+                else:
+                    from bn_tool import BNMonitor
+                    client = None
+                    if env.CAPTURE_PATH:
+                        # 录制：所有 K线响应写入 capture 文件，之后可用 session_capture.py replay 回放
+                        from session_capture import CaptureWriter, RecordingClient
+                        writer = CaptureWriter(env.CAPTURE_PATH)
+                        # 没 flush 的记录（最多 FLUSH_EVERY-1 条）在退出时写盘
+                        atexit.register(writer.close)
+                        client = RecordingClient(writer)
+                    _bn = BNMonitor(client=client)
+    return _bn
+
+
+def set_bn(bn):
+    """注入数据源（录制回放 / 压测用）"""
+    global _bn
+    _bn = bn
+
+
+def get_pipeline():
+    """ingest → decode → feature → detect → dispatch 流水线（见 pipeline.py），复用 RUNTIME 里的状态"""
+    global _pipeline
+    if _pipeline is None:
+        bn = get_bn()
+        with _init_lock:
+            if _pipeline is None:
+                from pipeline import Pipeline
+                flow_book = None
+                if env.FLOW_ENABLED:
+                    from order_flow import FlowBook
+                    flow_book = FlowBook()
+                _pipeline = Pipeline(symbols, bn, runtimes=RUNTIME, workers={"ingest": MAX_WORKERS},
+                                     flow_book=flow_book)
+                _pipeline.start()
+                if flow_book is not None:
+                    # 盘中逐笔：每个 symbol 每 10s 开新桶时重新看一眼正在走的 bar
+                    from order_flow import FlowStream
+                    FlowStream(flow_book, symbols, on_bucket=_pipeline.check_early).start()
+    return _pipeline
+
+
 def init_warmup(specific_symbol:Optional[str] = None):
+    from baselines import get_baseline
+    from decision_trace import symbol_trace
+    from resample import history_ms
+    from warm_up import replay_symbol
+
     print("🔥 warmup replay...")
-    start_ms = int(time.time() * 1000) - LOOKBACK_HOURS * 3600 * 1000
+    # 检测窗口之外还要够大周期共振的历史（4h 要 28h）
+    start_ms = int(time.time() * 1000) - history_ms(env.HTF_REQUIRE)
 
-    # if specific_symbol is not None:
-    #     symbols = [specific_symbol]
+    targets = [specific_symbol] if specific_symbol is not None else symbols
 
-    for s in symbols:
-        kl = bn.getSymbolKlines(s, KlineInterval.MINUTE_5.value, start_ms)
+    for s in targets:
+        kl = get_bn().getSymbolKlines(s, KlineInterval.MINUTE_5.value, start_ms)
         if not kl or len(kl) < 60:
             continue
 
@@ -50,6 +107,9 @@ def init_warmup(specific_symbol:Optional[str] = None):
             trap_max=TRAP_MAX,
             confirm_bars=CONFIRM_BARS,
             pending_ttl_bars=PENDING_TTL_BARS,
+            htf_require=env.HTF_REQUIRE,
+            trace=symbol_trace(s),
+            baseline=get_baseline(s),
         )
         RUNTIME[s] = runtime
 
@@ -61,19 +121,33 @@ def calculate_start_time(hours: int) -> int:
 
 
 
-def process_symbol(symbol):
+def process_symbol(symbol, notify: bool = True) -> list:
+    """
+    legacy：拉一次增量 K线并推进状态机；返回本次产生的事件 [(evt, pend, trap), ...]
+    live（job）和录制回放都已经走 Pipeline，这里没有大周期 / gap_policy / 逐笔指标，只留给单 symbol 调试
+    """
+    from baselines import get_baseline
+    from decision_trace import symbol_trace
+    from replay_engine import step_symbol
+    from state import SymbolRuntimeState
 
+    bn = get_bn()
+    trace = symbol_trace(symbol)
+    baseline = get_baseline(symbol)
+    fired = []
     runtime = RUNTIME.get(symbol)
-    if runtime:
+    cold = runtime is None or runtime.last_seen_ms is None
+    if not cold:
         kl = bn.getSymbolKlines(symbol, KlineInterval.MINUTE_5.value, runtime.last_seen_ms)
         if not kl or len(kl) < 2:
-            return
+            return fired
 
         # 只取新增的 bar
         new_bars = [k for k in kl if k.open_time > runtime.last_seen_ms]
     else:
         kl = bn.getSymbolKlines(symbol, KlineInterval.MINUTE_5.value, calculate_start_time(16))
         new_bars = kl
+        runtime = RUNTIME.setdefault(symbol, SymbolRuntimeState())
     for bar in new_bars:
         view = kl[: kl.index(bar)+1]
         events = step_symbol(
@@ -84,21 +158,36 @@ def process_symbol(symbol):
             trap_max=TRAP_MAX,
             confirm_bars=CONFIRM_BARS,
             pending_ttl_bars=PENDING_TTL_BARS,
+            trace=trace,
+            baseline=baseline,
         )
+        # 冷启动拉的 16h 历史相当于 warmup，只推进状态，不补发历史报警（同 ShardWorker / Pipeline）
+        if cold:
+            continue
 
-        for evt, pend, trap in events:
-            send_beautiful_notification(
-                f"🚀 真启动\n{symbol}\nScore:{pend['score']:.0f}\nTrap:{trap:.0f}",
-                subtitle="BREAKOUT"
-            )
+        fired.extend(events)
+        if notify:
+            for evt, pend, trap in events:
+                notify_event(symbol, evt, pend, trap)
+    return fired
 
 
 def job():
-    for s in symbols:
-        executor.submit(process_symbol, s)
+    # 上一轮还没跑完时这次请求会被合并，不会叠加
+    pipeline = get_pipeline()
+    pipeline.request_sweep()
+    if pipeline.sweeps:
+        pipeline.print_stats()
 
 
 if __name__ == "__main__":
+    import signal
+    import sys
+    import schedule
+
+    # SIGTERM（kill / systemd stop）走正常退出，atexit 里的 capture / trace 才会落盘
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+
     # init_warmup()
     job()
     schedule.every(POLL_INTERVAL).minutes.do(job)
@@ -0,0 +1,205 @@
+# gaps.py
+"""
+K线缺口：检测 / 批量修补 / 检测器侧的处理策略
+
+- find_gaps：open_time 序列 → 缺失区间 [(start_ms, end_ms)]，bar_store 每次 merge 后都会跑
+- repair_gaps：相邻缺口合并成一次 range 请求（跨度不超过一页 1500 根），修补后写回 bar_store
+  交易所维护造成的真实空洞拉回来也是空，记入 unrepaired，并持久化到 bar_store（unfillable），之后不再请求；
+  只有请求成功、且响应里有缺口两侧的 bar 才算真实空洞，限流 / 超时等失败只计 repair_failed，下次照常请求
+- apply_gap_policy：step_symbol 调用，SKIP / FFILL / INVALID 见 GapPolicy
+
+用法：
+    python gaps.py scan   [--interval 5m] [--symbols BTCUSDT,ETHUSDT]
+    python gaps.py repair [--interval 5m] [--symbols BTCUSDT,ETHUSDT]
+"""
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+from bn_tool import KlineData
+from interal_enum import GapPolicy, KlineInterval, interval_ms
+
+BAR_MS = interval_ms(KlineInterval.MINUTE_5)
+REPAIR_PAGE_BARS = 1500
+
+Gap = Tuple[int, int]   # 缺失 bar 的 open_time 闭区间
+
+
+class GapStats:
+    FIELDS = (
+        "merges_checked", "gaps_found", "bars_missing",
+        "repair_requests", "repair_failed", "bars_repaired", "unrepaired",
+        "windows_with_gaps", "windows_ffilled", "windows_invalid",
+    )
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._c = {f: 0 for f in self.FIELDS}
+
+    def add(self, field: str, n: int = 1):
+        with self._lock:
+            self._c[field] += n
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self._c)
+
+
+GAP_STATS = GapStats()
+
+
+def find_gaps(open_times: List[int], step_ms: int) -> List[Gap]:
+    gaps = []
+    for a, b in zip(open_times, open_times[1:]):
+        if b - a > step_ms:
+            gaps.append((a + step_ms, b - step_ms))
+    return gaps
+
+
+def gap_bars(gaps: List[Gap], step_ms: int) -> int:
+    return sum((e - s) // step_ms + 1 for s, e in gaps)
+
+
+def exclude_holes(gaps: List[Gap], holes: List[Gap]) -> List[Gap]:
+    """去掉完全落在已知空洞里的缺口（部分重叠的仍然保留，可能有新数据）"""
+    if not holes:
+        return list(gaps)
+    return [(s, e) for s, e in gaps if not any(hs <= s and e <= he for hs, he in holes)]
+
+
+def coalesce_gaps(gaps: List[Gap], step_ms: int, max_bars: int = REPAIR_PAGE_BARS) -> List[Gap]:
+    """相邻缺口合并成一个请求区间，只要整体跨度不超过 max_bars；单个超长缺口按页切开"""
+    out: List[Gap] = []
+    for s, e in sorted(gaps):
+        while (e - s) // step_ms + 1 > max_bars:
+            out.append((s, s + (max_bars - 1) * step_ms))
+            s += max_bars * step_ms
+        if out and (e - out[-1][0]) // step_ms + 1 <= max_bars:
+            out[-1] = (out[-1][0], e)
+        else:
+            out.append((s, e))
+    return out
+
+
+# -----------------------------
+# 修补
+# -----------------------------
+def repair_gaps(store, bn, symbol: str, interval: KlineInterval,
+                gaps: Optional[List[Gap]] = None) -> dict:
+    step = interval_ms(interval)
+    if gaps is None:
+        gaps = find_gaps(store.open_times(symbol, interval.value), step)
+    gaps = exclude_holes(gaps, store.unfillable(symbol, interval.value))
+    # 每个请求两边各多要一根，见下
+    requests = coalesce_gaps(gaps, step, REPAIR_PAGE_BARS - 2)
+
+    repaired = 0
+    failed = 0
+    covered = []   # 成功且非空的响应覆盖的 [首根, 末根]
+    for s, e in requests:
+        GAP_STATS.add("repair_requests")
+        try:
+            kl = bn.getSymbolKlines(symbol, interval.value, s - step, e + step,
+                                    limit=REPAIR_PAGE_BARS, raise_errors=True)
+        except Exception:
+            # 接口已经打印过；失败不能当成交易所没有数据
+            failed += 1
+            GAP_STATS.add("repair_failed")
+            continue
+        repaired += store.merge(symbol, interval.value, kl)
+        if kl:
+            covered.append((min(k.open_time for k in kl), max(k.open_time for k in kl)))
+
+    missing = gap_bars(gaps, step)
+    GAP_STATS.add("bars_repaired", repaired)
+    GAP_STATS.add("unrepaired", missing - repaired)
+    if covered and missing > repaired:
+        # 响应里缺口前后的 bar 都有、中间仍然是空的，才是交易所那边真的没有，记下来下次跳过
+        left = find_gaps(store.open_times(symbol, interval.value), step)
+        holes = [g for g in left
+                 if any(s <= g[0] and g[1] <= e for s, e in gaps)
+                 and any(lo < g[0] and g[1] < hi for lo, hi in covered)]
+        store.mark_unfillable(symbol, interval.value, holes)
+    return {"symbol": symbol, "gaps": len(gaps), "missing": missing,
+            "requests": len(requests), "failed": failed, "repaired": repaired}
+
+
+def repair_all(store, bn, symbols: List[str], interval: KlineInterval, workers: int = 8) -> List[dict]:
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        return list(ex.map(lambda s: repair_gaps(store, bn, s, interval), symbols))
+
+
+# -----------------------------
+# 检测器侧
+# -----------------------------
+def _is_contiguous(klines: List[KlineData], step_ms: int) -> bool:
+    return (klines[-1].open_time - klines[0].open_time) // step_ms + 1 == len(klines)
+
+
+def _ffill(klines: List[KlineData], step_ms: int) -> List[KlineData]:
+    out = [klines[0]]
+    for k in klines[1:]:
+        prev = out[-1]
+        t = prev.open_time + step_ms
+        while t < k.open_time:
+            c = prev.close_price
+            out.append(KlineData(
+                open_time=t, open_price=c, high_price=c, low_price=c, close_price=c,
+                volume=0.0, close_time=t + step_ms - 1, quote_volume=0.0, trade_count=0,
+                buy_volume=0.0, buy_quote_volume=0.0, ignore="ffill",
+            ))
+            t += step_ms
+        out.append(k)
+    return out
+
+
+def apply_gap_policy(klines: List[KlineData], policy: GapPolicy, tail: Optional[int] = None,
+                     step_ms: int = BAR_MS) -> Optional[List[KlineData]]:
+    """
+    tail：只检查最后 tail 根（检测器实际用到的窗口）
+    返回处理后的 view；INVALID 且有缺口时返回 None
+    """
+    if policy == GapPolicy.SKIP or len(klines) < 2:
+        return klines
+
+    view = klines[-tail:] if tail else klines
+    if _is_contiguous(view, step_ms):
+        return view
+
+    GAP_STATS.add("windows_with_gaps")
+    if policy == GapPolicy.INVALID:
+        GAP_STATS.add("windows_invalid")
+        return None
+
+    GAP_STATS.add("windows_ffilled")
+    filled = _ffill(view, step_ms)
+    return filled[-tail:] if tail else filled
+
+
+if __name__ == "__main__":
+    from bar_store import BarStore
+
+    parser = argparse.ArgumentParser(description="scan / repair gaps in the local bar store")
+    parser.add_argument("cmd", choices=["scan", "repair"])
+    parser.add_argument("--interval", default=KlineInterval.MINUTE_5.value)
+    parser.add_argument("--symbols", default=None, help="逗号分隔，默认库里全部")
+    args = parser.parse_args()
+
+    store = BarStore()
+    iv = KlineInterval(args.interval)
+    targets = args.symbols.split(",") if args.symbols else store.symbols(iv.value)
+
+    if args.cmd == "scan":
+        step = interval_ms(iv)
+        for s in targets:
+            gs = find_gaps(store.open_times(s, iv.value), step)
+            if gs:
+                print(f"{s}: {len(gs)} gaps, {gap_bars(gs, step)} bars missing, "
+                      f"{len(coalesce_gaps(gs, step))} requests to repair")
+    else:
+        from bn_tool import BNMonitor
+        for r in repair_all(store, BNMonitor(max_qps=3), targets, iv):
+            if r["gaps"]:
+                print(r)
+    print(GAP_STATS.snapshot())
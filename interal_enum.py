@@ -17,4 +17,22 @@ class KlineInterval(Enum):
     DAY_1 = "1d"       # 1天
     DAY_3 = "3d"       # 3天
     WEEK_1 = "1w"      # 1周
-    MONTH_1 = "1M"     # 1月（注意是大写M，避免与分钟m冲突）
\ No newline at end of file
+    MONTH_1 = "1M"     # 1月（注意是大写M，避免与分钟m冲突）
+
+
+_UNIT_MS = {"m": 60 * 1000, "h": 60 * 60 * 1000, "d": 24 * 60 * 60 * 1000, "w": 7 * 24 * 60 * 60 * 1000}
+
+
+def interval_ms(interval: KlineInterval) -> int:
+    """周期对应的毫秒数（1M 不定长，不支持）"""
+    v = interval.value
+    if v[-1] not in _UNIT_MS:
+        raise ValueError(f"interval {v} has no fixed length")
+    return int(v[:-1]) * _UNIT_MS[v[-1]]
+
+
+class GapPolicy(Enum):
+    """K线序列有缺口时检测器的处理方式"""
+    SKIP = "skip"        # 忽略缺口，直接用现有 bar（原行为）
+    FFILL = "ffill"      # 用前一根收盘价补平（量为 0）
+    INVALID = "invalid"  # 窗口内有缺口就不做判断
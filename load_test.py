@@ -0,0 +1,154 @@
+# load_test.py
+"""
+monitor 压测：exchange_sim 子进程 + ShardWorker，symbol 数从 500 扩到 5000
+
+每个规模在独立进程里跑（RSS 互不干扰），对每个规模报告：
+  - warm sweep（首次拉满 24h 缓冲）耗时
+  - 稳态 sweep 耗时 p50 / max、CPU 秒
+  - 报警延迟：确认 bar 在模拟器里出现 → sweep 结束拿到事件
+  - 峰值 RSS、429 次数（fetch_errors）
+
+默认是「容量模式」：模拟器不限权重、monitor 不限 QPS，测的是本机处理能力；
+加 --weight-limit 2400 --qps 8 就是线上真实的限流环境。
+
+用法：
+    python load_test.py [--sizes 500,1000,2000,5000] [--sweeps 5] [--time-scale 60] [--latency-ms 20]
+"""
+import argparse
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def _peak_rss_mb() -> float:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 是 KB，macOS 是 B
+    return rss / 1024 / 1024 if sys.platform == "darwin" else rss / 1024
+
+
+def _wait_port(url: str, timeout: float = 10.0):
+    import urllib.request
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(url + "/fapi/v1/ping", timeout=1).read()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"exchange sim not reachable at {url}")
+
+
+def run_one(n: int, args) -> dict:
+    """单个规模：起模拟器子进程，跑 warm + N 次 sweep"""
+    import urllib.request
+
+    from bn_tool import BNMonitor
+    from exchange_sim import make_sim_client, sim_symbols
+    from shard_runner import ShardWorker
+
+    port = args.port
+    sim = subprocess.Popen(
+        [sys.executable, os.path.join(HERE, "exchange_sim.py"), "--symbols", str(n), "--port", str(port),
+         "--weight-limit", str(args.weight_limit), "--latency-ms", str(args.latency_ms),
+         "--jitter-ms", str(args.latency_ms / 4), "--time-scale", str(args.time_scale),
+         "--pattern-pct", str(args.pattern_pct)],
+        stdout=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{port}"
+    try:
+        _wait_port(url)
+
+        def wall_of(sim_ms: int) -> float:
+            server_now = json.loads(urllib.request.urlopen(url + "/fapi/v1/time").read())["serverTime"]
+            return time.time() - (server_now - sim_ms) / 1000.0 / args.time_scale
+
+        bn = BNMonitor(max_qps=args.qps, client=make_sim_client(url))
+        worker = ShardWorker(0, sim_symbols(n), args.qps, threads=args.threads, bn=bn)
+
+        cpu0 = time.process_time()
+        _, warm = worker.sweep()
+
+        seen_alert = {s: f.runtime.last_alert_ms for s, f in worker.feeds.items()}
+        sweeps, cpu, alert_lat, errors, events = [], [], [], warm["fetch_errors"], 0
+        bar_sec = 5 * 60 / args.time_scale
+        for _ in range(args.sweeps):
+            # 等下一根 5m bar 出现再扫，模拟线上轮询节奏
+            time.sleep(max(0.0, bar_sec - sweeps[-1] if sweeps else bar_sec))
+            _, st = worker.sweep()
+            done = time.time()
+            sweeps.append(st["sweep_sec"])
+            cpu.append(st["cpu_sec"])
+            errors += st["fetch_errors"]
+            events += st["events"]
+            for s, f in worker.feeds.items():
+                t = f.runtime.last_alert_ms
+                if t is not None and t != seen_alert[s]:
+                    seen_alert[s] = t
+                    alert_lat.append(done - wall_of(t))
+        worker.close()
+
+        return {
+            "symbols": n,
+            "warm_sweep_sec": warm["sweep_sec"],
+            "sweep_p50_sec": statistics.median(sweeps) if sweeps else 0.0,
+            "sweep_max_sec": max(sweeps) if sweeps else 0.0,
+            "cpu_per_sweep_sec": statistics.mean(cpu) if cpu else 0.0,
+            "cpu_total_sec": time.process_time() - cpu0,
+            "alerts": len(alert_lat),
+            "events": events,
+            "alert_latency_p50_sec": statistics.median(alert_lat) if alert_lat else None,
+            "alert_latency_max_sec": max(alert_lat) if alert_lat else None,
+            "fetch_errors": errors,
+            "peak_rss_mb": _peak_rss_mb(),
+        }
+    finally:
+        sim.terminate()
+        sim.wait()
+
+
+def main(args):
+    rows = []
+    for n in [int(x) for x in args.sizes.split(",")]:
+        # 每个规模一个干净进程，RSS / CPU 不串
+        r = subprocess.run([sys.executable, __file__, "--one", str(n)] + sys.argv[1:],
+                           capture_output=True, text=True, cwd=HERE)
+        if r.returncode != 0:
+            print(f"❌ {n} symbols failed:\n{r.stderr}")
+            continue
+        row = json.loads(r.stdout.strip().splitlines()[-1])
+        rows.append(row)
+        lat = row["alert_latency_p50_sec"]
+        print(
+            f"{row['symbols']:>5} symbols | warm {row['warm_sweep_sec']:6.1f}s | "
+            f"sweep p50 {row['sweep_p50_sec']:6.2f}s max {row['sweep_max_sec']:6.2f}s | "
+            f"cpu/sweep {row['cpu_per_sweep_sec']:5.2f}s | alerts {row['alerts']:>3} "
+            f"lat p50 {'-' if lat is None else f'{lat:.1f}s'} | "
+            f"errors {row['fetch_errors']:>4} | rss {row['peak_rss_mb']:.0f}MB"
+        )
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="monitor load test against the local exchange sim")
+    parser.add_argument("--sizes", default="500,1000,2000,5000")
+    parser.add_argument("--sweeps", type=int, default=5)
+    parser.add_argument("--qps", type=float, default=1000.0)
+    parser.add_argument("--threads", type=int, default=10)
+    parser.add_argument("--weight-limit", type=int, default=10 ** 9)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--time-scale", type=float, default=60.0)
+    parser.add_argument("--pattern-pct", type=int, default=5)
+    parser.add_argument("--port", type=int, default=18080)
+    parser.add_argument("--one", type=int, default=None, help=argparse.SUPPRESS)
+    args, _ = parser.parse_known_args()
+
+    if args.one is not None:
+        print(json.dumps(run_one(args.one, args)))
+    else:
+        main(args)
@@ -0,0 +1,320 @@
+# order_flow.py
+"""
+aggTrade 逐笔成交 → 每 symbol 的 10s 小桶，给 step_symbol 提供盘中指标（bar 收盘前就能看到买盘）
+
+- FlowBook：一整块预分配的 numpy 数组（容量 = 内存预算 / 每 symbol 字节数），每个 symbol 占一行环形缓冲，
+  symbol 数超过容量时按 LRU 淘汰最久没成交的，内存固定不涨
+- intrabar(symbol, bar_open_ms)：当前 bar 到目前为止的 主动买占比 / 成交量 / 最新价，
+  以及 vol_accel = 最近 ACCEL_BUCKETS 个桶的成交速率 ÷ 之前 BASE_BUCKETS 个桶的成交速率
+- FlowStream：websockets 订阅 <symbol>@aggTrade（按需 import），可选把原始消息录进 session_capture
+- 录制的成交文件可直接回放：jsonl（每行一条 ws 消息）/ session_capture 文件 / 币安归档 aggTrades CSV
+
+用法：
+    python order_flow.py replay trades.jsonl [--symbol BTCUSDT] [--verbose]
+"""
+import argparse
+import csv
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+BUCKET_MS = 10 * 1000
+BAR_MS = 5 * 60 * 1000
+N_BUCKETS = 180            # 每 symbol 保留 30 分钟
+ACCEL_BUCKETS = 6          # 最近 1 分钟
+BASE_BUCKETS = 60          # 对比的前 10 分钟
+MEMORY_BUDGET_MB = 32
+
+ROW_BYTES = N_BUCKETS * (8 * 5 + 4)   # start / vol / buy_vol / high / last + trades(int32)
+
+STREAM_URL = "wss://fstream.binance.com/stream?streams="
+STREAMS_PER_CONN = 200     # 币安单连接最多订阅数
+RECONNECT_SEC = 5
+
+
+def parse_agg_trade(msg: dict) -> Optional[Tuple[str, int, float, float, bool]]:
+    """ws 消息（单流或组合流 {"stream","data"}）→ (symbol, trade_ms, price, qty, taker_buy)"""
+    d = msg.get("data", msg)
+    if d.get("e") != "aggTrade":
+        return None
+    # m = 买方是 maker → 主动卖
+    return d["s"], int(d["T"]), float(d["p"]), float(d["q"]), not d["m"]
+
+
+class FlowBook:
+    def __init__(self, memory_mb: float = MEMORY_BUDGET_MB):
+        self.capacity = max(1, int(memory_mb * 1024 * 1024 // ROW_BYTES))
+        shape = (self.capacity, N_BUCKETS)
+        self.start = np.full(shape, -1, dtype=np.int64)   # 桶起始时间，-1 = 空
+        self.vol = np.zeros(shape, dtype=np.float64)
+        self.buy_vol = np.zeros(shape, dtype=np.float64)   # 主动买
+        self.high = np.zeros(shape, dtype=np.float64)
+        self.last = np.zeros(shape, dtype=np.float64)      # 桶内最后一笔价格
+        self.trades = np.zeros(shape, dtype=np.int32)
+        self.rows: "OrderedDict[str, int]" = OrderedDict()   # symbol → 行号，按最近成交排序
+        self.since = np.zeros(self.capacity, dtype=np.int64)  # 该行开始记录的时间
+        self.latest = np.zeros(self.capacity, dtype=np.int64)  # 该行最新成交时间
+        self.evictions = 0
+        self.late_dropped = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.rows)
+
+    def _row(self, symbol: str, t_ms: int) -> int:
+        row = self.rows.get(symbol)
+        if row is not None:
+            self.rows.move_to_end(symbol)
+            return row
+        if len(self.rows) < self.capacity:
+            row = len(self.rows)
+        else:
+            _, row = self.rows.popitem(last=False)
+            self.evictions += 1
+        self.rows[symbol] = row
+        self.start[row].fill(-1)
+        self.since[row] = t_ms
+        return row
+
+    def add(self, symbol: str, t_ms: int, price: float, qty: float, taker_buy: bool) -> bool:
+        """
+        记一笔成交；返回 True 表示这笔开了一个新桶（上一个桶已结束，可以重新评估）
+        迟到的成交，所在桶的槽位已经被更新的桶占用时直接丢弃（计 late_dropped），不能把新桶清掉
+        """
+        b_start = t_ms - t_ms % BUCKET_MS
+        i = (b_start // BUCKET_MS) % N_BUCKETS
+        with self._lock:
+            row = self._row(symbol, t_ms)
+            if self.start[row, i] > b_start:
+                self.late_dropped += 1
+                return False
+            rolled = self.start[row, i] != b_start
+            if rolled:
+                self.start[row, i] = b_start
+                self.vol[row, i] = 0.0
+                self.buy_vol[row, i] = 0.0
+                self.high[row, i] = price
+                self.trades[row, i] = 0
+            self.vol[row, i] += qty
+            if taker_buy:
+                self.buy_vol[row, i] += qty
+            if price > self.high[row, i]:
+                self.high[row, i] = price
+            self.last[row, i] = price
+            self.trades[row, i] += 1
+            if t_ms > self.latest[row]:
+                self.latest[row] = t_ms
+        return bool(rolled)
+
+    def add_msg(self, msg: dict) -> Optional[str]:
+        """ws 消息直接入账；开了新桶时返回 symbol"""
+        t = parse_agg_trade(msg)
+        if t is None:
+            return None
+        return t[0] if self.add(*t) else None
+
+    def latest_ms(self, symbol: str) -> Optional[int]:
+        """该 symbol 最新一笔成交时间；没有记录返回 None"""
+        with self._lock:
+            row = self.rows.get(symbol)
+            return int(self.latest[row]) if row is not None else None
+
+    def intrabar(self, symbol: str, bar_open_ms: int, now_ms: Optional[int] = None) -> Optional[Dict]:
+        """
+        bar_open_ms 这根 bar 到目前为止的盘中指标；没有成交记录时返回 None
+        now_ms 默认取该 symbol 最新一笔成交时间
+        """
+        with self._lock:
+            row = self.rows.get(symbol)
+            if row is None:
+                return None
+            start = self.start[row]
+            if now_ms is None:
+                now_ms = int(self.latest[row])
+            in_bar = (start >= bar_open_ms) & (start < bar_open_ms + BAR_MS) & (start <= now_ms)
+            if not in_bar.any():
+                return None
+            vol = float(self.vol[row][in_bar].sum())
+            buy = float(self.buy_vol[row][in_bar].sum())
+            trades = int(self.trades[row][in_bar].sum())
+            last_i = int(np.argmax(np.where(in_bar, start, -1)))
+            last_price = float(self.last[row, last_i])
+            high = float(self.high[row][in_bar].max())
+
+            # 成交速率：空桶按 0 算；记录时长不够覆盖对比窗口时 vol_accel 给 nan
+            end = now_ms - now_ms % BUCKET_MS + BUCKET_MS
+            mid = end - ACCEL_BUCKETS * BUCKET_MS
+            base0 = mid - BASE_BUCKETS * BUCKET_MS
+            recent = float(self.vol[row][(start >= mid) & (start < end)].sum()) / ACCEL_BUCKETS
+            if self.since[row] > base0:
+                accel = float("nan")
+            else:
+                base = float(self.vol[row][(start >= base0) & (start < mid)].sum()) / BASE_BUCKETS
+                accel = recent / base if base > 0 else (float("inf") if recent > 0 else float("nan"))
+
+        return {
+            "bar_open_ms": bar_open_ms,
+            "vol": vol,
+            "buy_vol": buy,
+            "buy_ratio": buy / vol if vol > 0 else float("nan"),
+            "trades": trades,
+            "last_price": last_price,
+            "high": high,
+            "vol_accel": accel,
+        }
+
+    def stats(self) -> dict:
+        return {"symbols": len(self.rows), "capacity": self.capacity,
+                "evictions": self.evictions, "late_dropped": self.late_dropped, "bytes": ROW_BYTES * self.capacity}
+
+
+# -----------------------------
+# 实时订阅
+# -----------------------------
+class FlowStream:
+    """
+    后台线程订阅 aggTrade；每个 symbol 开新桶时回调 on_bucket(symbol)（大约 10s 一次），
+    上层据此重新评估盘中突破。writer 传 session_capture.CaptureWriter 时原始消息同时录制
+    """
+    def __init__(self, book: FlowBook, symbols: List[str], on_bucket: Optional[Callable] = None,
+                 writer=None, url: str = STREAM_URL):
+        self.book = book
+        self.symbols = symbols
+        self.on_bucket = on_bucket
+        self.writer = writer
+        self.url = url
+        self.messages = 0
+        self.reconnects = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "FlowStream":
+        self._thread = threading.Thread(target=self._run, name="flow-stream", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def handle(self, raw: str):
+        msg = json.loads(raw)
+        self.messages += 1
+        if self.writer is not None:
+            from session_capture import KIND_STREAM
+            d = msg.get("data", msg)
+            self.writer.append(KIND_STREAM, d.get("s", ""), msg)
+        symbol = self.book.add_msg(msg)
+        if symbol is not None and self.on_bucket is not None:
+            self.on_bucket(symbol)
+
+    def _run(self):
+        import asyncio
+
+        import websockets  # 只有开盘中指标时才需要
+
+        async def consume(streams):
+            while not self._stop.is_set():
+                try:
+                    async with websockets.connect(self.url + "/".join(streams), ping_interval=20) as ws:
+                        while not self._stop.is_set():
+                            try:
+                                raw = await asyncio.wait_for(ws.recv(), timeout=1.0)
+                            except asyncio.TimeoutError:
+                                continue
+                            self.handle(raw)
+                except Exception as e:
+                    if self._stop.is_set():
+                        return
+                    self.reconnects += 1
+                    print(f"⚠️ aggTrade stream 断开（{type(e).__name__}: {e}），{RECONNECT_SEC}s 后重连")
+                    await asyncio.sleep(RECONNECT_SEC)
+
+        async def main():
+            streams = [f"{s.lower()}@aggTrade" for s in self.symbols]
+            await asyncio.gather(*(consume(streams[i: i + STREAMS_PER_CONN])
+                                   for i in range(0, len(streams), STREAMS_PER_CONN)))
+
+        asyncio.run(main())
+
+
+# -----------------------------
+# 录制文件回放
+# -----------------------------
+def iter_trade_file(path: str) -> Iterator[dict]:
+    """
+    录制的成交 → aggTrade 消息（dict）
+    - *.jsonl：每行一条 ws 消息
+    - *.csv：币安归档 <SYMBOL>-aggTrades-*.csv（有无表头都行）
+    - 其它：session_capture 文件里的 KIND_STREAM 记录
+    """
+    if path.endswith(".jsonl"):
+        with open(path) as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    elif path.endswith(".csv"):
+        symbol = os.path.basename(path).split("-", 1)[0]
+        with open(path, newline="") as f:
+            for row in csv.reader(f):
+                if not row or not row[0].isdigit():
+                    continue
+                # agg_trade_id, price, quantity, first_trade_id, last_trade_id, transact_time, is_buyer_maker
+                yield {"e": "aggTrade", "s": symbol, "p": row[1], "q": row[2], "T": int(row[5]),
+                       "m": row[6].strip().lower() == "true"}
+    else:
+        from session_capture import KIND_STREAM, CaptureReader
+        for _, kind, _, payload in CaptureReader(path).records():
+            if kind == KIND_STREAM:
+                yield payload
+
+
+def replay_trades(path: str, book: Optional[FlowBook] = None,
+                  on_bucket: Optional[Callable] = None) -> FlowBook:
+    """把录制文件按顺序喂进 FlowBook；on_bucket(symbol, trade_ms) 在每次开新桶时回调"""
+    book = book if book is not None else FlowBook()
+    for msg in iter_trade_file(path):
+        t = parse_agg_trade(msg)
+        if t is None:
+            continue
+        if book.add(*t) and on_bucket is not None:
+            on_bucket(t[0], t[1])
+    return book
+
+
+def _fmt_flow(symbol: str, f: Dict) -> str:
+    from datetime import datetime
+    t = datetime.fromtimestamp(f["bar_open_ms"] / 1000).strftime("%Y-%m-%d %H:%M")
+    return (f"{symbol} {t} trades={f['trades']} vol={f['vol']:.4g} buy_ratio={f['buy_ratio']:.2f} "
+            f"vol_accel={f['vol_accel']:.2f} last={f['last_price']:.6g} high={f['high']:.6g}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="aggTrade order-flow aggregator")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_replay = sub.add_parser("replay")
+    p_replay.add_argument("path")
+    p_replay.add_argument("--symbol", default=None)
+    p_replay.add_argument("--verbose", action="store_true", help="每个新桶打印一次当前 bar 的盘中指标")
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    book = FlowBook()
+
+    def show(symbol, t_ms):
+        if args.verbose and (args.symbol is None or symbol == args.symbol):
+            f = book.intrabar(symbol, t_ms - t_ms % BAR_MS)
+            if f is not None:
+                print(_fmt_flow(symbol, f))
+
+    replay_trades(args.path, book, show)
+    for s in ([args.symbol] if args.symbol else list(book.rows)):
+        latest = int(book.latest[book.rows[s]]) if s in book.rows else 0
+        f = book.intrabar(s, latest - latest % BAR_MS)
+        if f is not None:
+            print(_fmt_flow(s, f))
+    print({**book.stats(), "sec": round(time.perf_counter() - t0, 2)})
@@ -0,0 +1,411 @@
+# pipeline.py
+"""
+live monitor 的分阶段流水线
+
+    ingest ──▶ decode ──▶ feature ──▶ detect ──▶ dispatch
+    (拉取)     (解析+合并)  (大周期聚合)  (step_symbol)  (报警)
+
+- 每个 stage 一组自己的线程，stage 之间用有界队列连接；下游处理不过来时 put 阻塞，压力一路传回 ingest，
+  不会像原来那样把 550 个 future 全堆进线程池队列
+- 一轮 sweep = 所有 symbol 各走一遍；上一轮没走完时新的 sweep 请求合并成「跑完后再来一轮」，
+  不叠加（coalesced 计数）
+- 每个 stage 有自己的统计：处理数、错误数、忙碌时间、队列当前 / 最大深度
+- 传入 flow_book（order_flow）时，没收盘的 bar 带盘中指标进 detect；check_early 给 FlowStream 回调用，
+  只把 symbol 放进 early 队列（不阻塞逐笔线程），由单独的线程在 feed.lock 下评估，报警交给 dispatch，
+  两次 sweep 之间也能提前报警
+
+用法：
+    python pipeline.py [--sweeps 0] [--ingest 10]
+"""
+import argparse
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from alert import notify_event
+from bn_tool import KlineData, parse_kline
+from env import HTF_REQUIRE, MAX_WORKERS, POLL_INTERVAL
+from interal_enum import KlineInterval
+from resample import history_ms
+
+QUEUE_SIZE = 64           # 每个 stage 输入队列的容量
+STAGE_WORKERS = {         # 各 stage 的线程数：拉取是 I/O，其余是 CPU（GIL 下多开无益）
+    "ingest": MAX_WORKERS,
+    "decode": 1,
+    "feature": 1,
+    "detect": 1,
+    "dispatch": 1,
+}
+
+_STOP = object()
+
+
+class Sweep:
+    """一轮 sweep 的进度：所有 symbol 都离开流水线（走完或中途丢弃）后 done 置位"""
+    def __init__(self, seq: int, n: int):
+        self.seq = seq
+        self.remaining = n
+        self.events = []
+        self.errors = 0
+        self.t0 = time.time()
+        self.sec = None
+        self.done = threading.Event()
+        self._lock = threading.Lock()
+
+    def add_error(self):
+        with self._lock:
+            self.errors += 1
+
+    def finish_one(self, error: bool = False):
+        with self._lock:
+            self.errors += int(error)
+            self.remaining -= 1
+            if self.remaining <= 0 and not self.done.is_set():
+                self.sec = time.time() - self.t0
+                self.done.set()
+
+
+class Stage:
+    """
+    fn(item) 返回下一个 stage 的 item；返回 None 表示该 symbol 在本 stage 结束（没有新数据 / 没有事件）
+    item 统一是 (sweep, feed, payload)
+    """
+    def __init__(self, name: str, fn: Callable, workers: int, maxsize: int = QUEUE_SIZE):
+        self.name = name
+        self.fn = fn
+        self.workers = workers
+        self.in_q = queue.Queue(maxsize=maxsize)
+        self.next: Optional["Stage"] = None
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+        self.processed = 0
+        self.errors = 0
+        self.busy_sec = 0.0
+        self.max_depth = 0
+
+    def start(self):
+        for i in range(self.workers):
+            t = threading.Thread(target=self._run, name=f"{self.name}-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def put(self, item):
+        self.in_q.put(item)   # 满了就阻塞：背压
+        depth = self.in_q.qsize()
+        if depth > self.max_depth:
+            self.max_depth = depth
+
+    def _run(self):
+        while True:
+            item = self.in_q.get()
+            if item is _STOP:
+                return
+            sweep, feed, _ = item
+            t0 = time.perf_counter()
+            try:
+                out = self.fn(item)
+                err = False
+            except Exception as e:
+                print(f"❌ [{self.name}] {feed.symbol} {type(e).__name__}: {e}")
+                out, err = None, True
+            with self._lock:
+                self.processed += 1
+                self.errors += int(err)
+                self.busy_sec += time.perf_counter() - t0
+            if out is None or self.next is None:
+                sweep.finish_one(error=err)
+            else:
+                self.next.put(out)
+
+    def stop(self):
+        for _ in self._threads:
+            self.in_q.put(_STOP)
+        for t in self._threads:
+            t.join()
+        self._threads = []
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "processed": self.processed,
+                "errors": self.errors,
+                "busy_sec": self.busy_sec,
+                "depth": self.in_q.qsize(),
+                "max_depth": self.max_depth,
+            }
+
+
+class Pipeline:
+    """
+    symbols 的 live 状态（SymbolFeed）+ 五个 stage
+    runtimes 传入时 feed 复用其中的 SymbolRuntimeState（init_warmup 的结果），并把新建的写回去
+    notify(symbol, evt, pend, trap)
+    clock() 返回毫秒时间戳，拉取时记一次，用来判断最后一根 bar 是否收盘；默认墙钟，录制回放换成录制时间
+    """
+    def __init__(self, pipeline_symbols: List[str], bn, *, runtimes: Optional[Dict] = None,
+                 notify: Callable = notify_event, workers: Optional[Dict[str, int]] = None,
+                 queue_size: int = QUEUE_SIZE, flow_book=None, clock: Optional[Callable] = None):
+        self.bn = bn
+        self.notify = notify
+        self.clock = clock or (lambda: int(time.time() * 1000))
+        self.flow_book = flow_book
+        self.runtimes = runtimes
+        self.feeds = {}
+        for s in pipeline_symbols:
+            self.add_symbol(s)
+
+        w = dict(STAGE_WORKERS, **(workers or {}))
+        self.stages = [
+            Stage("ingest", self._ingest, w["ingest"], queue_size),
+            Stage("decode", self._decode, w["decode"], queue_size),
+            Stage("feature", self._feature, w["feature"], queue_size),
+            Stage("detect", self._detect, w["detect"], queue_size),
+            Stage("dispatch", self._dispatch, w["dispatch"], queue_size),
+        ]
+        for a, b in zip(self.stages, self.stages[1:]):
+            a.next = b
+
+        # 盘中检查：FlowStream 回调只入队，同一个 symbol 排队中时不重复入队，队列满直接丢
+        self._early_q = queue.Queue(maxsize=queue_size)
+        self._early_pending = set()
+        self._early: Optional[threading.Thread] = None
+        self.early_checked = 0
+        self.early_dropped = 0
+
+        self._lock = threading.Lock()
+        self._done_cv = threading.Condition(self._lock)
+        self._wake = threading.Event()
+        self._stopping = False
+        self._feeder: Optional[threading.Thread] = None
+        self.current: Optional[Sweep] = None
+        self.last: Optional[Sweep] = None
+        self._rerun = False
+        self.sweeps = 0
+        self.coalesced = 0
+
+    def add_symbol(self, symbol: str):
+        from symbol_feed import SymbolFeed
+
+        if symbol in self.feeds:
+            return self.feeds[symbol]
+        feed = SymbolFeed(symbol, flow_book=self.flow_book)
+        if self.runtimes is not None:
+            feed.runtime = self.runtimes.setdefault(symbol, feed.runtime)
+        self.feeds[symbol] = feed
+        return feed
+
+    # ---------- stages ----------
+    def _ingest(self, item):
+        sweep, feed, _ = item
+        start_ms = feed.last_open_ms
+        if start_ms is None:
+            # 冷启动：检测窗口 + 大周期共振需要的历史，多出 ring 的部分在 merge 里直接进大周期聚合
+            start_ms = int(time.time() * 1000) - history_ms(HTF_REQUIRE)
+        # BNMonitor 只拉原始数组；StoreMonitor 之类没有 getRawKlines 的直接给 KlineData
+        fetch = getattr(self.bn, "getRawKlines", None) or self.bn.getSymbolKlines
+        raw = fetch(feed.symbol, KlineInterval.MINUTE_5.value, start_ms)
+        now_ms = self.clock()
+        if not raw:
+            sweep.add_error()
+            return None
+        return sweep, feed, (raw, now_ms)
+
+    def _decode(self, item):
+        sweep, feed, (raw, now_ms) = item
+        kl = raw if isinstance(raw[0], KlineData) else [parse_kline(r) for r in raw]
+        with feed.lock:
+            new_bars = feed.merge(kl)
+        return (sweep, feed, (new_bars, now_ms)) if new_bars else None
+
+    def _feature(self, item):
+        sweep, feed, (new_bars, now_ms) = item
+        with feed.lock:
+            return sweep, feed, feed.prepare(new_bars, now_ms=now_ms)
+
+    def _detect(self, item):
+        sweep, feed, steps = item
+        with feed.lock:
+            # 首次填充缓冲相当于 warmup，不补发历史报警
+            warm = feed.runtime.last_seen_ms is None
+            events = feed.detect(steps)
+        return (sweep, feed, events) if events and not warm else None
+
+    def _dispatch(self, item):
+        sweep, feed, events = item
+        for evt, pend, trap in events:
+            sweep.events.append((feed.symbol, evt, pend, trap))
+            if self.notify is not None:
+                self.notify(feed.symbol, evt, pend, trap)
+        return None
+
+    def check_early(self, symbol: str) -> bool:
+        """FlowStream 的 on_bucket 回调：只入队，返回是否入队（评估和报警都不在回调线程里做）"""
+        if symbol not in self.feeds:
+            return False
+        with self._lock:
+            if symbol in self._early_pending:
+                return False
+            self._early_pending.add(symbol)
+        try:
+            self._early_q.put_nowait(symbol)
+        except queue.Full:
+            with self._lock:
+                self._early_pending.discard(symbol)
+                self.early_dropped += 1
+            return False
+        return True
+
+    def _early_loop(self):
+        dispatch = self.stages[-1]
+        while True:
+            symbol = self._early_q.get()
+            if symbol is _STOP:
+                return
+            with self._lock:
+                self._early_pending.discard(symbol)
+                self.early_checked += 1
+            feed = self.feeds[symbol]
+            try:
+                with feed.lock:
+                    events = feed.check_early()
+            except Exception as e:
+                print(f"❌ [early] {symbol} {type(e).__name__}: {e}")
+                continue
+            if events:
+                # 不属于任何一轮 sweep：给一个只装这一个 symbol 的 Sweep，dispatch 走完即结束
+                dispatch.put((Sweep(0, 1), feed, events))
+
+    def process(self, symbol: str) -> list:
+        """
+        不经过队列，在当前线程把一个 symbol 依次走完五个 stage（录制回放 / 测试用，不需要 start）
+        没见过的 symbol 自动加入；返回 [(symbol, evt, pend, trap), ...]
+        """
+        sweep = Sweep(0, 1)
+        item = (sweep, self.add_symbol(symbol), None)
+        for st in self.stages:
+            item = st.fn(item)
+            if item is None:
+                break
+        return sweep.events
+
+    # ---------- sweep 调度 ----------
+    def start(self):
+        for st in self.stages:
+            st.start()
+        self._feeder = threading.Thread(target=self._feed_loop, name="pipeline-feeder", daemon=True)
+        self._feeder.start()
+        self._early = threading.Thread(target=self._early_loop, name="pipeline-early", daemon=True)
+        self._early.start()
+
+    def request_sweep(self) -> int:
+        """
+        请求一轮 sweep，返回会覆盖这次请求的 sweep 序号
+        已经有一轮在排队（上一轮还没跑完）时直接合并进去，不再叠加
+        """
+        with self._lock:
+            target = self.sweeps + 1
+            if self._rerun:
+                self.coalesced += 1
+                return target
+            self._rerun = True
+            busy = self.current is not None
+        if not busy:
+            self._wake.set()
+        return target
+
+    def _feed_loop(self):
+        ingest = self.stages[0]
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            with self._lock:
+                if self._stopping:
+                    return
+                if not self._rerun:
+                    continue
+                self._rerun = False
+                self.sweeps += 1
+                sweep = self.current = Sweep(self.sweeps, len(self.feeds))
+            for feed in list(self.feeds.values()):
+                ingest.put((sweep, feed, None))
+            sweep.done.wait()
+            with self._lock:
+                self.last = sweep
+                self.current = None
+                self._done_cv.notify_all()
+                if self._rerun:
+                    self._wake.set()
+
+    def run_sweep(self, timeout: Optional[float] = None) -> Optional[Sweep]:
+        """同步跑一轮（脚本 / 压测用），返回完成的 Sweep；超时返回 None"""
+        target = self.request_sweep()
+        with self._lock:
+            ok = self._done_cv.wait_for(lambda: self.last is not None and self.last.seq >= target, timeout)
+            return self.last if ok else None
+
+    def stop(self):
+        with self._lock:
+            self._stopping = True
+            self._rerun = False
+        self._wake.set()
+        if self._feeder is not None:
+            self._feeder.join()
+        if self._early is not None:
+            self._early_q.put(_STOP)
+            self._early.join()
+        for st in self.stages:
+            st.stop()
+
+    # ---------- 统计 ----------
+    def stats(self) -> dict:
+        last = self.last
+        return {
+            "sweeps": self.sweeps,
+            "coalesced": self.coalesced,
+            "in_flight": self.current is not None,
+            "last_sweep_sec": last.sec if last else None,
+            "last_events": len(last.events) if last else 0,
+            "last_fetch_errors": last.errors if last else 0,
+            "early_checked": self.early_checked,
+            "early_dropped": self.early_dropped,
+            "stages": {st.name: st.stats() for st in self.stages},
+        }
+
+    def print_stats(self):
+        st = self.stats()
+        last = "-" if st["last_sweep_sec"] is None else f"{st['last_sweep_sec']:.1f}s"
+        print(f"\n📊 pipeline @ {datetime.now().strftime('%H:%M:%S')} sweeps={st['sweeps']} "
+              f"coalesced={st['coalesced']} last={last} events={st['last_events']} "
+              f"errors={st['last_fetch_errors']} early={st['early_checked']} early_dropped={st['early_dropped']}")
+        for name, s in st["stages"].items():
+            print(f"  {name:<8} x{s['workers']:<2} processed={s['processed']} errors={s['errors']} "
+                  f"busy={s['busy_sec']:.1f}s depth={s['depth']} max_depth={s['max_depth']}")
+
+
+if __name__ == "__main__":
+    from gainers_predict_main import get_bn
+    from symbols import symbols
+
+    parser = argparse.ArgumentParser(description="staged live monitor pipeline")
+    parser.add_argument("--sweeps", type=int, default=0, help="跑 N 轮后退出，0=一直跑")
+    parser.add_argument("--ingest", type=int, default=STAGE_WORKERS["ingest"], help="拉取线程数")
+    args = parser.parse_args()
+
+    p = Pipeline(symbols, get_bn(), workers={"ingest": args.ingest})
+    p.start()
+    try:
+        n = 0
+        while args.sweeps <= 0 or n < args.sweeps:
+            t0 = time.time()
+            p.run_sweep()
+            n += 1
+            p.print_stats()
+            if args.sweeps <= 0 or n < args.sweeps:
+                time.sleep(max(0.0, POLL_INTERVAL * 60 - (time.time() - t0)))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        p.stop()
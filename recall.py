@@ -1,6 +1,6 @@
 from typing import List, Dict, Any, Tuple
 
-from env import RunMode
+from env import RunMode, set_run_mode
 from gainers_predict_main import init_warmup
 from interal_enum import KlineInterval
 from process_symbol import SignalState
@@ -11,4 +11,6 @@ from strategy import is_accumulation_phase_5m, is_real_volume_breakout_5m_strict
 
 if __name__ == '__main__':
     globalRunMode = RunMode.BACKTEST
+    # 回测只读本地 K线库（先用 backfill.py 拉数据），不连交易所
+    set_run_mode(RunMode.OFFLINE)
     init_warmup(specific_symbol="BASUSDT")
\ No newline at end of file
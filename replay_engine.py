@@ -1,12 +1,29 @@
 # replay_engine.py
+from decision_trace import Reason, reason_code
+from gaps import apply_gap_policy
+from interal_enum import GapPolicy
 from state import SignalState
 from strategy import (
     is_accumulation_phase_5m,
+    is_early_breakout,
+    is_htf_aligned,
     is_real_volume_breakout_5m_strict,
     trap_score_after_breakout,
 )
 
 BAR_MS = 5 * 60 * 1000
+GAP_WINDOW_BARS = 120   # 缺口检查范围 = strict 的 window_len（检测器只看这么多）
+
+
+def _htf_agrees(htf, htf_require) -> bool:
+    for iv in htf_require:
+        bars = (htf or {}).get(iv)
+        if not bars:
+            return False
+        ok, _ = is_htf_aligned(bars, iv)
+        if not ok:
+            return False
+    return True
 
 
 def step_symbol(
@@ -18,11 +35,31 @@ def step_symbol(
     trap_max,
     confirm_bars,
     pending_ttl_bars,
+    htf=None,           # {KlineInterval: [已收盘大周期 bar]}，由 resample 本地聚合
+    htf_require=(),     # 生成候选前必须共振的大周期
+    gap_policy=GapPolicy.SKIP,
+    trace=None,         # decision_trace.SymbolTrace：每根 bar 记录一行决策原因
+    flow=None,          # order_flow 盘中指标（只对还没收盘的 bar 传），用于收盘前提前报警
+    baseline=None,      # baselines.Baseline：symbol 归一化阈值；excluded 的 symbol 不跑 strict
 ):
     """
     核心状态推进函数（一个 bar 一次）
     """
     events = []
+    reason = None       # 仅 trace 用：pending 分支的结论
+    binfo = None
+    trap = None
+
+    # 缺口处理：INVALID 时整根 bar 跳过（pending 的 TTL 在下一根有效 bar 上照常检查）
+    klines_view = apply_gap_policy(klines_view, gap_policy, tail=GAP_WINDOW_BARS, step_ms=BAR_MS)
+    if klines_view is None:
+        runtime.last_seen_ms = now_ms
+        if trace is not None:
+            trace.record(now_ms, runtime.state.value, Reason.GAP_INVALID, {})
+        return events
+
+    strict_kwargs = baseline.strict_kwargs if baseline is not None else {}
+    accum_kwargs = baseline.accum_kwargs if baseline is not None else {}
 
     # ========== 0) pending 二次确认 ==========
     if runtime.pending is not None:
@@ -31,7 +68,9 @@ def step_symbol(
         # TTL
         if now_ms - pend["created_ms"] > pending_ttl_bars * BAR_MS:
             runtime.pending = None
+            reason = Reason.PENDING_EXPIRED
         else:
+            reason = Reason.PENDING_WAIT
             bo_time = pend["breakout_open_time"]
             pos = None
             for i in range(len(klines_view)-1, -1, -1):
@@ -41,6 +80,7 @@ def step_symbol(
 
             if pos is None:
                 runtime.pending = None
+                reason = Reason.PENDING_LOST
             else:
                 bars_after = klines_view[pos+1:]
                 if len(bars_after) >= confirm_bars:
@@ -61,16 +101,36 @@ def step_symbol(
                         runtime.last_alert_ms = now_ms
                         runtime.pending = None
                         events.append(("BREAKOUT_CONFIRMED", pend, trap))
+                        reason = Reason.CONFIRMED
 
                     elif detail.get("back_into_box"):
                         runtime.pending = None
+                        reason = Reason.BACK_INTO_BOX
+
+    # ========== 0.5) 盘中提前突破（吸筹中 + 逐笔成交放量主买） ==========
+    if (flow is not None and runtime.pending is None and runtime.state == SignalState.ACCUM
+            and runtime.last_early_ms != now_ms):
+        ok, einfo = is_early_breakout(klines_view, flow)
+        if ok:
+            runtime.last_early_ms = now_ms
+            events.append(("BREAKOUT_EARLY", {"created_ms": now_ms, **einfo}, None))
+            reason = Reason.EARLY_BREAKOUT
 
     # ========== 1) strict → 生成候选 ==========
-    if runtime.pending is None:
-        ok, binfo = is_real_volume_breakout_5m_strict(klines_view)
+    # 结构性排除（基线按 strict 统计出来的）只跳过 strict；吸筹 / 盘中提前突破照常跑
+    if runtime.pending is None and baseline is not None and baseline.excluded:
+        if reason is None:
+            reason = Reason.EXCLUDED
+    elif runtime.pending is None:
+        ok, binfo = is_real_volume_breakout_5m_strict(klines_view, **strict_kwargs)
         if ok:
             score = float(binfo["score"])
-            if score >= score_min:
+            if score < score_min:
+                strict_reason = Reason.SCORE_LOW
+            elif not _htf_agrees(htf, htf_require):
+                strict_reason = Reason.HTF_REJECT
+            else:
+                strict_reason = Reason.CANDIDATE
                 runtime.pending = {
                     "created_ms": now_ms,
                     "breakout_open_time": int(binfo["breakout_open_time"]),
@@ -78,14 +138,30 @@ def step_symbol(
                     "break_eps": float(binfo.get("break_eps", 0.003)),
                     "score": score,
                 }
+        else:
+            strict_reason = None
+        # 确认报警最优先；其次 pending 的结论（过期 / 跌回箱体），除非这根 bar 又生成了新候选
+        if trace is not None and reason != Reason.CONFIRMED and (reason is None or strict_reason == Reason.CANDIDATE):
+            reason = strict_reason if strict_reason is not None else reason_code(binfo["reason"])
 
     # ========== 2) ACCUM / NONE ==========
     if runtime.pending is None:
-        if is_accumulation_phase_5m(klines_view):
+        if is_accumulation_phase_5m(klines_view, **accum_kwargs):
             runtime.enter_accum(now_ms)
         else:
             if runtime.state != SignalState.BREAKOUT:
                 runtime.enter_none()
 
     runtime.last_seen_ms = now_ms
+
+    if trace is not None:
+        # 拷一份：binfo 是检测器返回的 info，不能往里加 trace 用的字段
+        metrics = dict(binfo) if binfo is not None else {}
+        if trap is not None:
+            metrics["trap"] = trap
+        metrics["close"] = klines_view[-1].close_price
+        if reason is None:
+            reason = Reason.ACCUM if runtime.state == SignalState.ACCUM else Reason.NONE
+        trace.record(now_ms, runtime.state.value, reason, metrics)
+
     return events
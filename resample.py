@@ -0,0 +1,128 @@
+# resample.py
+"""
+5m → 15m / 30m / 1h / 4h 本地聚合（不额外请求 API）
+
+- 桶按 open_time 对齐到 UTC（与币安一致：open_time % interval_ms == 0）
+- 只有桶内 5m bar 全部到齐才产出（exact），缺 bar 的桶丢弃并计数
+- 增量：每来一根已收盘的 5m bar 更新一次累加器，桶最后一根到齐时吐出大周期 bar
+"""
+from collections import deque
+from typing import Dict, Iterable, List, Optional
+
+from bn_tool import KlineData
+from env import LOOKBACK_HOURS
+from interal_enum import KlineInterval, interval_ms
+
+BASE_MS = interval_ms(KlineInterval.MINUTE_5)
+HTF_INTERVALS = (
+    KlineInterval.MINUTE_15,
+    KlineInterval.MINUTE_30,
+    KlineInterval.HOUR_1,
+    KlineInterval.HOUR_4,
+)
+HTF_MAXLEN = 64   # 每个大周期保留的已收盘 bar 数
+HTF_HISTORY_BARS = 7   # strategy.is_htf_aligned 默认看最近 6 根已收盘的大周期 bar，再多一根给没对齐的首桶
+
+
+class Resampler:
+    def __init__(self, interval: KlineInterval, maxlen: int = HTF_MAXLEN):
+        self.interval = interval
+        self.ms = interval_ms(interval)
+        if self.ms % BASE_MS != 0:
+            raise ValueError(f"{interval.value} is not a multiple of 5m")
+        self.n = self.ms // BASE_MS
+
+        self.bars = deque(maxlen=maxlen)   # 已收盘的大周期 bar
+        self.last_open_ms = None            # 最后喂进来的 5m bar
+        self.incomplete = 0                 # 因缺 bar 丢弃的桶数
+        self._reset(None)
+
+    def _reset(self, bucket_start):
+        self._bucket = bucket_start
+        self._count = 0
+        self._acc = None
+
+    def update(self, bar: KlineData) -> Optional[KlineData]:
+        """喂一根已收盘的 5m bar；桶凑齐时返回新的大周期 bar"""
+        if self.last_open_ms is not None and bar.open_time <= self.last_open_ms:
+            return None
+        self.last_open_ms = bar.open_time
+
+        start = bar.open_time - bar.open_time % self.ms
+        if start != self._bucket:
+            if self._count:
+                self.incomplete += 1
+            self._reset(start)
+
+        a = self._acc
+        if a is None:
+            self._acc = KlineData(
+                open_time=start,
+                open_price=bar.open_price,
+                high_price=bar.high_price,
+                low_price=bar.low_price,
+                close_price=bar.close_price,
+                volume=bar.volume,
+                close_time=start + self.ms - 1,
+                quote_volume=bar.quote_volume,
+                trade_count=bar.trade_count,
+                buy_volume=bar.buy_volume,
+                buy_quote_volume=bar.buy_quote_volume,
+                ignore="0",
+            )
+        else:
+            a.high_price = max(a.high_price, bar.high_price)
+            a.low_price = min(a.low_price, bar.low_price)
+            a.close_price = bar.close_price
+            a.volume += bar.volume
+            a.quote_volume += bar.quote_volume
+            a.trade_count += bar.trade_count
+            a.buy_volume += bar.buy_volume
+            a.buy_quote_volume += bar.buy_quote_volume
+        self._count += 1
+
+        if bar.open_time != start + self.ms - BASE_MS:
+            return None
+
+        out = self._acc if self._count == self.n else None
+        if out is None:
+            self.incomplete += 1
+        else:
+            self.bars.append(out)
+        self._reset(None)
+        return out
+
+
+class MultiResampler:
+    """同一个 symbol 的多个大周期一起维护"""
+    def __init__(self, intervals: Iterable[KlineInterval] = HTF_INTERVALS, maxlen: int = HTF_MAXLEN):
+        self.resamplers = {iv: Resampler(iv, maxlen) for iv in intervals}
+
+    def update(self, bar: KlineData):
+        for r in self.resamplers.values():
+            r.update(bar)
+
+    @property
+    def last_open_ms(self) -> Optional[int]:
+        """最后喂进来的 5m bar（各周期一起更新，取最小的那个）"""
+        seen = [r.last_open_ms for r in self.resamplers.values()]
+        if not seen or None in seen:
+            return None
+        return min(seen)
+
+    def views(self) -> Dict[KlineInterval, List[KlineData]]:
+        return {iv: list(r.bars) for iv, r in self.resamplers.items()}
+
+
+def history_ms(htf_require: Iterable[KlineInterval] = (), lookback_hours: float = LOOKBACK_HOURS) -> int:
+    """冷启动 / warmup 要拉的 5m 历史长度：检测窗口和每个 htf_require 大周期 HTF_HISTORY_BARS 根，取大的"""
+    need = [lookback_hours * 3600 * 1000] + [interval_ms(iv) * HTF_HISTORY_BARS for iv in htf_require]
+    return int(max(need))
+
+
+def resample_klines(klines: List[KlineData], interval: KlineInterval) -> List[KlineData]:
+    """一次性聚合整段 5m 序列（回测 / 离线用）"""
+    r = Resampler(interval, maxlen=None)
+    for k in klines:
+        r.update(k)
+    return list(r.bars)
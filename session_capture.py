@@ -0,0 +1,264 @@
+# session_capture.py
+"""
+行情会话录制 / 回放：用真实行情复现 live 的性能问题和报警决策
+
+录制：BN_CAPTURE=/path/session.cap python gainers_predict_main.py
+  - RecordingClient 包住真实 Client，每次 futures_klines 的参数 + 原始响应 + 接收时间写入 capture
+  - 流式消息（ws）用 CaptureWriter.append(KIND_STREAM, ...) 写同一个文件
+回放：python session_capture.py replay /path/session.cap --speed 100
+  - ReplayClient 按 symbol 顺序吐出录到的响应，逐条走 live 的 Pipeline stage（ingest → … → detect，不发通知）
+  - speed=1 原速、100 百倍速、0 不等待（max）；结束时输出延迟分位数和吞吐
+
+文件格式（append-only）：
+  <name>        b"BNCAP1\\n" + 记录*；记录 = <qBHI>(recv_ts_ms, kind, symbol_len, payload_len) + symbol + zlib(json)
+  <name>.idx    每条记录一个 <qQ>(recv_ts_ms, offset)，按时间二分定位
+"""
+import argparse
+import bisect
+import json
+import os
+import statistics
+import struct
+import threading
+import time
+import zlib
+from collections import defaultdict, deque
+from typing import Iterator, Optional, Tuple
+
+MAGIC = b"BNCAP1\n"
+_HDR = struct.Struct("<qBHI")
+_IDX = struct.Struct("<qQ")
+
+KIND_KLINES = 1   # REST futures_klines：{"params": {...}, "resp": [...]}
+KIND_STREAM = 2   # ws 消息原文
+
+FLUSH_EVERY = 256
+
+
+class CaptureWriter:
+    def __init__(self, path: str):
+        new = not os.path.exists(path) or os.path.getsize(path) == 0
+        self.path = path
+        self._f = open(path, "ab")
+        self._idx = open(path + ".idx", "ab")
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._closed = False
+        if new:
+            self._f.write(MAGIC)
+
+    def append(self, kind: int, symbol: str, payload, recv_ts_ms: Optional[int] = None):
+        if recv_ts_ms is None:
+            recv_ts_ms = int(time.time() * 1000)
+        sym = symbol.encode("utf-8")
+        body = zlib.compress(json.dumps(payload, separators=(",", ":")).encode("utf-8"))
+        with self._lock:
+            if self._closed:   # 退出时已 close，后台线程迟到的记录丢掉
+                return
+            offset = self._f.tell()
+            self._f.write(_HDR.pack(recv_ts_ms, kind, len(sym), len(body)))
+            self._f.write(sym)
+            self._f.write(body)
+            self._idx.write(_IDX.pack(recv_ts_ms, offset))
+            self._pending += 1
+            if self._pending >= FLUSH_EVERY:
+                self._flush()
+
+    def _flush(self):
+        self._f.flush()
+        self._idx.flush()
+        self._pending = 0
+
+    def close(self):
+        """可重复调用（atexit 和手动 close 都可能走到）"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._flush()
+            self._f.close()
+            self._idx.close()
+
+
+class CaptureReader:
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._buf = f.read()
+        if not self._buf.startswith(MAGIC):
+            raise ValueError(f"{path} is not a capture file")
+        try:
+            with open(path + ".idx", "rb") as f:
+                idx = f.read()
+            self._index = [_IDX.unpack_from(idx, i) for i in range(0, len(idx) - len(idx) % _IDX.size, _IDX.size)]
+        except FileNotFoundError:
+            self._index = None
+
+    def _offset_at(self, ts_ms: int) -> int:
+        if not self._index:
+            return len(MAGIC)
+        i = bisect.bisect_left(self._index, (ts_ms, 0))
+        return self._index[i][1] if i < len(self._index) else len(self._buf)
+
+    def records(self, start_ms: Optional[int] = None, end_ms: Optional[int] = None) -> Iterator[Tuple[int, int, str, object]]:
+        """(recv_ts_ms, kind, symbol, payload)，按写入顺序"""
+        buf = self._buf
+        pos = self._offset_at(start_ms) if start_ms is not None else len(MAGIC)
+        while pos + _HDR.size <= len(buf):
+            ts, kind, sym_len, body_len = _HDR.unpack_from(buf, pos)
+            pos += _HDR.size
+            if pos + sym_len + body_len > len(buf):
+                break  # 尾部写了一半（进程被杀），丢弃
+            symbol = buf[pos: pos + sym_len].decode("utf-8")
+            pos += sym_len
+            body = buf[pos: pos + body_len]
+            pos += body_len
+            if end_ms is not None and ts > end_ms:
+                break
+            if start_ms is not None and ts < start_ms:
+                continue
+            yield ts, kind, symbol, json.loads(zlib.decompress(body))
+
+
+class RecordingClient:
+    """包一层真实 Client：futures_klines 照常返回，同时录制；其它方法原样透传"""
+    def __init__(self, writer: CaptureWriter, inner=None):
+        self.writer = writer
+        self._inner = inner
+        self._lock = threading.Lock()
+
+    @property
+    def inner(self):
+        if self._inner is None:
+            with self._lock:
+                if self._inner is None:
+                    from bn_tool import make_client
+                    self._inner = make_client()
+        return self._inner
+
+    def futures_klines(self, **params):
+        resp = self.inner.futures_klines(**params)
+        self.writer.append(KIND_KLINES, params.get("symbol", ""), {"params": params, "resp": resp})
+        return resp
+
+    def __getattr__(self, name):
+        return getattr(self.inner, name)
+
+
+class ReplayClient:
+    """假 Client：每个 symbol 一个队列，futures_klines 依次吐出录到的响应"""
+    def __init__(self):
+        self._queues = defaultdict(deque)
+        self._lock = threading.Lock()
+
+    def push(self, symbol: str, resp: list):
+        with self._lock:
+            self._queues[symbol].append(resp)
+
+    def futures_klines(self, symbol, **_):
+        with self._lock:
+            q = self._queues.get(symbol)
+            return q.popleft() if q else []
+
+
+def _pct(xs, p):
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(round(p / 100.0 * (len(xs) - 1))))] if xs else 0.0
+
+
+def replay(path: str, speed: float = 0.0, start_ms: Optional[int] = None,
+           end_ms: Optional[int] = None) -> dict:
+    """
+    按录制时的节奏把 K线响应喂回 Pipeline（和 live 同一套 merge / 大周期 / gap_policy / 首轮不报警），统计整条链路
+    speed<=0 表示不等待
+    """
+    from bn_tool import BNMonitor
+    from pipeline import Pipeline
+
+    client = ReplayClient()
+    # 是否收盘按录制时的接收时间判断，和当时 live 看到的一致（用墙钟的话所有 bar 都「已收盘」）
+    clock_ms = [0]
+    pipeline = Pipeline([], BNMonitor(max_qps=10 ** 9, client=client), notify=None,
+                        clock=lambda: clock_ms[0])
+
+    latencies = []
+    bars = 0
+    events = []
+    lag_ms = 0.0
+    first_ts = None
+    wall0 = time.perf_counter()
+
+    for ts, kind, symbol, payload in CaptureReader(path).records(start_ms, end_ms):
+        if kind != KIND_KLINES:
+            continue
+        if first_ts is None:
+            first_ts = ts
+        if speed > 0:
+            due = (ts - first_ts) / 1000.0 / speed
+            behind = time.perf_counter() - wall0 - due
+            if behind < 0:
+                time.sleep(-behind)
+            else:
+                lag_ms = max(lag_ms, behind * 1000)
+
+        client.push(symbol, payload["resp"])
+        clock_ms[0] = ts
+        t0 = time.perf_counter()
+        for _, evt, pend, trap in pipeline.process(symbol):
+            events.append((ts, symbol, evt, pend.get("score", 0.0), trap or 0.0))
+        latencies.append(time.perf_counter() - t0)
+        bars += len(payload["resp"])
+
+    wall = time.perf_counter() - wall0
+    return {
+        "calls": len(latencies),
+        "bars": bars,
+        "events": events,
+        "wall_sec": wall,
+        "calls_per_sec": len(latencies) / wall if wall > 0 else 0.0,
+        "bars_per_sec": bars / wall if wall > 0 else 0.0,
+        "latency_ms": {
+            "p50": _pct(latencies, 50) * 1000,
+            "p95": _pct(latencies, 95) * 1000,
+            "p99": _pct(latencies, 99) * 1000,
+            "max": max(latencies) * 1000 if latencies else 0.0,
+            "mean": statistics.mean(latencies) * 1000 if latencies else 0.0,
+        },
+        "max_lag_ms": lag_ms,
+    }
+
+
+def info(path: str) -> dict:
+    n = 0
+    kinds = defaultdict(int)
+    symbols = set()
+    first = last = None
+    for ts, kind, symbol, _ in CaptureReader(path).records():
+        n += 1
+        kinds[kind] += 1
+        symbols.add(symbol)
+        first = ts if first is None else first
+        last = ts
+    return {"records": n, "kinds": dict(kinds), "symbols": len(symbols),
+            "first_ms": first, "last_ms": last, "bytes": os.path.getsize(path)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="market session capture / replay")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_info = sub.add_parser("info")
+    p_info.add_argument("path")
+    p_replay = sub.add_parser("replay")
+    p_replay.add_argument("path")
+    p_replay.add_argument("--speed", type=float, default=0.0, help="1=原速，100=百倍速，0=不等待")
+    p_replay.add_argument("--start-ms", type=int, default=None)
+    p_replay.add_argument("--end-ms", type=int, default=None)
+    args = parser.parse_args()
+
+    if args.cmd == "info":
+        print(info(args.path))
+    else:
+        r = replay(args.path, args.speed, args.start_ms, args.end_ms)
+        for ts, symbol, evt, score, trap in r.pop("events"):
+            print(f"{ts} {symbol} {evt} score={score:.0f} trap={trap:.0f}")
+        print(r)
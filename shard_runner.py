@@ -0,0 +1,261 @@
+# shard_runner.py
+"""
+多进程分片 live 模式
+
+- 每个 worker 进程独占一部分 symbol：SymbolFeed（runtime + 环形缓冲）、BNMonitor、限流预算（总 QPS / N）
+- worker 内部仍用线程池做 I/O，策略 CPU 分摊到 N 个核
+- coordinator 只负责：汇总事件 → 报警、收集每个 shard 的 sweep 统计、进程挂掉自动重启、干净退出
+
+用法：
+    python shard_runner.py --shards 4
+"""
+import argparse
+import multiprocessing as mp
+import queue
+import signal
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from alert import notify_breakout
+from env import HTF_REQUIRE, MAX_WORKERS, POLL_INTERVAL
+from gaps import GAP_STATS
+from interal_enum import KlineInterval
+from symbols import symbols
+
+TOTAL_QPS = 8              # 单 IP 的总 QPS 预算，按 shard 平分
+STATS_EVERY_SEC = 60       # coordinator 打印 shard 统计的间隔
+RESTART_BACKOFF_SEC = 5    # worker 挂掉后的重启间隔
+JOIN_TIMEOUT_SEC = 10      # 退出时等待 worker 的时间，超时直接 terminate
+
+
+def shard_of(symbol: str, n_shards: int) -> int:
+    # 不能用 hash()：不同进程的字符串 hash 带随机种子
+    return zlib.crc32(symbol.encode("utf-8")) % n_shards
+
+
+def partition_symbols(all_symbols: List[str], n_shards: int) -> List[List[str]]:
+    parts = [[] for _ in range(n_shards)]
+    for s in all_symbols:
+        parts[shard_of(s, n_shards)].append(s)
+    return parts
+
+
+class ShardWorker:
+    """
+    一个 shard 的全部 live 状态（进程内对象）
+    sweep() = 对自己拥有的每个 symbol：增量拉取 → 合并环形缓冲 → step_symbol
+    """
+    def __init__(self, shard_id: int, shard_symbols: List[str], max_qps: float,
+                 threads: int = MAX_WORKERS, bn=None):
+        from bn_tool import BNMonitor
+        from symbol_feed import SymbolFeed
+
+        self.shard_id = shard_id
+        self.bn = bn if bn is not None else BNMonitor(max_qps=max_qps)
+        self.feeds: Dict = {s: SymbolFeed(s) for s in shard_symbols}
+        self.executor = ThreadPoolExecutor(max_workers=threads)
+        self.sweeps = 0
+
+    def _fetch_and_step(self, feed) -> Optional[list]:
+        from resample import history_ms
+
+        start_ms = feed.last_open_ms
+        if start_ms is None:
+            start_ms = int(time.time() * 1000) - history_ms(HTF_REQUIRE)
+        kl = self.bn.getSymbolKlines(feed.symbol, KlineInterval.MINUTE_5.value, start_ms)
+        if not kl:
+            return None
+
+        warm = feed.last_open_ms is None
+        new_bars = feed.merge(kl)
+        events = feed.advance(new_bars)
+        # 首次填充缓冲相当于 warmup，不补发历史报警
+        return [] if warm else events
+
+    def sweep(self):
+        t0 = time.time()
+        cpu0 = time.process_time()
+        feeds = list(self.feeds.values())
+        results = list(self.executor.map(self._fetch_and_step, feeds))
+
+        events = []
+        errors = 0
+        for feed, evts in zip(feeds, results):
+            if evts is None:
+                errors += 1
+                continue
+            for evt, pend, trap in evts:
+                events.append((feed.symbol, evt, pend, trap))
+
+        self.sweeps += 1
+        stats = {
+            "shard": self.shard_id,
+            "symbols": len(feeds),
+            "sweeps": self.sweeps,
+            "sweep_sec": time.time() - t0,
+            "cpu_sec": time.process_time() - cpu0,
+            "events": len(events),
+            "fetch_errors": errors,
+            "gaps": GAP_STATS.snapshot(),
+            "ts": time.time(),
+        }
+        return events, stats
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _shard_main(shard_id, shard_symbols, max_qps, threads, poll_sec, out_q, stop_evt):
+    """worker 进程入口（spawn 下必须是顶层函数）"""
+    # Ctrl+C 只由 coordinator 处理，worker 等 stop_evt
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    worker = ShardWorker(shard_id, shard_symbols, max_qps, threads)
+    try:
+        while not stop_evt.is_set():
+            events, stats = worker.sweep()
+            for symbol, evt, pend, trap in events:
+                out_q.put(("event", shard_id, symbol, evt, pend, trap))
+            out_q.put(("stats", shard_id, stats))
+            stop_evt.wait(max(0.0, poll_sec - stats["sweep_sec"]))
+    finally:
+        worker.close()
+
+
+class ShardCoordinator:
+    def __init__(self, n_shards: int, all_symbols: List[str] = symbols,
+                 total_qps: float = TOTAL_QPS, threads: int = MAX_WORKERS,
+                 poll_sec: float = POLL_INTERVAL * 60):
+        self.n_shards = n_shards
+        self.parts = partition_symbols(all_symbols, n_shards)
+        self.qps_per_shard = total_qps / n_shards
+        self.threads = threads
+        self.poll_sec = poll_sec
+
+        self.ctx = mp.get_context("spawn")
+        self.out_q = self.ctx.Queue()
+        self.stop_evt = self.ctx.Event()
+        self.procs: Dict[int, mp.Process] = {}
+        self.restarts = {i: 0 for i in range(n_shards)}
+        self.restart_at: Dict[int, float] = {}   # shard → 计划重启时间（退避期间不阻塞主循环）
+        self.last_stats: Dict[int, dict] = {}
+        self._last_print = time.time()
+
+    # ---------- 进程管理 ----------
+    def _spawn(self, shard_id: int):
+        p = self.ctx.Process(
+            target=_shard_main,
+            args=(shard_id, self.parts[shard_id], self.qps_per_shard, self.threads,
+                  self.poll_sec, self.out_q, self.stop_evt),
+            name=f"shard-{shard_id}",
+            daemon=True,
+        )
+        p.start()
+        self.procs[shard_id] = p
+
+    def start(self):
+        for i in range(self.n_shards):
+            self._spawn(i)
+        print(f"🧩 {self.n_shards} shards started: "
+              + ", ".join(f"#{i}={len(p)}" for i, p in enumerate(self.parts)))
+
+    def restart(self, shard_id: int):
+        p = self.procs.get(shard_id)
+        if p is not None and p.is_alive():
+            p.terminate()
+            p.join(JOIN_TIMEOUT_SEC)
+        self.restarts[shard_id] += 1
+        self.last_stats.pop(shard_id, None)
+        self.restart_at.pop(shard_id, None)
+        self._spawn(shard_id)
+
+    def check_shards(self, now: Optional[float] = None):
+        """挂掉的 shard 先记一个重启时间，到点后在之后的某次循环里重启；期间其它 shard 的事件照常处理"""
+        if self.stop_evt.is_set():
+            return
+        now = time.time() if now is None else now
+        for i, p in list(self.procs.items()):
+            if p.is_alive():
+                continue
+            due = self.restart_at.get(i)
+            if due is None:
+                print(f"⚠️ shard #{i} exited (code={p.exitcode}), restarting in {RESTART_BACKOFF_SEC}s...")
+                self.restart_at[i] = now + RESTART_BACKOFF_SEC
+            elif now >= due:
+                self.restart(i)
+
+    def stop(self):
+        self.stop_evt.set()
+        deadline = time.time() + JOIN_TIMEOUT_SEC
+        for p in self.procs.values():
+            p.join(max(0.0, deadline - time.time()))
+        for p in self.procs.values():
+            if p.is_alive():
+                p.terminate()
+                p.join()
+        print("🛑 shards stopped")
+
+    # ---------- 主循环 ----------
+    def _handle(self, msg):
+        kind = msg[0]
+        if kind == "event":
+            _, shard_id, symbol, evt, pend, trap = msg
+            notify_breakout(symbol, pend, trap)
+        elif kind == "stats":
+            _, shard_id, stats = msg
+            self.last_stats[shard_id] = stats
+
+    def stats(self) -> Dict[int, dict]:
+        out = {}
+        for i in range(self.n_shards):
+            st = dict(self.last_stats.get(i, {}))
+            p = self.procs.get(i)
+            st["alive"] = bool(p and p.is_alive())
+            st["restarts"] = self.restarts[i]
+            out[i] = st
+        return out
+
+    def print_stats(self):
+        print(f"\n📊 shard stats @ {datetime.now().strftime('%H:%M:%S')}")
+        for i, st in self.stats().items():
+            if "sweep_sec" not in st:
+                print(f"  #{i} alive={st['alive']} restarts={st['restarts']} (no sweep yet)")
+                continue
+            print(
+                f"  #{i} alive={st['alive']} restarts={st['restarts']} symbols={st['symbols']} "
+                f"sweeps={st['sweeps']} sweep={st['sweep_sec']:.1f}s cpu={st['cpu_sec']:.1f}s "
+                f"events={st['events']} fetch_errors={st['fetch_errors']} "
+                f"gap_windows={st['gaps']['windows_with_gaps']}"
+            )
+
+    def run_forever(self):
+        self.start()
+        try:
+            while True:
+                try:
+                    self._handle(self.out_q.get(timeout=1.0))
+                except queue.Empty:
+                    pass
+
+                self.check_shards()
+
+                if time.time() - self._last_print >= STATS_EVERY_SEC:
+                    self._last_print = time.time()
+                    self.print_stats()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="multi-process sharded live monitor")
+    parser.add_argument("--shards", type=int, default=max(1, mp.cpu_count() - 1))
+    parser.add_argument("--qps", type=float, default=TOTAL_QPS, help="total QPS budget of this IP")
+    parser.add_argument("--threads", type=int, default=MAX_WORKERS, help="I/O threads per shard")
+    args = parser.parse_args()
+
+    ShardCoordinator(args.shards, total_qps=args.qps, threads=args.threads).run_forever()
@@ -121,6 +121,9 @@ class StateManager:
 
 
 
+SNAPSHOT_VERSION = 1
+
+
 class SymbolRuntimeState:
     """
     单 symbol 的运行时状态（可由 replay 完全恢复）
@@ -131,6 +134,7 @@ class SymbolRuntimeState:
         self.pending = None              # dict or None
         self.last_alert_ms = None         # 防重复报警
         self.last_seen_ms = None          # 最新处理的 bar
+        self.last_early_ms = None         # 最近一次盘中提前报警的 bar（每根 bar 只报一次）
 
     def enter_accum(self, now_ms):
         if self.state != SignalState.ACCUM:
@@ -147,3 +151,28 @@ class SymbolRuntimeState:
     def enter_none(self):
         self.state = SignalState.NONE
         self.exit_accum()
+
+    # ---------- 快照（跨进程 / 跨节点交接） ----------
+    def to_snapshot(self) -> dict:
+        return {
+            "v": SNAPSHOT_VERSION,
+            "state": self.state.name,
+            "accum_start_ms": self.accum_start_ms,
+            "pending": dict(self.pending) if self.pending is not None else None,
+            "last_alert_ms": self.last_alert_ms,
+            "last_seen_ms": self.last_seen_ms,
+            "last_early_ms": self.last_early_ms,
+        }
+
+    @classmethod
+    def from_snapshot(cls, snap: dict) -> "SymbolRuntimeState":
+        if snap.get("v") != SNAPSHOT_VERSION:
+            raise ValueError(f"unsupported snapshot version: {snap.get('v')}")
+        rt = cls()
+        rt.state = SignalState[snap["state"]]
+        rt.accum_start_ms = snap["accum_start_ms"]
+        rt.pending = snap["pending"]
+        rt.last_alert_ms = snap["last_alert_ms"]
+        rt.last_seen_ms = snap["last_seen_ms"]
+        rt.last_early_ms = snap.get("last_early_ms")  # 旧快照没有这个字段
+        return rt
@@ -4,6 +4,7 @@ import numpy as np
 # import talib
 
 from bn_tool import KlineData
+from interal_enum import KlineInterval, interval_ms
 
 
 from typing import List, Tuple, Dict
@@ -44,11 +45,16 @@ def _linreg_slope(y: np.ndarray) -> float:
     return float(np.sum(x * y) / denom)
 
 
+def _range_scale(interval: KlineInterval) -> float:
+    # 波动阈值按 sqrt(时间) 缩放：阈值是按 5m 标定的
+    return float(np.sqrt(interval_ms(interval) / interval_ms(KlineInterval.MINUTE_5)))
+
+
 
 # -----------------------------
 # 爆发判断（严格版）
 # -----------------------------
-def is_real_volume_breakout_5m_strict(
+def is_real_volume_breakout_strict(
     klines: List,
     window_len: int = 120,         # 120根=10小时
     min_silent: int = 50,          # 静默区最少长度
@@ -60,9 +66,15 @@ def is_real_volume_breakout_5m_strict(
     min_body: float = 0.30,        # 实体占比下限
     buy_ratio_min: float = 0.58,   # 主动买占比下限（加权）
     forbid_down_slope: float = -0.0008,  # pre 段斜率太负：判为反抽环境
+    silent_p90_max: float = 0.015, # 静默段波动 p90 上限（5m 标定）；baselines 按 symbol 给
+    silent_max: float = 0.04,      # 静默段单根最大波动上限（5m 标定）
+    *,
+    interval: KlineInterval = KlineInterval.MINUTE_5,  # klines 的周期，窗口长度按该周期的 bar 数计
 ) -> Tuple[bool, Dict]:
     """
     返回 (ok, info)
+    失败时 info 也带上已经算出的中间指标（p90 / box_top / vol_strength / buy_ratio ...），供决策追踪用
+    波动阈值（p90 / max）按 interval 相对 5m 做 sqrt 缩放
 
     ok=True 表示：
     - 之前存在静默箱体（波动收敛）
@@ -90,7 +102,10 @@ def is_real_volume_breakout_5m_strict(
     silent_ranges = np.array([_range_ratio(k) for k in silent], dtype=float)
     p90 = float(np.percentile(silent_ranges, 90))
     mx = float(np.max(silent_ranges))
-    if p90 > 0.015 or mx > 0.04:
+    info["p90"] = p90
+    info["range_max"] = mx
+    scale = _range_scale(interval)
+    if p90 > silent_p90_max * scale or mx > silent_max * scale:
         info["reason"] = f"silent_not_quiet(p90={p90:.4f},max={mx:.4f})"
         return False, info
 
@@ -99,11 +114,13 @@ def is_real_volume_breakout_5m_strict(
     silent_lows  = np.array([k.low_price  for k in silent], dtype=float)
     box_top = float(np.percentile(silent_highs, 95))
     box_bot = float(np.percentile(silent_lows, 5))
+    info["box_top"] = box_top
 
     # 2) 语境过滤：避免明显下跌反抽
     tail = silent[-min(40, len(silent)):]
     pre_closes = np.array([k.close_price for k in tail], dtype=float)
     slope = _linreg_slope(pre_closes)
+    info["slope"] = slope
     if slope < forbid_down_slope:
         info["reason"] = f"downtrend_context(slope={slope:.6f})"
         return False, info
@@ -119,6 +136,8 @@ def is_real_volume_breakout_5m_strict(
 
     vol_strength = float(np.median(confirm_vols) / base_vol)  # 稳健强度
     vol_count = int(np.sum(confirm_vols > base_vol * vol_mult))
+    info["vol_strength"] = vol_strength
+    info["vol_count"] = vol_count
 
     if vol_strength < vol_mult:
         info["reason"] = f"vol_not_strong(med_ratio={vol_strength:.2f})"
@@ -156,6 +175,7 @@ def is_real_volume_breakout_5m_strict(
 
     buy_sum = float(sum(k.buy_volume for k in last5))
     buy_ratio = float(buy_sum / vol_sum)
+    info["buy_ratio"] = buy_ratio
     if buy_ratio < buy_ratio_min:
         info["reason"] = f"buy_ratio_low({buy_ratio:.2f})"
         return False, info
@@ -215,16 +235,25 @@ def price_range_ratio(k: KlineData):
 # -----------------------------
 # 吸筹判断
 # -----------------------------
-def is_accumulation_phase_5m(klines: List[KlineData], window_len=40) -> bool:
+def is_accumulation_phase(
+    klines: List[KlineData],
+    window_len=40,
+    range_p90_max: float = 0.018,   # 以下三个 baselines 按 symbol 给，默认是全局值
+    range_max: float = 0.035,
+    buy_ratio_min: float = 0.52,
+    *,
+    interval: KlineInterval = KlineInterval.MINUTE_5,   # 同 strict：只能按关键字传
+) -> bool:
     if len(klines) < window_len:
         return False
     window = klines[-window_len:]
 
     # 1) 横盘：用分位数/最大值更稳（避免1根针破坏均值）
+    scale = _range_scale(interval)
     ranges = np.array([price_range_ratio(k) for k in window], dtype=float)
-    if np.percentile(ranges, 90) > 0.018:   # 90分位阈值，可调
+    if np.percentile(ranges, 90) > range_p90_max * scale:   # 90分位阈值，可调
         return False
-    if ranges.max() > 0.035:                # 允许少量波动，但不能太离谱
+    if ranges.max() > range_max * scale:                # 允许少量波动，但不能太离谱
         return False
 
     # 2) 成交量放大：用中位数 + 最近1/4 vs 前3/4，避免单根暴量
@@ -241,18 +270,110 @@ def is_accumulation_phase_5m(klines: List[KlineData], window_len=40) -> bool:
         return False
     total_buy = float(np.sum([k.buy_volume for k in window]))
     buy_ratio = total_buy / total_vol
-    if buy_ratio < 0.52:
+    if buy_ratio < buy_ratio_min:
         return False
 
     # 4) 可选：约束“价格仍在箱体中间”（防止已经明显启动）
     closes = np.array([k.close_price for k in window], dtype=float)
     mid = np.mean(closes)
-    if abs(closes[-1] - mid) / mid > 0.012:  # 最新价偏离箱体中心太多，可能已启动
+    if abs(closes[-1] - mid) / mid > 0.012 * scale:  # 最新价偏离箱体中心太多，可能已启动
         return False
 
     return True
 
 
+# 5m 版本（历史名字，replay / recall 里直接用）
+is_real_volume_breakout_5m_strict = is_real_volume_breakout_strict
+is_accumulation_phase_5m = is_accumulation_phase
+
+
+# -----------------------------
+# 大周期共振
+# -----------------------------
+def is_htf_aligned(
+    klines: List[KlineData],
+    interval: KlineInterval,
+    lookback: int = 6,
+    buy_ratio_min: float = 0.5,
+) -> Tuple[bool, Dict]:
+    """
+    大周期是否支持向上突破（klines 为已收盘的大周期 bar）
+    - 最新收盘不低于最近 lookback 根的均值（不在下跌段里）
+    - 最近 3 根主动买占比（加权）不低于 buy_ratio_min
+    """
+    info: Dict = {"interval": interval.value, "ok": False, "reason": ""}
+    if len(klines) < lookback:
+        info["reason"] = "not_enough_klines"
+        return False, info
+
+    w = klines[-lookback:]
+    closes = np.array([k.close_price for k in w], dtype=float)
+    if closes[-1] < float(np.mean(closes)):
+        info["reason"] = "below_mean"
+        return False, info
+
+    last3 = w[-3:]
+    vol_sum = float(sum(k.volume for k in last3))
+    if vol_sum <= 0:
+        info["reason"] = "vol_sum_zero"
+        return False, info
+    buy_ratio = float(sum(k.buy_volume for k in last3)) / vol_sum
+    if buy_ratio < buy_ratio_min:
+        info["reason"] = f"buy_ratio_low({buy_ratio:.2f})"
+        return False, info
+
+    info.update({"ok": True, "reason": "pass", "buy_ratio": buy_ratio})
+    return True, info
+
+
+# -----------------------------
+# 盘中提前突破（逐笔成交聚合）
+# -----------------------------
+def is_early_breakout(
+    klines: List[KlineData],
+    flow: Dict,
+    box_bars: int = 36,
+    break_eps: float = 0.003,
+    buy_ratio_min: float = 0.6,
+    vol_accel_min: float = 3.0,
+    min_trades: int = 20,
+    *,
+    forming: bool = True,
+) -> Tuple[bool, Dict]:
+    """
+    还没收盘的 bar 上，用 order_flow 的盘中指标提前判断突破
+    forming=True：klines[-1] 为正在走的 bar，箱体取它之前 box_bars 根的最高价
+    forming=False：klines 只有正在走的 bar 之前的 bar，箱体取最后 box_bars 根
+    flow: order_flow.FlowBook.intrabar() 的结果（last_price / buy_ratio / vol_accel / trades）
+    """
+    info: Dict = {"ok": False, "reason": ""}
+    if len(klines) < box_bars + int(forming):
+        info["reason"] = "not_enough_klines"
+        return False, info
+    if flow.get("trades", 0) < min_trades:
+        info["reason"] = f"few_trades({flow.get('trades', 0)})"
+        return False, info
+
+    box = klines[-box_bars - 1: -1] if forming else klines[-box_bars:]
+    box_top = max(k.high_price for k in box)
+    price = float(flow["last_price"])
+    info.update({"box_top": box_top, "price": price,
+                 "buy_ratio": flow["buy_ratio"], "vol_accel": flow["vol_accel"]})
+    if price <= box_top * (1.0 + break_eps):
+        info["reason"] = "below_box"
+        return False, info
+    if not flow["buy_ratio"] >= buy_ratio_min:
+        info["reason"] = f"buy_ratio_low({flow['buy_ratio']:.2f})"
+        return False, info
+    # 历史不够时 vol_accel 是 nan，比较结果为 False
+    if not flow["vol_accel"] >= vol_accel_min:
+        info["reason"] = f"vol_accel_low({flow['vol_accel']:.2f})"
+        return False, info
+
+    info.update({"ok": True, "reason": "pass"})
+    return True, info
+
+
 
 
 
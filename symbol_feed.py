@@ -0,0 +1,183 @@
+# symbol_feed.py
+import threading
+import time
+from collections import deque
+from dataclasses import astuple
+from typing import List, Optional
+
+from baselines import get_baseline
+from bn_tool import KlineData
+from decision_trace import symbol_trace
+from env import (
+    RING_BARS,
+    SCORE_MIN,
+    TRAP_MAX,
+    CONFIRM_BARS,
+    PENDING_TTL_BARS,
+    HTF_REQUIRE,
+    GAP_POLICY,
+)
+from replay_engine import BAR_MS, step_symbol
+from resample import MultiResampler
+from state import SignalState, SymbolRuntimeState
+from strategy import is_early_breakout
+
+
+class SymbolFeed:
+    """
+    单 symbol 的 live 数据：runtime + 最近 RING_BARS 根 5m K线（环形缓冲）
+    每次轮询只需要从最后一根 bar 开始增量拉取，view 始终是完整窗口
+    大周期 bar 由已收盘的 5m bar 本地聚合（htf），不额外请求
+    flow_book（order_flow.FlowBook）设置后，还没收盘的 bar 会带上盘中逐笔指标
+    多线程共用同一个 feed 时（Pipeline 的 stage + 盘中检查）由调用方持有 lock
+    """
+    def __init__(self, symbol: str, ring_bars: int = RING_BARS, flow_book=None):
+        self.symbol = symbol
+        self.runtime = SymbolRuntimeState()
+        self.ring = deque(maxlen=ring_bars)
+        self.htf = MultiResampler()
+        self.trace = symbol_trace(symbol)   # 没开追踪时为 None
+        self.flow_book = flow_book
+        self.baseline = get_baseline(symbol)  # 没有基线时为 None（全局阈值）
+        self.lock = threading.Lock()
+
+    def to_snapshot(self) -> dict:
+        return {
+            "symbol": self.symbol,
+            "runtime": self.runtime.to_snapshot(),
+            "bars": [list(astuple(k)) for k in self.ring],
+        }
+
+    @classmethod
+    def from_snapshot(cls, snap: dict, ring_bars: int = RING_BARS) -> "SymbolFeed":
+        feed = cls(snap["symbol"], ring_bars)
+        feed.runtime = SymbolRuntimeState.from_snapshot(snap["runtime"])
+        feed.ring.extend(KlineData(*row) for row in snap["bars"])
+        for k in list(feed.ring)[:-1]:
+            feed.htf.update(k)
+        return feed
+
+    @property
+    def last_open_ms(self) -> Optional[int]:
+        return self.ring[-1].open_time if self.ring else None
+
+    def merge(self, klines: List[KlineData]) -> List[KlineData]:
+        """
+        合并一次拉取的结果
+        - 与缓冲最后一根同 open_time 的 bar（上次未收盘）直接覆盖
+        - 返回 open_time > runtime.last_seen_ms 的新 bar（需要推进状态机）
+        - 挤出缓冲的 bar（冷启动时拉的历史比 ring 长，见 resample.history_ms）先喂进大周期聚合，不丢大周期上下文
+        """
+        for k in klines:
+            last = self.ring[-1].open_time if self.ring else None
+            if last is None or k.open_time > last:
+                if len(self.ring) == self.ring.maxlen:
+                    # 被挤出的一定不是最后一根，已收盘；聚合已经走过它时 update 会忽略
+                    self.htf.update(self.ring[0])
+                self.ring.append(k)
+            elif k.open_time == last:
+                self.ring[-1] = k
+
+        seen = self.runtime.last_seen_ms
+        if seen is None:
+            return list(self.ring)
+        return [k for k in self.ring if k.open_time > seen]
+
+    def prepare(self, new_bars: List[KlineData], htf_require=HTF_REQUIRE, now_ms: Optional[int] = None) -> list:
+        """
+        特征准备：把已收盘的 bar 喂进大周期聚合，返回逐根 [(bar, view, htf_views, flow), ...]
+        和 detect() 拆开是为了让流水线里两步可以分属不同 stage
+        now_ms：判断最后一根是否收盘用的「当前时间」，默认墙钟；录制回放传录制时的接收时间
+        """
+        bars = list(self.ring)
+        pos = {k.open_time: i for i, k in enumerate(bars)}
+        now_wall_ms = int(time.time() * 1000) if now_ms is None else now_ms
+
+        # 大周期聚合单独跟踪进度：上次还没收盘就走过状态机的 bar，收盘后不会再出现在 new_bars 里，
+        # 所以每次都把 ring 里比聚合进度新、且已收盘的 bar 补进去
+        def closed(j):
+            return j < len(bars) - 1 or bars[j].close_time < now_wall_ms
+
+        htf_last = self.htf.last_open_ms
+        fed = 0 if htf_last is None else next((j for j, k in enumerate(bars) if k.open_time > htf_last), len(bars))
+
+        steps = []
+        for bar in new_bars:
+            i = pos.get(bar.open_time)
+            if i is None:
+                continue
+            while fed <= i and closed(fed):
+                self.htf.update(bars[fed])
+                fed += 1
+            flow = None
+            if not closed(i) and self.flow_book is not None:
+                flow = self.flow_book.intrabar(self.symbol, bar.open_time)
+            steps.append((bar, bars[: i + 1], self.htf.views() if htf_require else None, flow))
+        while fed < len(bars) and closed(fed):
+            self.htf.update(bars[fed])
+            fed += 1
+        return steps
+
+    def detect(
+        self,
+        steps: list,
+        *,
+        score_min=SCORE_MIN,
+        trap_max=TRAP_MAX,
+        confirm_bars=CONFIRM_BARS,
+        pending_ttl_bars=PENDING_TTL_BARS,
+        htf_require=HTF_REQUIRE,
+        gap_policy=GAP_POLICY,
+    ) -> list:
+        """逐根推进 step_symbol，返回全部事件 [(evt, pend, trap), ...]"""
+        events = []
+        for bar, view, htf, flow in steps:
+            events.extend(step_symbol(
+                self.runtime,
+                view,
+                bar.open_time,
+                score_min=score_min,
+                trap_max=trap_max,
+                confirm_bars=confirm_bars,
+                pending_ttl_bars=pending_ttl_bars,
+                htf=htf,
+                htf_require=htf_require,
+                gap_policy=gap_policy,
+                trace=self.trace,
+                flow=flow,
+                baseline=self.baseline,
+            ))
+        return events
+
+    def check_early(self) -> list:
+        """
+        两次轮询之间用最新的逐笔指标看一眼正在走的 bar（只看盘中提前突破，不推进状态机）
+        正在走的 bar 按逐笔的最新成交时间定（ring 最后一根可能早就收盘了），箱体取它之前的 ring bar
+        返回 [("BREAKOUT_EARLY", info, None)] 或 []
+        """
+        rt = self.runtime
+        if self.flow_book is None or not self.ring or rt.pending is not None or rt.state != SignalState.ACCUM:
+            return []
+        latest = self.flow_book.latest_ms(self.symbol)
+        if not latest:
+            return []
+        bar_open = latest - latest % BAR_MS
+        if rt.last_early_ms == bar_open or self.ring[-1].open_time > bar_open:
+            return []
+        prior = [k for k in self.ring if k.open_time < bar_open]
+        # ring 落后不止一根（拉取失败 / 还没轮询到）时箱体不完整，等下一轮 sweep
+        if not prior or prior[-1].open_time < bar_open - BAR_MS:
+            return []
+        flow = self.flow_book.intrabar(self.symbol, bar_open)
+        if flow is None:
+            return []
+        ok, info = is_early_breakout(prior, flow, forming=False)
+        if not ok:
+            return []
+        rt.last_early_ms = bar_open
+        return [("BREAKOUT_EARLY", {"created_ms": bar_open, **info}, None)]
+
+    def advance(self, new_bars: List[KlineData], *, htf_require=HTF_REQUIRE, now_ms: Optional[int] = None,
+                **kwargs) -> list:
+        """prepare + detect"""
+        return self.detect(self.prepare(new_bars, htf_require, now_ms), htf_require=htf_require, **kwargs)
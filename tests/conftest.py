@@ -0,0 +1,6 @@
+# tests/conftest.py
+import os
+import sys
+
+# 仓库是平铺的模块，没有打包：测试直接从仓库根目录 import
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,73 @@
+# tests/test_backfill.py
+import threading
+
+from backfill import _parse_day, backfill, missing_ranges
+from bar_store import BarStore
+from bn_tool import KlineData
+from interal_enum import KlineInterval
+
+S = 5 * 60 * 1000
+IV = KlineInterval.MINUTE_5
+
+
+def _bar(t):
+    return KlineData(t, 1.0, 1.0, 1.0, 1.0, 1.0, t + S - 1, 1.0, 1, 0.5, 0.5, "0")
+
+
+class FakeBN:
+    """listed_ms 之前没有数据；fail_before 之前的请求报错"""
+    def __init__(self, listed_ms=0, fail_before=None):
+        self.listed_ms = listed_ms
+        self.fail_before = fail_before
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def getSymbolKlines(self, symbol, interval, a, b, limit=None, raise_errors=False):
+        with self._lock:
+            self.calls.append((symbol, a, b))
+        if self.fail_before is not None and a < self.fail_before:
+            raise RuntimeError("timeout")
+        return [_bar(t) for t in range(a - a % S, b + 1, S) if t >= self.listed_ms][:limit]
+
+
+def test_missing_ranges_head_gaps_tail():
+    ot = [S * i for i in range(100, 200) if not 150 <= i < 155]
+    assert missing_ranges(ot, S * 90 + 7, S * 210, S) == [(S * 90, S * 99), (S * 150, S * 154), (S * 200, S * 210)]
+    assert missing_ranges([], S, S * 3, S) == [(S, S * 3)]
+    assert missing_ranges(ot, S * 120, S * 130, S) == []
+
+
+def test_pages_of_a_symbol_merge_once(tmp_path):
+    store = BarStore(str(tmp_path))
+    merges = []
+    real = store.merge
+    store.merge = lambda s, iv, kl: merges.append((s, len(kl))) or real(s, iv, kl)
+
+    r = backfill(store, FakeBN(), ["A", "B"], IV, 0, 5000 * S - 1, workers=4)
+    assert r["pages"] == 8 and r["bars"] == 10000
+    assert sorted(merges) == [("A", 5000), ("B", 5000)]
+    assert store.open_times("A", "5m") == [S * i for i in range(5000)]
+
+
+def test_listing_bound_is_recorded_and_not_refetched(tmp_path):
+    store = BarStore(str(tmp_path))
+    bn = FakeBN(listed_ms=300 * S)
+    r = backfill(store, bn, ["A"], IV, 0, 400 * S - 1)
+    assert r["bars"] == 100 and r["listing_bounds"] == 1
+    assert store.unfillable("A", "5m") == [(0, 299 * S)]
+
+    bn.calls.clear()
+    r = backfill(store, bn, ["A"], IV, 0, 400 * S - 1)
+    assert r["pages"] == 0 and bn.calls == []
+
+
+def test_failed_head_page_is_not_a_listing_bound(tmp_path):
+    store = BarStore(str(tmp_path))
+    store.merge("A", "5m", [_bar(S * i) for i in range(300, 400)])
+    r = backfill(store, FakeBN(fail_before=300 * S), ["A"], IV, 0, 400 * S - 1)
+    assert r["failed_pages"] == 1 and r["listing_bounds"] == 0
+    assert store.unfillable("A", "5m") == []
+
+
+def test_parse_day_is_utc():
+    assert _parse_day("2024-01-01") == 1704067200000
@@ -0,0 +1,69 @@
+# tests/test_bar_store.py
+import time
+
+import numpy as np
+
+from bar_store import BAR_DTYPE, REC_SIZE, BarStore, array_to_klines
+from bn_tool import KlineData
+
+S = 5 * 60 * 1000
+
+
+def _bar(t, close=1.0):
+    return KlineData(t, 1.0, close + 0.5, 0.5, close, 10.0, t + S - 1, 10.0 * close, 7, 4.0, 4.0 * close, "0")
+
+
+def _times(store):
+    return store.open_times("X", "5m")
+
+
+def test_fast_path_appends_and_tracks_gaps(tmp_path):
+    store = BarStore(str(tmp_path))
+    assert store.first_open_ms("X", "5m") is None and store.last_open_ms("X", "5m") is None
+
+    assert store.merge("X", "5m", [_bar(t * S) for t in range(10)]) == 10
+    # 尾部之后、中间断了两根：直接追加，缺口记下来
+    assert store.merge("X", "5m", [_bar(t * S) for t in (12, 13)]) == 2
+    assert _times(store) == [t * S for t in list(range(10)) + [12, 13]]
+    assert store.known_gaps("X", "5m") == [(10 * S, 11 * S)]
+    assert store.first_open_ms("X", "5m") == 0 and store.last_open_ms("X", "5m") == 13 * S
+    assert store.symbols("5m") == ["X"]
+
+
+def test_slow_path_fills_overwrites_and_clears_gaps(tmp_path):
+    store = BarStore(str(tmp_path))
+    store.merge("X", "5m", [_bar(t * S) for t in range(10) if t not in (3, 4)])
+    assert store.known_gaps("X", "5m") == [(3 * S, 4 * S)]
+
+    # 补进中间 + 覆盖已有的一根：只有新增的计数，文件整体重写、保持有序
+    assert store.merge("X", "5m", [_bar(3 * S), _bar(4 * S), _bar(5 * S, close=2.0)]) == 2
+    assert _times(store) == [t * S for t in range(10)]
+    assert store.load("X", "5m", 5 * S, 5 * S)[0].close_price == 2.0
+    assert store.known_gaps("X", "5m") == []
+    assert not list(tmp_path.rglob("*.tmp"))
+
+
+def test_forming_bar_is_not_stored(tmp_path):
+    store = BarStore(str(tmp_path))
+    now = int(time.time() * 1000)
+    forming = now - now % S
+    assert store.merge("X", "5m", [_bar(forming - S), _bar(forming)]) == 1
+    assert _times(store) == [forming - S]
+
+
+def test_load_array_matches_load(tmp_path):
+    store = BarStore(str(tmp_path))
+    bars = [_bar(t * S, close=1.0 + t) for t in range(20)]
+    store.merge("X", "5m", bars)
+    assert BAR_DTYPE.itemsize == REC_SIZE
+
+    arr = store.load_array("X", "5m")
+    assert arr.dtype == BAR_DTYPE and len(arr) == 20
+    assert array_to_klines(arr) == bars
+    np.testing.assert_array_equal(arr["close_price"], [k.close_price for k in bars])
+
+    # 闭区间，按 open_time
+    part = store.load_array("X", "5m", 5 * S, 9 * S)
+    assert array_to_klines(part) == store.load("X", "5m", 5 * S, 9 * S) == bars[5:10]
+    assert len(store.load_array("X", "5m", 5 * S + 1, 5 * S + 2)) == 0
+    assert len(store.load_array("Y", "5m")) == 0 and store.load("Y", "5m") == []
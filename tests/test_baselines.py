@@ -0,0 +1,105 @@
+# tests/test_baselines.py
+import numpy as np
+import pytest
+
+import replay_engine
+from bar_store import BAR_DTYPE
+from baselines import (
+    BASELINE_DTYPE, MIN_BARS, SILENT_MAX_CLIP, SILENT_P90_CLIP, Baseline, BaselineTable, compute_row,
+)
+from bn_tool import KlineData
+from state import SignalState, SymbolRuntimeState
+
+M = 5 * 60 * 1000
+
+
+def _bars(n, ranges, vol=100.0, buy=0.55):
+    """close=1，high-low=ranges（标量或每根一个）"""
+    a = np.zeros(n, dtype=BAR_DTYPE)
+    a["open_time"] = np.arange(n) * M
+    a["close_price"] = a["open_price"] = 1.0
+    a["high_price"] = 1.0 + np.asarray(ranges) / 2
+    a["low_price"] = 1.0 - np.asarray(ranges) / 2
+    a["volume"] = vol
+    a["buy_volume"] = vol * buy
+    return a
+
+
+def test_short_history_has_no_baseline():
+    assert compute_row("X", _bars(MIN_BARS - 1, 0.01), 0) is None
+    assert compute_row("X", _bars(MIN_BARS, 0.01), 0) is not None
+
+
+def test_percentiles_and_derived_thresholds():
+    ranges = np.random.default_rng(0).uniform(0.002, 0.012, MIN_BARS)
+    row = compute_row("X", _bars(MIN_BARS, ranges), 123)
+    assert row["n_bars"] == MIN_BARS and row["built_ms"] == 123
+    for q in (50, 90, 99):
+        assert row[f"range_p{q}"] == pytest.approx(np.percentile(ranges, q), rel=1e-5)
+    assert row["buy_p50"] == pytest.approx(0.55) and row["vol_median"] == 100.0
+    assert not row["excluded"]
+
+    # 常数波动：quiet_p90 = quiet_max = 0.01，阈值 = ×1.25，都在夹取范围内
+    b = Baseline(compute_row("X", _bars(MIN_BARS, 0.01), 0))
+    assert b.strict_kwargs == pytest.approx({"silent_p90_max": 0.0125, "silent_max": 0.0125, "buy_ratio_min": 0.63})
+    assert b.accum_kwargs == pytest.approx({"range_p90_max": 0.015, "range_max": 0.0125, "buy_ratio_min": 0.57})
+
+
+def test_thresholds_are_clipped_and_noisy_symbol_is_excluded():
+    calm = Baseline(compute_row("X", _bars(MIN_BARS, 0.001, buy=0.2), 0))
+    assert calm.strict_kwargs["silent_p90_max"] == SILENT_P90_CLIP[0]
+    assert calm.strict_kwargs["silent_max"] == SILENT_MAX_CLIP[0]
+    assert calm.strict_kwargs["buy_ratio_min"] == 0.5 and not calm.excluded
+
+    noisy = Baseline(compute_row("X", _bars(MIN_BARS, 0.05, buy=0.9), 0))
+    assert noisy.excluded
+    assert noisy.strict_kwargs["silent_p90_max"] == SILENT_P90_CLIP[1]
+    assert noisy.strict_kwargs["buy_ratio_min"] == 0.65
+
+
+def test_no_volume_falls_back_to_neutral_buy_ratio_and_is_excluded():
+    row = compute_row("X", _bars(MIN_BARS, 0.01, vol=0.0), 0)
+    assert row["buy_p50"] == 0.5 and row["excluded"]
+
+
+def _table():
+    rows = [compute_row(s, _bars(MIN_BARS, r), 0) for s, r in (("CUSDT", 0.05), ("AUSDT", 0.01))]
+    table = np.array(rows, dtype=BASELINE_DTYPE)
+    table.sort(order="symbol")
+    return BaselineTable(table)
+
+
+def test_table_lookup_and_round_trip(tmp_path):
+    t = _table()
+    assert not t.get("AUSDT").excluded and t.get("CUSDT").excluded
+    assert t.get("BUSDT") is None and t.get("ZUSDT") is None and t.get("0USDT") is None
+    assert t.get("AUSDT") is t.get("AUSDT")   # 缓存
+
+    path = str(tmp_path / "b" / "baselines.npy")
+    t.save(path)
+    t2 = BaselineTable.load(path)
+    assert len(t2) == 2 and t2.get("CUSDT").excluded and t2.get("BUSDT") is None
+    assert len(BaselineTable.load(str(tmp_path / "missing.npy"))) == 0
+
+    np.save(str(tmp_path / "old.npy"), np.zeros(2, dtype=[("symbol", "U24")]))
+    assert len(BaselineTable.load(str(tmp_path / "old.npy"))) == 0
+
+
+def _never_strict(*args, **kwargs):
+    raise AssertionError("strict must be skipped for excluded symbols")
+
+
+def test_excluded_symbol_skips_only_strict(monkeypatch):
+    monkeypatch.setattr(replay_engine, "is_real_volume_breakout_5m_strict", _never_strict)
+    monkeypatch.setattr(replay_engine, "is_accumulation_phase_5m", lambda kl, **kw: True)
+    monkeypatch.setattr(replay_engine, "is_early_breakout", lambda kl, flow: (True, {"price": 1.0}))
+    baseline = _table().get("CUSDT")
+    kl = [KlineData(i * M, 1.0, 1.0, 1.0, 1.0, 1.0, i * M + M - 1, 1.0, 1, 0.5, 0.5, "0") for i in range(130)]
+    rt = SymbolRuntimeState()
+    kw = dict(score_min=0, trap_max=1, confirm_bars=2, pending_ttl_bars=6, baseline=baseline)
+
+    assert replay_engine.step_symbol(rt, kl, kl[-1].open_time, **kw) == []
+    assert rt.state == SignalState.ACCUM   # 吸筹照常跟踪
+
+    events = replay_engine.step_symbol(rt, kl, kl[-1].open_time + M, flow={"trades": 100}, **kw)
+    assert [e[0] for e in events] == ["BREAKOUT_EARLY"]
@@ -0,0 +1,107 @@
+# tests/test_batch_confirm.py
+"""batch_confirm 必须和逐根的 step_symbol 给出完全相同的 BREAKOUT_CONFIRMED"""
+import random
+
+import numpy as np
+import pytest
+
+import replay_engine
+from bar_store import BAR_DTYPE
+from batch_confirm import batch_confirm, collect_strict_candidates
+from bn_tool import KlineData, parse_kline
+from state import SymbolRuntimeState
+
+BAR = 5 * 60 * 1000
+CONFIGS = [  # (confirm_bars, pending_ttl_bars, trap_max)
+    (2, 6, 150), (1, 6, 60), (3, 5, 70), (0, 3, 40), (2, 2, 100),
+]
+
+
+def _scalar(kl, cb, ttl, tmax):
+    rt = SymbolRuntimeState()
+    out = []
+    for i in range(len(kl)):
+        for evt, pend, trap in replay_engine.step_symbol(
+                rt, kl[max(0, i - 287): i + 1], kl[i].open_time, score_min=80,
+                trap_max=tmax, confirm_bars=cb, pending_ttl_bars=ttl):
+            out.append((kl[i].open_time, evt, pend, trap))
+    return out
+
+
+def _to_array(kl):
+    return np.array([(k.open_time, k.open_price, k.high_price, k.low_price, k.close_price, k.volume,
+                      k.close_time, k.quote_volume, k.trade_count, k.buy_volume, k.buy_quote_volume)
+                     for k in kl], dtype=BAR_DTYPE)
+
+
+def _random_history(rng, n=400):
+    p, t, kl = 1.0, 1_700_000_000_000, []
+    for _ in range(n):
+        if rng.random() < 0.01:
+            t += BAR * rng.randint(1, 4)   # 偶尔有缺口
+        o = p
+        p *= 1 + rng.gauss(0, 0.006)
+        h = max(o, p) * (1 + abs(rng.gauss(0, 0.003)))
+        lo = min(o, p) * (1 - abs(rng.gauss(0, 0.003)))
+        v = rng.uniform(50, 150)
+        kl.append(KlineData(t, o, h, lo, p, v, t + BAR - 1, v, 10, v * rng.uniform(0.3, 0.8), 0.0, "0"))
+        t += BAR
+    return kl
+
+
+@pytest.mark.parametrize("seed", range(12))
+def test_matches_step_symbol_with_injected_candidates(monkeypatch, seed):
+    """候选随机注入（strict 换成查表），覆盖 trap / hold / TTL / 跌回箱体 / 候选互斥的各种组合"""
+    rng = random.Random(seed)
+    kl = _random_history(rng)
+    cand = {}
+    for i in range(20, len(kl)):
+        if rng.random() < 0.15:
+            bo = i - rng.randint(0, 11)
+            cand[kl[i].open_time] = {
+                "ok": True, "reason": "pass", "score": rng.uniform(70, 100),
+                "breakout_open_time": kl[bo].open_time,
+                "box_top": kl[bo].close_price * rng.uniform(0.98, 1.01),
+                "break_eps": rng.choice([0.001, 0.003, 0.006]),
+            }
+
+    def fake_strict(view, **_):
+        c = cand.get(view[-1].open_time)
+        return (True, dict(c)) if c else (False, {"reason": "x", "score": 0.0})
+
+    monkeypatch.setattr(replay_engine, "is_real_volume_breakout_5m_strict", fake_strict)
+    monkeypatch.setattr(replay_engine, "is_accumulation_phase_5m", lambda view, **_: False)
+
+    pos = {k.open_time: i for i, k in enumerate(kl)}
+    items = sorted((pos[t], c) for t, c in cand.items() if c["score"] >= 80)
+    cands = {
+        "idx": np.array([i for i, _ in items], dtype=np.int64),
+        "bo_idx": np.array([pos[c["breakout_open_time"]] for _, c in items], dtype=np.int64),
+        "box_top": np.array([c["box_top"] for _, c in items]),
+        "eps": np.array([c["break_eps"] for _, c in items]),
+        "score": np.array([c["score"] for _, c in items]),
+    }
+    for cb, ttl, tmax in CONFIGS:
+        expected = _scalar(kl, cb, ttl, tmax)
+        assert batch_confirm(kl, cands, trap_max=tmax, confirm_bars=cb, pending_ttl_bars=ttl) == expected
+        assert batch_confirm(_to_array(kl), cands, trap_max=tmax, confirm_bars=cb,
+                             pending_ttl_bars=ttl) == expected
+
+
+def test_real_detector_on_planted_patterns():
+    """真实 strict：模拟行情里种下的突破，KlineData 列表和 BAR_DTYPE 数组两种输入结果一致"""
+    from exchange_sim import SyntheticMarket, sim_symbols
+
+    m = SyntheticMarket(sim_symbols(1), pattern_pct=100)
+    kl = [parse_kline(r) for r in m.klines(m.symbols[0], m.base_ms, None, 12 * 24 * 3)]
+    arr = _to_array(kl)
+
+    cands = collect_strict_candidates(kl)
+    assert len(cands["idx"]) > 0
+    from_array = collect_strict_candidates(arr)
+    for key in cands:
+        np.testing.assert_array_equal(cands[key], from_array[key])
+
+    for cb, ttl, tmax in CONFIGS[:2]:
+        assert batch_confirm(arr, cands, trap_max=tmax, confirm_bars=cb,
+                             pending_ttl_bars=ttl) == _scalar(kl, cb, ttl, tmax)
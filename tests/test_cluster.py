@@ -0,0 +1,76 @@
+# tests/test_cluster.py
+import os
+import time
+
+import pytest
+
+from bn_tool import KlineData
+from cluster import SNAPSHOT_TTL_SEC, CoordBackend, FileBackend, decode_snapshot, encode_snapshot
+from interal_enum import KlineInterval
+from state import SignalState
+from symbol_feed import SymbolFeed
+
+M = 5 * 60 * 1000
+
+
+def _feed(last_open_ms, n=40):
+    feed = SymbolFeed("XUSDT")
+    bars = [KlineData(last_open_ms - (n - 1 - i) * M, 1.0, 1.1, 0.9, 1.0 + i / 100, 10.0,
+                      last_open_ms - (n - 2 - i) * M - 1, 10.0, 5, 6.0, 6.0, "0") for i in range(n)]
+    feed.merge(bars)
+    feed.runtime.enter_accum(bars[-2].open_time)
+    feed.runtime.last_seen_ms = bars[-2].open_time
+    return feed
+
+
+def test_snapshot_round_trip():
+    now = int(time.time() * 1000)
+    feed = _feed(now - now % M)
+    back = decode_snapshot(encode_snapshot(feed))
+    assert back is not None and back.symbol == "XUSDT"
+    assert list(back.ring) == list(feed.ring)
+    assert back.runtime.state == SignalState.ACCUM
+    assert back.runtime.last_seen_ms == feed.runtime.last_seen_ms
+    assert back.runtime.accum_start_ms == feed.runtime.accum_start_ms
+    # 大周期聚合按快照里已收盘的 bar 重建
+    assert back.htf.views()[KlineInterval.MINUTE_15]
+    assert back.htf.last_open_ms == feed.ring[-2].open_time
+
+
+def test_stale_snapshot_is_dropped():
+    now = int(time.time() * 1000)
+    old = now - now % M - (SNAPSHOT_TTL_SEC * 1000 + M)
+    data = encode_snapshot(_feed(old))
+    assert decode_snapshot(data) is None
+    assert decode_snapshot(data, max_age_sec=SNAPSHOT_TTL_SEC * 2) is not None
+
+
+def test_file_backend_snapshot_ttl(tmp_path):
+    be = FileBackend(str(tmp_path), snapshot_ttl=60)
+    be.put_snapshot("A", b"fresh")
+    assert be.pop_snapshot("A") == b"fresh"
+    assert be.pop_snapshot("A") is None   # 只能被取走一次
+
+    be.put_snapshot("B", b"old")
+    path = os.path.join(str(tmp_path), "snapshots", "B.snap")
+    t = time.time() - 120
+    os.utime(path, (t, t))
+    assert be.pop_snapshot("B") is None
+    assert os.listdir(os.path.join(str(tmp_path), "snapshots")) == []
+
+
+def test_file_backend_membership(tmp_path):
+    be = FileBackend(str(tmp_path), node_ttl=30)
+    be.heartbeat("n1", {"symbols": 3})
+    be.heartbeat("n2", {})
+    t = time.time() - 60
+    os.utime(os.path.join(str(tmp_path), "nodes", "n2.json"), (t, t))
+    assert be.live_nodes() == ["n1"]
+    be.leave("n1")
+    be.leave("n1")
+    assert be.live_nodes() == []
+
+
+def test_backend_interface_is_abstract():
+    with pytest.raises(TypeError):
+        CoordBackend()
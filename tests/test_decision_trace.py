@@ -0,0 +1,39 @@
+# tests/test_decision_trace.py
+import glob
+import time
+
+import replay_engine
+from bn_tool import KlineData
+from decision_trace import DecisionTrace, Reason
+from state import SymbolRuntimeState
+
+M = 5 * 60 * 1000
+
+
+def test_flushes_by_time_before_row_threshold(tmp_path, monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: clock[0])
+    tr = DecisionTrace(str(tmp_path), flush_rows=10 ** 6, flush_sec=60)
+
+    tr.record("X", 0, 0, Reason.NONE, {})
+    assert glob.glob(str(tmp_path / "*.npz")) == []
+    clock[0] += 61
+    tr.record("X", M, 0, Reason.NONE, {})
+    assert len(glob.glob(str(tmp_path / "*.npz"))) == 1
+    assert len(tr) == 0
+
+
+def test_trace_does_not_mutate_detector_info(monkeypatch):
+    info = {"ok": False, "reason": "silent_p90_high", "score": 10.0}
+    monkeypatch.setattr(replay_engine, "is_real_volume_breakout_5m_strict", lambda view, **_: (False, info))
+    rows = []
+
+    class Sink:
+        def record(self, open_time, state, reason, metrics):
+            rows.append(metrics)
+
+    kl = [KlineData(i * M, 1.0, 1.0, 1.0, 1.0, 1.0, i * M + M - 1, 1.0, 1, 0.5, 0.5, "0") for i in range(130)]
+    replay_engine.step_symbol(SymbolRuntimeState(), kl, kl[-1].open_time, score_min=80, trap_max=150,
+                              confirm_bars=2, pending_ttl_bars=6, trace=Sink())
+    assert rows and rows[0]["close"] == 1.0
+    assert info == {"ok": False, "reason": "silent_p90_high", "score": 10.0}
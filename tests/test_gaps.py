@@ -0,0 +1,101 @@
+# tests/test_gaps.py
+from bar_store import BarStore
+from bn_tool import KlineData
+from gaps import coalesce_gaps, exclude_holes, find_gaps, gap_bars, repair_gaps
+from interal_enum import KlineInterval
+
+S = 5 * 60 * 1000
+
+
+def _bar(t):
+    return KlineData(t, 1.0, 1.0, 1.0, 1.0, 1.0, t + S - 1, 1.0, 1, 0.5, 0.5, "0")
+
+
+class FakeBN:
+    """holes 里的 bar 交易所没有；fail=True 时模拟限流 / 超时"""
+    def __init__(self, holes=(), fail=False):
+        self.holes = set(holes)
+        self.fail = fail
+        self.calls = []
+
+    def getSymbolKlines(self, symbol, interval, start, end, limit=None, raise_errors=False):
+        self.calls.append((start, end))
+        if self.fail:
+            if raise_errors:
+                raise RuntimeError("429")
+            return []
+        return [_bar(t) for t in range(start - start % S, end + 1, S) if t not in self.holes][:limit]
+
+
+def _store(tmp_path, missing):
+    store = BarStore(str(tmp_path))
+    store.merge("X", "5m", [_bar(t) for t in range(100 * S, 200 * S, S) if t not in missing])
+    return store
+
+
+def test_failed_fetch_is_not_marked_unfillable(tmp_path):
+    missing = set(range(150 * S, 155 * S, S))
+    store = _store(tmp_path, missing)
+
+    r = repair_gaps(store, FakeBN(fail=True), "X", KlineInterval.MINUTE_5)
+    assert r["failed"] == 1 and r["repaired"] == 0
+    assert store.unfillable("X", "5m") == []
+
+    # 下次请求成功就能补上
+    r = repair_gaps(store, FakeBN(), "X", KlineInterval.MINUTE_5)
+    assert r["repaired"] == 5
+    assert store.unfillable("X", "5m") == []
+
+
+def test_exchange_hole_is_persisted_and_skipped(tmp_path):
+    hole = set(range(170 * S, 172 * S, S))
+    store = _store(tmp_path, set(range(170 * S, 180 * S, S)))
+
+    r = repair_gaps(store, FakeBN(holes=hole), "X", KlineInterval.MINUTE_5)
+    assert r["repaired"] == 8
+    assert store.unfillable("X", "5m") == [(170 * S, 171 * S)]
+
+    # 新的 BarStore 实例（新进程）也能读到，不再请求
+    bn = FakeBN(holes=hole)
+    r = repair_gaps(BarStore(str(tmp_path)), bn, "X", KlineInterval.MINUTE_5)
+    assert r["gaps"] == 0 and bn.calls == []
+
+
+def test_empty_response_is_not_a_hole(tmp_path):
+    """请求成功但两侧都没数据（比如已下架）：看不到缺口两边，不能断定是空洞"""
+    missing = set(range(150 * S, 155 * S, S))
+    store = _store(tmp_path, missing)
+    repair_gaps(store, FakeBN(holes=set(range(0, 300 * S, S))), "X", KlineInterval.MINUTE_5)
+    assert store.unfillable("X", "5m") == []
+
+
+def test_find_gaps_and_coalesce():
+    times = [0, S, 4 * S, 5 * S, 9 * S, 10 * S]
+    gaps = find_gaps(times, S)
+    assert gaps == [(2 * S, 3 * S), (6 * S, 8 * S)]
+    assert gap_bars(gaps, S) == 5
+    assert find_gaps([0, S, 2 * S], S) == []
+
+    # 整体跨度 ≤ max_bars 的相邻缺口合并成一个请求
+    assert coalesce_gaps(gaps, S, max_bars=7) == [(2 * S, 8 * S)]
+    assert coalesce_gaps(gaps, S, max_bars=6) == gaps
+    # 超长缺口按页切开，切剩的尾巴还能和后面的缺口合并
+    assert coalesce_gaps([(0, 9 * S), (11 * S, 11 * S)], S, max_bars=4) == [
+        (0, 3 * S), (4 * S, 7 * S), (8 * S, 11 * S)]
+
+
+def test_exclude_holes_keeps_partial_overlap():
+    gaps = [(2 * S, 3 * S), (6 * S, 8 * S), (20 * S, 20 * S)]
+    holes = [(1 * S, 3 * S), (7 * S, 9 * S)]
+    assert exclude_holes(gaps, holes) == [(6 * S, 8 * S), (20 * S, 20 * S)]
+    assert exclude_holes(gaps, []) == gaps
+
+
+def test_unfillable_merges_and_survives_restart(tmp_path):
+    store = BarStore(str(tmp_path))
+    assert store.unfillable("X", "5m") == []
+    store.mark_unfillable("X", "5m", [(5 * S, 6 * S)])
+    store.mark_unfillable("X", "5m", [(1 * S, 1 * S), (5 * S, 6 * S)])
+    store.mark_unfillable("X", "5m", [])
+    assert BarStore(str(tmp_path)).unfillable("X", "5m") == [(1 * S, 1 * S), (5 * S, 6 * S)]
+    assert store.unfillable("Y", "5m") == []
@@ -0,0 +1,51 @@
+# tests/test_order_flow.py
+import os
+
+from bn_tool import KlineData
+from order_flow import BAR_MS, BUCKET_MS, N_BUCKETS, FlowBook, replay_trades
+from strategy import is_early_breakout
+
+SAMPLE = os.path.join(os.path.dirname(__file__), "data", "TESTUSDT-aggTrades-sample.csv")
+T0 = 1_700_000_100_000   # 样本里放量突破那根 5m bar 的开盘时间
+
+
+def _box(top=1.005, n=36):
+    """突破 bar 之前的 n 根已收盘 bar"""
+    return [KlineData(T0 - (n - i) * BAR_MS, 1.0, top, 0.995, 1.0, 10.0, T0 - (n - i - 1) * BAR_MS - 1,
+                      10.0, 10, 5.0, 5.0, "0") for i in range(n)]
+
+
+def test_recorded_trades_trigger_early_breakout():
+    buckets = []
+    book = replay_trades(SAMPLE, on_bucket=lambda s, t: buckets.append(t))
+    assert book.rows.keys() == {"TESTUSDT"} and buckets
+
+    flow = book.intrabar("TESTUSDT", T0)
+    assert flow["trades"] == 58 and flow["last_price"] == 1.02
+    ok, info = is_early_breakout(_box(), flow, forming=False)
+    assert ok, info
+    assert info["buy_ratio"] > 0.8 and info["vol_accel"] > 10
+
+    # 同一份成交，箱体更高 → 没突破
+    ok, info = is_early_breakout(_box(top=1.05), flow, forming=False)
+    assert not ok and info["reason"] == "below_box"
+
+
+def test_recorded_trades_before_burst_do_not_trigger():
+    book = replay_trades(SAMPLE)
+    flow = book.intrabar("TESTUSDT", T0, now_ms=T0 + 3 * 60_000 - 1)
+    ok, info = is_early_breakout(_box(), flow, min_trades=5, forming=False)
+    assert not ok and info["reason"] == "below_box"
+    assert flow["vol_accel"] == 1.0
+
+
+def test_late_trade_does_not_wipe_newer_bucket():
+    book = FlowBook(memory_mb=0.1)
+    t_new = T0 + N_BUCKETS * BUCKET_MS   # 和 T0 落在同一个槽位
+    book.add("X", t_new, 2.0, 3.0, True)
+    assert not book.add("X", T0, 1.0, 100.0, False)
+    assert book.late_dropped == 1
+
+    flow = book.intrabar("X", t_new - t_new % BAR_MS)
+    assert flow["vol"] == 3.0 and flow["buy_ratio"] == 1.0 and flow["last_price"] == 2.0
+    assert book.intrabar("X", T0, now_ms=t_new) is None
@@ -0,0 +1,72 @@
+# tests/test_pipeline.py
+import threading
+import time
+from types import SimpleNamespace
+
+from pipeline import Pipeline, Stage, Sweep
+
+
+class BlockingBN:
+    """每次拉取都等 release；返回空（symbol 在 ingest 结束）"""
+    def __init__(self):
+        self.calls = 0
+        self.entered = threading.Event()
+        self.release = threading.Event()
+
+    def getRawKlines(self, symbol, interval, start_ms):
+        self.calls += 1
+        self.entered.set()
+        assert self.release.wait(5)
+        return []
+
+
+def _wait(cond, timeout=5.0):
+    t_end = time.time() + timeout
+    while not cond():
+        assert time.time() < t_end, "timeout"
+        time.sleep(0.01)
+
+
+def test_sweep_requests_coalesce_while_in_flight():
+    bn = BlockingBN()
+    p = Pipeline(["AUSDT"], bn, notify=None, workers={"ingest": 1})
+    p.start()
+    try:
+        assert p.request_sweep() == 1
+        assert bn.entered.wait(5)
+        # 第 1 轮还在跑：之后的请求都并进「跑完再来一轮」
+        assert [p.request_sweep() for _ in range(3)] == [2, 2, 2]
+        assert p.coalesced == 2
+
+        bn.release.set()
+        _wait(lambda: p.last is not None and p.last.seq == 2)
+        time.sleep(0.05)
+        assert p.sweeps == 2 and bn.calls == 2
+        assert p.last.errors == 1 and p.current is None
+    finally:
+        bn.release.set()
+        p.stop()
+
+
+def test_stage_queue_blocks_when_full():
+    release = threading.Event()
+    done = []
+    st = Stage("s", lambda item: release.wait(5) and done.append(item[2]), workers=1, maxsize=2)
+    sweep = Sweep(0, 3)
+    feed = SimpleNamespace(symbol="X")
+    st.put((sweep, feed, 0))
+    st.put((sweep, feed, 1))
+
+    # 队列满了（worker 还没起）：第三个 put 阻塞，压力传回上游
+    t = threading.Thread(target=st.put, args=((sweep, feed, 2),), daemon=True)
+    t.start()
+    t.join(0.2)
+    assert t.is_alive() and st.stats()["max_depth"] == 2
+
+    st.start()
+    release.set()
+    t.join(5)
+    assert not t.is_alive()
+    assert sweep.done.wait(5) and sorted(done) == [0, 1, 2]
+    st.stop()
+    assert st.stats()["processed"] == 3 and st.stats()["errors"] == 0
@@ -0,0 +1,98 @@
+# tests/test_resample.py
+import random
+from dataclasses import astuple
+
+import pytest
+
+from bn_tool import KlineData
+from interal_enum import KlineInterval, interval_ms
+from resample import HTF_INTERVALS, Resampler, history_ms, resample_klines
+from symbol_feed import SymbolFeed
+from warm_up import replay_symbol
+
+M = 5 * 60 * 1000
+H4 = 4 * 3600 * 1000
+T0 = 1_700_000_000_000 - 1_700_000_000_000 % H4
+
+
+def _bar(t, vol=100.0, price=1.0):
+    return KlineData(t, price, price, price, price, vol, t + M - 1, vol * price, 10, vol / 2, vol * price / 2, "0")
+
+
+def test_history_covers_htf_requirement():
+    assert history_ms(()) == 24 * 3600 * 1000
+    assert history_ms((KlineInterval.HOUR_4,)) == 7 * H4
+    assert history_ms((KlineInterval.MINUTE_15,)) == 24 * 3600 * 1000
+
+
+def test_cold_start_longer_than_ring_keeps_4h_context():
+    n = history_ms((KlineInterval.HOUR_4,)) // M
+    bars = [_bar(T0 + i * M) for i in range(n)]
+    feed = SymbolFeed("XUSDT")
+    feed.advance(feed.merge(bars), now_ms=bars[-1].close_time + 1)
+    assert len(feed.ring) == feed.ring.maxlen < n
+    assert len(feed.htf.views()[KlineInterval.HOUR_4]) == 7
+
+
+def test_warmup_does_not_aggregate_forming_bar(monkeypatch):
+    import warm_up
+
+    seen = []
+    monkeypatch.setattr(warm_up, "step_symbol", lambda rt, view, now_ms, htf=None, **_: seen.append(htf) or [])
+    # 63 根：最后一根（15m 桶 [60,61,62] 的最后一根）还在走
+    bars = [_bar(T0 + i * M) for i in range(62)] + [_bar(T0 + 62 * M, vol=1.0)]
+    forming_now = bars[-1].open_time + 60_000
+    replay_symbol(bars, lookback_hours=24, score_min=80, trap_max=150, confirm_bars=2,
+                  pending_ttl_bars=6, htf_require=(KlineInterval.MINUTE_15,), now_ms=forming_now)
+    assert len(seen[-1][KlineInterval.MINUTE_15]) == 20
+
+    feed = SymbolFeed("XUSDT")
+    feed.advance(feed.merge(bars), now_ms=forming_now)
+    assert feed.htf.last_open_ms == T0 + 61 * M
+
+
+def _direct(bars, ms):
+    """交易所直接给的大周期 K线：按 UTC 桶对齐聚合（只要完整的桶）"""
+    out = {}
+    for k in bars:
+        out.setdefault(k.open_time - k.open_time % ms, []).append(k)
+    return [
+        KlineData(t, b[0].open_price, max(k.high_price for k in b), min(k.low_price for k in b), b[-1].close_price,
+                  sum(k.volume for k in b), t + ms - 1, sum(k.quote_volume for k in b),
+                  sum(k.trade_count for k in b), sum(k.buy_volume for k in b),
+                  sum(k.buy_quote_volume for k in b), "0")
+        for t, b in sorted(out.items()) if len(b) == ms // M
+    ]
+
+
+def _random_bars(n, start, seed=0):
+    rng = random.Random(seed)
+    bars, p = [], 1.0
+    for i in range(n):
+        o, p = p, p * (1 + rng.uniform(-0.01, 0.01))
+        v = rng.uniform(1, 100)
+        bars.append(KlineData(start + i * M, o, max(o, p) * 1.002, min(o, p) * 0.998, p, v, start + i * M + M - 1,
+                              v * p, rng.randint(1, 50), v * rng.random(), v * p * 0.4, "0"))
+    return bars
+
+
+def test_resampler_matches_direct_htf_klines():
+    bars = _random_bars(400, T0 + 7 * M)   # 从桶中间开始：首个不完整的桶丢弃
+    for iv in HTF_INTERVALS:
+        ms = interval_ms(iv)
+        got, want = resample_klines(bars, iv), _direct(bars, ms)
+        assert [k.open_time for k in got] == [k.open_time for k in want] and got
+        for g, w in zip(got, want):
+            assert astuple(g)[:-1] == pytest.approx(astuple(w)[:-1])   # 最后一个是 ignore 字符串
+
+
+def test_resampler_drops_incomplete_buckets():
+    bars = [_bar(T0 + i * M) for i in range(12) if i != 4]   # 15m 桶 [3,4,5] 缺一根
+    r = Resampler(KlineInterval.MINUTE_15)
+    out = [r.update(k) for k in bars]
+    assert [k.open_time for k in r.bars] == [T0, T0 + 6 * M, T0 + 9 * M]
+    assert r.incomplete == 1 and sum(k is not None for k in out) == 3
+
+    # 重复 / 乱序的 bar 忽略
+    assert r.update(bars[-1]) is None and r.update(bars[0]) is None
+    assert len(r.bars) == 3 and r.bars[0].volume == 300.0
@@ -0,0 +1,73 @@
+# tests/test_session_replay.py
+from bn_tool import BNMonitor
+from interal_enum import KlineInterval
+from pipeline import Pipeline
+from session_capture import KIND_KLINES, CaptureWriter, ReplayClient, replay
+
+M = 5 * 60 * 1000
+T0 = 1_700_000_000_000 - 1_700_000_000_000 % (4 * 3600 * 1000)   # 4h 对齐，远早于现在
+
+
+def _raw(t, vol):
+    return [t, "1.0", "1.0", "1.0", "1.0", str(vol), t + M - 1, str(vol), 10, str(vol / 2), str(vol / 2), "0"]
+
+
+def _history(n_closed, forming_vol):
+    """n_closed 根已收盘（量 100）+ 1 根正在走的（量 forming_vol）"""
+    return [_raw(T0 + i * M, 100.0) for i in range(n_closed)] + [_raw(T0 + n_closed * M, forming_vol)]
+
+
+def test_forming_bar_of_past_capture_is_not_aggregated_early():
+    client = ReplayClient()
+    now = [0]
+    p = Pipeline([], BNMonitor(max_qps=10 ** 9, client=client), notify=None, clock=lambda: now[0])
+
+    # 第 1 次拉取：第 5 根（15m 桶 [3,4,5] 的最后一根）还没收盘，只有 10 的量
+    client.push("XUSDT", _history(5, 10.0))
+    now[0] = T0 + 5 * M + 60_000
+    p.process("XUSDT")
+    htf = p.feeds["XUSDT"].htf
+    assert htf.last_open_ms == T0 + 4 * M
+
+    # 第 2 次拉取：第 5 根收盘（完整的量），第 6 根在走
+    client.push("XUSDT", [_raw(T0 + 5 * M, 100.0), _raw(T0 + 6 * M, 5.0)])
+    now[0] = T0 + 6 * M + 60_000
+    p.process("XUSDT")
+    assert htf.last_open_ms == T0 + 5 * M
+    bars_15m = htf.views()[KlineInterval.MINUTE_15]
+    assert [b.volume for b in bars_15m] == [300.0, 300.0]
+
+
+def test_replay_uses_capture_time(tmp_path):
+    path = str(tmp_path / "s.cap")
+    w = CaptureWriter(path)
+    w.append(KIND_KLINES, "XUSDT", {"params": {}, "resp": _history(300, 10.0)}, recv_ts_ms=T0 + 300 * M + 60_000)
+    w.append(KIND_KLINES, "XUSDT", {"params": {}, "resp": [_raw(T0 + 300 * M, 100.0), _raw(T0 + 301 * M, 5.0)]},
+             recv_ts_ms=T0 + 301 * M + 60_000)
+    w.close()
+    r = replay(path)
+    assert r["calls"] == 2 and r["bars"] == 303
+    assert r["events"] == []   # 首次填充不补发
+
+
+def test_live_capture_writer_is_closed_at_exit(tmp_path, monkeypatch):
+    import env
+    import gainers_predict_main as main
+    from session_capture import FLUSH_EVERY, CaptureReader
+
+    path = str(tmp_path / "live.cap")
+    hooks = []
+    monkeypatch.setattr(env, "CAPTURE_PATH", path)
+    monkeypatch.setattr(env, "RUN_MODE", env.RunMode.LIVE)
+    monkeypatch.setattr(main, "_bn", None)
+    monkeypatch.setattr(main.atexit, "register", hooks.append)
+
+    writer = main.get_bn().client.writer
+    for i in range(FLUSH_EVERY - 1):
+        writer.append(KIND_KLINES, "XUSDT", {"params": {}, "resp": []}, recv_ts_ms=i)
+    assert len(list(CaptureReader(path).records())) < FLUSH_EVERY - 1   # 还没到 FLUSH_EVERY，尾巴在缓冲里
+
+    for hook in hooks:   # 进程退出
+        hook()
+    assert len(list(CaptureReader(path).records())) == FLUSH_EVERY - 1
+    writer.close()   # 重复 close 不报错
@@ -0,0 +1,43 @@
+# tests/test_shard_runner.py
+import shard_runner
+from shard_runner import RESTART_BACKOFF_SEC, ShardCoordinator
+
+
+class FakeProc:
+    def __init__(self, alive=True):
+        self.alive = alive
+        self.exitcode = None if alive else 1
+
+    def is_alive(self):
+        return self.alive
+
+
+def _no_sleep(sec):
+    raise AssertionError("coordinator loop must not sleep")
+
+
+def test_dead_shard_restarts_after_backoff_without_blocking(monkeypatch):
+    monkeypatch.setattr(shard_runner.time, "sleep", _no_sleep)
+    coord = ShardCoordinator(2, all_symbols=["AUSDT", "BUSDT", "CUSDT"])
+    spawned = []
+
+    def spawn(i):
+        spawned.append(i)
+        coord.procs[i] = FakeProc()
+
+    monkeypatch.setattr(coord, "_spawn", spawn)
+    coord.procs = {0: FakeProc(alive=False), 1: FakeProc()}
+
+    coord.check_shards(now=100.0)
+    assert spawned == [] and coord.restart_at == {0: 100.0 + RESTART_BACKOFF_SEC}
+
+    coord.check_shards(now=100.0 + RESTART_BACKOFF_SEC - 0.1)   # 退避期间不重启，也不重复记
+    assert spawned == [] and coord.restart_at == {0: 100.0 + RESTART_BACKOFF_SEC}
+
+    coord.check_shards(now=100.0 + RESTART_BACKOFF_SEC)
+    assert spawned == [0] and coord.restarts == {0: 1, 1: 0} and coord.restart_at == {}
+
+    coord.procs[1].alive = False
+    coord.stop_evt.set()   # 退出中不再重启
+    coord.check_shards(now=1000.0)
+    assert coord.restart_at == {}
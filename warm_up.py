@@ -1,5 +1,8 @@
 # warmup.py
+import time
+
 from replay_engine import step_symbol
+from resample import MultiResampler
 from state import SymbolRuntimeState
 
 def replay_symbol(
@@ -10,12 +13,22 @@ def replay_symbol(
     trap_max,
     confirm_bars,
     pending_ttl_bars,
+    htf_require=(),
+    trace=None,
+    baseline=None,
+    now_ms=None,
 ):
+    """klines 应覆盖 resample.history_ms(htf_require)，否则 4h 之类的大周期前几根不够"""
     runtime = SymbolRuntimeState()
+    htf = MultiResampler(htf_require)
     WINDOW_MS = lookback_hours * 60 * 60 * 1000
+    wall_ms = int(time.time() * 1000) if now_ms is None else now_ms
 
     for i in range(len(klines)):
         now_ms = klines[i].open_time
+        # 和 SymbolFeed 一样只聚合已收盘的 bar：warmup 拉到的最后一根通常还在走
+        if i < len(klines) - 1 or klines[i].close_time < wall_ms:
+            htf.update(klines[i])
         start_ms = now_ms - WINDOW_MS
 
         j = 0
@@ -34,10 +47,14 @@ def replay_symbol(
             trap_max=trap_max,
             confirm_bars=confirm_bars,
             pending_ttl_bars=pending_ttl_bars,
+            htf=htf.views(),
+            htf_require=htf_require,
+            trace=trace,
+            baseline=baseline,
         )
 
-        for _,v in events:
-            print(v)
+        for evt, pend, trap in events:
+            print(evt, pend, trap)
 
     # 如果是测试文件进来的，就直接打印把
     return runtime